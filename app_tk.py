@@ -13,8 +13,11 @@ from typing import Optional, Callable, Any
 import sqlite3
 
 # Your modules
-from modules import ai
+from modules import ai, appointments, billing, doctors, interactions, inventory, patients, prescriptions, search
 from db.init_db import initialize_db
+from db import backup, branches, instrument, metrics
+from db.instrument import connect
+from db.migrations import ensure_schema
 from seed.insert_dummy_data import insert_dummy_data
 
 DB_PATH = os.path.join(os.path.dirname(__file__), "clinic.db")
@@ -111,22 +114,35 @@ def in_thread(fn: Callable, on_error: Optional[Callable[[BaseException], None]]
 def confirm(title: str, msg: str) -> bool:
     return messagebox.askyesno(title, msg)
 
-# ================= DB HELPERS =================
-def _ensure_appointments_table() -> None:
-    with sqlite3.connect(DB_PATH) as conn:
-        conn.execute("""
-        CREATE TABLE IF NOT EXISTS appointments (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            patient_id INTEGER NOT NULL,
-            doctor_id INTEGER NOT NULL,
-            date TEXT NOT NULL,      -- YYYY-MM-DD
-            time TEXT NOT NULL,      -- HH:MM
-            reason TEXT,
-            status TEXT DEFAULT 'Scheduled',
-            FOREIGN KEY(patient_id) REFERENCES patients(id),
-            FOREIGN KEY(doctor_id) REFERENCES doctors(id)
-        );
-        """)
+AUTOCOMPLETE_LIMIT = 20
+
+def autocomplete_combobox(parent, var: tk.StringVar, entity: str,
+                          fmt: Optional[Callable[[list[tuple]], list[str]]] = None,
+                          fallback: Optional[Callable[[str], list[tuple]]] = None) -> ttk.Combobox:
+    """Editable combobox listing the first names that start with the typed text (an index range
+    scan, however large the table); text matching no name lists the closest ones (typos welcome)."""
+    fmt = fmt or (lambda hits: [f"{i} - {label}" for i, label in hits])
+    fallback = fallback or (lambda text: [(i, label) for i, label, _ in
+                                          search.fuzzy_lookup(entity, text, AUTOCOMPLETE_LIMIT, db_path=DB_PATH)])
+    cb = ttk.Combobox(parent, textvariable=var)
+    def refill(text):
+        hits = search.prefix_lookup(entity, text, AUTOCOMPLETE_LIMIT, db_path=DB_PATH)
+        if not hits and len(text) >= 2: hits = fallback(text)
+        cb["values"] = fmt(hits)
+    def on_key(e):
+        if e.keysym in ("Up", "Down", "Return", "Escape", "Tab"): return
+        refill(var.get().strip())
+    cb.bind("<KeyRelease>", on_key)
+    refill(var.get().strip())
+    return cb
+
+def picked_id(var: tk.StringVar, table: str) -> Optional[int]:
+    """Id of the "id - label" chosen in an autocomplete combobox, or None unless that row exists
+    (the box is editable, so a typed number proves nothing)."""
+    try: row_id = int(var.get().split(" - ",1)[0])
+    except ValueError: return None
+    with connect(DB_PATH) as c:
+        return row_id if c.execute(f"SELECT 1 FROM {table} WHERE id=?", (row_id,)).fetchone() else None
 
 # ================= BASE CRUD WITH SEARCH + SORT =================
 class CrudTab(ttk.Frame):
@@ -256,69 +272,72 @@ class DoctorsTab(CrudTab):
     columns = ["id","vcn","name","phone","email","graduated_year"]
     headings= ["ID","VCN","Name","Phone","Email","Graduated Year"]
     def query_all(self):
-        with sqlite3.connect(DB_PATH) as c:
+        with connect(DB_PATH) as c:
             return c.execute("SELECT id,vcn,name,phone,email,graduated_year FROM doctors").fetchall()
     def insert_row(self, v):
-        with sqlite3.connect(DB_PATH) as c:
-            try:
-                c.execute("INSERT INTO doctors (vcn,name,phone,email,graduated_year) VALUES (?,?,?,?,?)",
-                          (v["vcn"], v["name"], v["phone"], v["email"], v["graduated_year"]))
-                c.commit()
-            except sqlite3.IntegrityError as e:
-                raise ValueError("VCN must be unique.") from e
+        try: doctors.add_doctor(v["vcn"], v["name"], v["phone"], v["email"], v["graduated_year"])
+        except sqlite3.IntegrityError as e: raise ValueError("VCN must be unique.") from e
     def update_row(self, row_id, v):
-        with sqlite3.connect(DB_PATH) as c:
-            c.execute("UPDATE doctors SET vcn=?,name=?,phone=?,email=?,graduated_year=? WHERE id=?",
-                      (v["vcn"], v["name"], v["phone"], v["email"], v["graduated_year"], row_id)); c.commit()
+        doctors.update_doctor(row_id, v["vcn"], v["name"], v["phone"], v["email"], v["graduated_year"])
     def delete_row(self, row_id):
-        with sqlite3.connect(DB_PATH) as c:
-            c.execute("DELETE FROM doctors WHERE id=?", (row_id,)); c.commit()
+        doctors.delete_doctor(row_id)
 
 class PatientsTab(CrudTab):
     columns = ["id","name","species","breed","owner_name","owner_contact"]
     headings= ["ID","Name","Species","Breed","Owner Name","Owner Contact"]
     def query_all(self):
-        with sqlite3.connect(DB_PATH) as c:
+        with connect(DB_PATH) as c:
             return c.execute("SELECT id,name,species,breed,owner_name,owner_contact FROM patients").fetchall()
     def insert_row(self, v):
-        with sqlite3.connect(DB_PATH) as c:
-            c.execute("INSERT INTO patients (name,species,breed,owner_name,owner_contact) VALUES (?,?,?,?,?)",
-                      (v["name"], v["species"], v["breed"], v["owner_name"], v["owner_contact"])); c.commit()
+        patients.add_patient(v["name"], v["species"], v["breed"], v["owner_name"], v["owner_contact"])
     def update_row(self, row_id, v):
-        with sqlite3.connect(DB_PATH) as c:
-            c.execute("UPDATE patients SET name=?,species=?,breed=?,owner_name=?,owner_contact=? WHERE id=?",
-                      (v["name"], v["species"], v["breed"], v["owner_name"], v["owner_contact"], row_id)); c.commit()
+        patients.update_patient(row_id, v["name"], v["species"], v["breed"], v["owner_name"], v["owner_contact"])
     def delete_row(self, row_id):
-        with sqlite3.connect(DB_PATH) as c:
-            c.execute("DELETE FROM patients WHERE id=?", (row_id,)); c.commit()
+        patients.delete_patient(row_id)
+    def _build_buttons(self) -> None:
+        super()._build_buttons()
+        ttk.Button(self.winfo_children()[-1], text="History", command=self.on_history).pack(side=tk.LEFT, padx=6)
+    def on_history(self) -> None:
+        pid = self._get_selected_id()
+        if pid is None: messagebox.showinfo("Select a row", "Please select a patient."); return
+        dlg = tk.Toplevel(self); dlg.title(f"History — patient #{pid}"); dlg.geometry("900x480"); dlg.transient(self.winfo_toplevel())
+        cols = ["date","kind","id","time","doctor","summary","total","paid"]
+        tree = ttk.Treeview(dlg, columns=cols, show="headings")
+        for col in cols:
+            tree.heading(col, text=col.title(), anchor=tk.W)
+            tree.column(col, width=300 if col == "summary" else 90, anchor=tk.W, stretch=(col == "summary"))
+        tree.pack(fill=tk.BOTH, expand=True, padx=8, pady=8)
+        state = {"before": None}
+        def load_more():
+            rows = patients.patient_timeline(pid, state["before"], 50, db_path=DB_PATH)
+            for r in rows: tree.insert("", "end", values=["" if v is None else v for v in r])
+            if rows: state["before"] = rows[-1]
+            if len(rows) < 50: more.state(["disabled"])
+        more = ttk.Button(dlg, text="Load older", command=load_more); more.pack(anchor="e", padx=8, pady=(0,8))
+        load_more()
 
 class InventoryTab(CrudTab):
     columns = ["id","item_name","description","quantity","unit_price","expiry_date"]
     headings= ["ID","Item Name","Description","Quantity","Unit Price","Expiry Date"]
     def query_all(self):
-        with sqlite3.connect(DB_PATH) as c:
+        with connect(DB_PATH) as c:
             return c.execute("SELECT id,item_name,description,quantity,unit_price,expiry_date FROM inventory").fetchall()
     def insert_row(self, v):
         try: qty, price = int(v["quantity"]), float(v["unit_price"])
         except ValueError: raise ValueError("Quantity must be integer and Unit Price a number.")
-        with sqlite3.connect(DB_PATH) as c:
-            c.execute("""INSERT INTO inventory (item_name,description,quantity,unit_price,expiry_date)
-                         VALUES (?,?,?,?,?)""", (v["item_name"], v["description"], qty, price, v["expiry_date"])); c.commit()
+        inventory.add_item(v["item_name"], v["description"], qty, price, v["expiry_date"])
     def update_row(self, row_id, v):
         try: qty, price = int(v["quantity"]), float(v["unit_price"])
         except ValueError: raise ValueError("Quantity must be integer and Unit Price a number.")
-        with sqlite3.connect(DB_PATH) as c:
-            c.execute("""UPDATE inventory SET item_name=?,description=?,quantity=?,unit_price=?,expiry_date=? WHERE id=?""",
-                      (v["item_name"], v["description"], qty, price, v["expiry_date"], row_id)); c.commit()
+        inventory.update_item(row_id, v["item_name"], v["description"], qty, price, v["expiry_date"])
     def delete_row(self, row_id):
-        with sqlite3.connect(DB_PATH) as c:
-            c.execute("DELETE FROM inventory WHERE id=?", (row_id,)); c.commit()
+        inventory.delete_item(row_id)
 
 class PrescriptionsTab(CrudTab):
     columns = ["id","patient","doctor","date","diagnosis","medication","dosage","instructions"]
     headings= ["ID","Patient","Doctor","Date","Diagnosis","Medication","Dosage","Instructions"]
     def query_all(self):
-        with sqlite3.connect(DB_PATH) as c:
+        with connect(DB_PATH) as c:
             return c.execute("""
                 SELECT p.id, pt.name, d.name, p.date, p.diagnosis, p.medication, p.dosage, p.instructions
                 FROM prescriptions p
@@ -329,23 +348,27 @@ class PrescriptionsTab(CrudTab):
     def _insert_dialog(self):
         dlg = tk.Toplevel(self); dlg.title("Add Prescription"); dlg.transient(self.winfo_toplevel()); dlg.grab_set()
         frm = ttk.Frame(dlg, padding=12); frm.pack(fill=tk.BOTH, expand=True)
-        with sqlite3.connect(DB_PATH) as c:
-            pats = c.execute("SELECT id,name FROM patients ORDER BY name").fetchall()
-            docs = c.execute("SELECT id,name FROM doctors ORDER BY name").fetchall()
         def row(label): r = ttk.Frame(frm); r.pack(fill=tk.X, pady=4); ttk.Label(r, text=label, width=16).pack(side=tk.LEFT); return r
-        r=row("Patient"); patient_var=tk.StringVar(); ttk.Combobox(r, textvariable=patient_var, state="readonly",
-            values=[f"{i} - {n}" for i,n in pats]).pack(side=tk.LEFT, fill=tk.X, expand=True)
-        r=row("Doctor"); doctor_var=tk.StringVar(); ttk.Combobox(r, textvariable=doctor_var, state="readonly",
-            values=[f"{i} - {n}" for i,n in docs]).pack(side=tk.LEFT, fill=tk.X, expand=True)
+        r=row("Patient"); patient_var=tk.StringVar()
+        autocomplete_combobox(r, patient_var, "patient").pack(side=tk.LEFT, fill=tk.X, expand=True)
+        r=row("Doctor"); doctor_var=tk.StringVar()
+        autocomplete_combobox(r, doctor_var, "doctor").pack(side=tk.LEFT, fill=tk.X, expand=True)
         fields={}
         for lab in ("Diagnosis","Medication","Dosage","Instructions"):
-            r=row(lab); ent=ttk.Entry(r); ent.pack(side=tk.LEFT, fill=tk.X, expand=True); fields[lab.lower()] = ent
+            r=row(lab)
+            if lab == "Medication":
+                ent=autocomplete_combobox(r, tk.StringVar(), "medication", lambda hits: [label for _, label in hits])
+            else: ent=ttk.Entry(r)
+            ent.pack(side=tk.LEFT, fill=tk.X, expand=True); fields[lab.lower()] = ent
         res={"ok":False,"values":None}; btns=ttk.Frame(frm); btns.pack(fill=tk.X, pady=(8,0))
         def on_ok():
             if not patient_var.get() or not doctor_var.get(): messagebox.showerror("Missing","Select patient & doctor."); return
-            try:
-                pid=int(patient_var.get().split(" - ",1)[0]); did=int(doctor_var.get().split(" - ",1)[0])
-            except ValueError: messagebox.showerror("Invalid","Bad selection."); return
+            pid=picked_id(patient_var, "patients"); did=picked_id(doctor_var, "doctors")
+            if pid is None or did is None: messagebox.showerror("Invalid","Pick the patient and doctor from the list."); return
+            findings = interactions.check(pid, fields["medication"].get().strip(), db_path=DB_PATH)
+            if findings and not confirm("Drug interactions",
+                                        "\n\n".join(f"⚠️ {interactions.describe(f)}" for f in findings)
+                                        + "\n\nPrescribe anyway?"): return
             res["ok"]=True; res["values"] = dict(pid=pid,did=did,
                 diagnosis=fields["diagnosis"].get().strip(),
                 medication=fields["medication"].get().strip(),
@@ -358,25 +381,24 @@ class PrescriptionsTab(CrudTab):
     def insert_row(self, _v):
         ok, data = self._insert_dialog()
         if not ok: return
-        from datetime import date
-        with sqlite3.connect(DB_PATH) as c:
-            c.execute("""INSERT INTO prescriptions (patient_id,doctor_id,date,diagnosis,medication,dosage,instructions)
-                         VALUES (?,?,?,?,?,?,?)""",
-                      (data["pid"], data["did"], date.today().isoformat(),
-                       data["diagnosis"], data["medication"], data["dosage"], data["instructions"])); c.commit()
+        # The dialog has already shown the interactions and had them confirmed.
+        prescriptions.add_prescription(data["pid"], data["did"], data["diagnosis"], data["medication"],
+                                       data["dosage"], data["instructions"], allow_interactions=True)
     def update_row(self, row_id, v):
-        with sqlite3.connect(DB_PATH) as c:
-            c.execute("UPDATE prescriptions SET diagnosis=?,medication=?,dosage=?,instructions=? WHERE id=?",
-                      (v["diagnosis"], v["medication"], v["dosage"], v["instructions"], row_id)); c.commit()
+        findings = interactions.check_edit(row_id, v["medication"], db_path=DB_PATH)
+        if findings and not confirm("Drug interactions",
+                                    "\n\n".join(f"⚠️ {interactions.describe(f)}" for f in findings)
+                                    + "\n\nPrescribe anyway?"): return
+        prescriptions.update_prescription(row_id, v["diagnosis"], v["medication"], v["dosage"], v["instructions"],
+                                          allow_interactions=True)
     def delete_row(self, row_id):
-        with sqlite3.connect(DB_PATH) as c:
-            c.execute("DELETE FROM prescriptions WHERE id=?", (row_id,)); c.commit()
+        prescriptions.delete_prescription(row_id)
 
 class AppointmentsTab(CrudTab):
     columns = ["id","patient","doctor","date","time","reason","status"]
     headings= ["ID","Patient","Doctor","Date","Time","Reason","Status"]
     def query_all(self):
-        with sqlite3.connect(DB_PATH) as c:
+        with connect(DB_PATH) as c:
             return c.execute("""
                 SELECT a.id, pt.name, d.name, a.date, a.time, a.reason, a.status
                 FROM appointments a
@@ -387,14 +409,11 @@ class AppointmentsTab(CrudTab):
     def _dialog(self, title: str, initial: Optional[dict]=None):
         dlg = tk.Toplevel(self); dlg.title(title); dlg.transient(self.winfo_toplevel()); dlg.grab_set()
         frm = ttk.Frame(dlg, padding=12); frm.pack(fill=tk.BOTH, expand=True)
-        with sqlite3.connect(DB_PATH) as c:
-            pats = c.execute("SELECT id,name FROM patients ORDER BY name").fetchall()
-            docs = c.execute("SELECT id,name FROM doctors ORDER BY name").fetchall()
         def row(label): r=ttk.Frame(frm); r.pack(fill=tk.X, pady=4); ttk.Label(r, text=label, width=16).pack(side=tk.LEFT); return r
         r=row("Patient"); v_pat=tk.StringVar(value=initial.get("patient","") if initial else "")
-        ttk.Combobox(r, textvariable=v_pat, state="readonly", values=[f"{i} - {n}" for i,n in pats]).pack(side=tk.LEFT, fill=tk.X, expand=True)
+        autocomplete_combobox(r, v_pat, "patient").pack(side=tk.LEFT, fill=tk.X, expand=True)
         r=row("Doctor"); v_doc=tk.StringVar(value=initial.get("doctor","") if initial else "")
-        ttk.Combobox(r, textvariable=v_doc, state="readonly", values=[f"{i} - {n}" for i,n in docs]).pack(side=tk.LEFT, fill=tk.X, expand=True)
+        autocomplete_combobox(r, v_doc, "doctor").pack(side=tk.LEFT, fill=tk.X, expand=True)
         r=row("Date (YYYY-MM-DD)"); e_date=ttk.Entry(r); e_date.pack(side=tk.LEFT, fill=tk.X, expand=True)
         r=row("Time (HH:MM)"); e_time=ttk.Entry(r); e_time.pack(side=tk.LEFT, fill=tk.X, expand=True)
         r=row("Reason)"); e_reason=ttk.Entry(r); e_reason.pack(side=tk.LEFT, fill=tk.X, expand=True)
@@ -405,9 +424,8 @@ class AppointmentsTab(CrudTab):
         res={"ok":False,"values":None}; btns=ttk.Frame(frm); btns.pack(fill=tk.X, pady=(8,0))
         def on_ok():
             if not v_pat.get() or not v_doc.get(): messagebox.showerror("Missing","Select patient & doctor."); return
-            try:
-                pid=int(v_pat.get().split(" - ",1)[0]); did=int(v_doc.get().split(" - ",1)[0])
-            except ValueError: messagebox.showerror("Invalid","Bad selection."); return
+            pid=picked_id(v_pat, "patients"); did=picked_id(v_doc, "doctors")
+            if pid is None or did is None: messagebox.showerror("Invalid","Pick the patient and doctor from the list."); return
             res["ok"]=True; res["values"] = dict(
                 patient_id=pid, doctor_id=did, date=e_date.get().strip(), time=e_time.get().strip(),
                 reason=e_reason.get().strip(), status=v_status.get().strip()
@@ -418,11 +436,8 @@ class AppointmentsTab(CrudTab):
     def insert_row(self, _v):
         ok, data = self._dialog("Add Appointment")
         if not ok: return
-        with sqlite3.connect(DB_PATH) as c:
-            c.execute("""INSERT INTO appointments (patient_id,doctor_id,date,time,reason,status)
-                         VALUES (?,?,?,?,?,?)""",
-                      (data["patient_id"], data["doctor_id"], data["date"], data["time"], data["reason"], data["status"]))
-            c.commit()
+        appointments.add_appointment(data["patient_id"], data["doctor_id"], data["date"], data["time"],
+                                     data["reason"], data["status"])
     def update_row(self, row_id, _v):
         sel = self.tree.selection()
         if not sel: return
@@ -431,13 +446,10 @@ class AppointmentsTab(CrudTab):
                     time=f"{cur[4]}", reason=f"{cur[5]}", status=f"{cur[6]}")
         ok, data = self._dialog("Edit Appointment", init)
         if not ok: return
-        with sqlite3.connect(DB_PATH) as c:
-            c.execute("""UPDATE appointments SET patient_id=?,doctor_id=?,date=?,time=?,reason=?,status=? WHERE id=?""",
-                      (data["patient_id"], data["doctor_id"], data["date"], data["time"], data["reason"], data["status"], row_id))
-            c.commit()
+        appointments.update_appointment(row_id, data["patient_id"], data["doctor_id"], data["date"], data["time"],
+                                        data["reason"], data["status"])
     def delete_row(self, row_id):
-        with sqlite3.connect(DB_PATH) as c:
-            c.execute("DELETE FROM appointments WHERE id=?", (row_id,)); c.commit()
+        appointments.delete_appointment(row_id)
 
 # ---- AI Tab (Notebook) ----
 class AITab(ttk.Frame):
@@ -447,6 +459,7 @@ class AITab(ttk.Frame):
         row = ttk.Frame(self, padding=(0,8)); row.pack(fill=tk.X)
         ttk.Button(row, text="Predict Top Drugs (90d)", command=self._wrap(ai.predict_top_drugs)).pack(side=tk.LEFT)
         ttk.Button(row, text="Flag Underbilled (<60%)", command=self._wrap(ai.flag_underbilled)).pack(side=tk.LEFT, padx=8)
+        ttk.Button(row, text="Re-check Drug Interactions", command=self._wrap(ai.flag_interactions)).pack(side=tk.LEFT)
         ttk.Label(self, text="Results appear in the Log tab.").pack(anchor="w")
         self.log_stream = log_stream
     def _wrap(self, fn: Callable[[],None]) -> Callable[[],None]:
@@ -458,15 +471,80 @@ class AITab(ttk.Frame):
             in_thread(task, on_error=lambda e: messagebox.showerror("AI error", str(e)))
         return _go
 
+# ---- Query Stats Tab ----
+class StatsTab(ttk.Frame):
+    columns = ["sql","count","total_ms","avg_ms","p95_ms","rows"]
+    headings = ["Statement","Calls","Total (ms)","Avg (ms)","p95 (ms)","Rows"]
+    def __init__(self, master: tk.Misc) -> None:
+        super().__init__(master, padding=12)
+        bar = ttk.Frame(self); bar.pack(fill=tk.X, pady=(0,8))
+        ttk.Label(bar, text="Slow threshold (ms)").pack(side=tk.LEFT)
+        self._slow_var = tk.StringVar(value=f"{instrument.SLOW_MS:g}")
+        ent = ttk.Entry(bar, textvariable=self._slow_var, width=8); ent.pack(side=tk.LEFT, padx=8)
+        ent.bind("<Return>", lambda _e: self._set_threshold())
+        ttk.Button(bar, text="Reset", command=self._reset).pack(side=tk.RIGHT)
+        ttk.Button(bar, text="Refresh", command=self.refresh).pack(side=tk.RIGHT, padx=6)
+        self.tree = ttk.Treeview(self, columns=self.columns, show="headings")
+        for col, head in zip(self.columns, self.headings, strict=False):
+            self.tree.heading(col, text=head, anchor=tk.W)
+            self.tree.column(col, width=520 if col == "sql" else 90, anchor=tk.W, stretch=(col == "sql"))
+        self.tree.pack(fill=tk.BOTH, expand=True)
+        self.refresh()
+    def _set_threshold(self) -> None:
+        try: instrument.set_slow_threshold(float(self._slow_var.get()))
+        except ValueError: messagebox.showerror("Invalid", "Threshold must be a number.")
+    def _reset(self) -> None:
+        instrument.reset(); self.refresh()
+    def refresh(self) -> None:
+        for iid in self.tree.get_children(): self.tree.delete(iid)
+        for r in instrument.stats(limit=200):
+            self.tree.insert("", "end", values=(r["sql"], r["count"], f"{r['total_ms']:.1f}",
+                                                f"{r['avg_ms']:.2f}", f"{r['p95_ms']:g}", r["rows"]))
+
+# ---- Revenue Tab ----
+class RevenueTab(ttk.Frame):
+    columns = ["label","bills","billed","collected","outstanding"]
+    headings = ["Period / Group","Bills","Billed (₹)","Collected (₹)","Outstanding (₹)"]
+    def __init__(self, master: tk.Misc) -> None:
+        super().__init__(master, padding=12)
+        bar = ttk.Frame(self); bar.pack(fill=tk.X, pady=(0,8))
+        ttk.Label(bar, text="Group by").pack(side=tk.LEFT)
+        self._by_var = tk.StringVar(value="month")
+        by = ttk.Combobox(bar, textvariable=self._by_var, state="readonly", width=10, values=billing.REVENUE_GROUPINGS)
+        by.pack(side=tk.LEFT, padx=8); by.bind("<<ComboboxSelected>>", lambda _e: self.refresh())
+        self._range = {}
+        for key, label in (("start","From"), ("end","To")):
+            ttk.Label(bar, text=label).pack(side=tk.LEFT, padx=(8,0))
+            var = tk.StringVar(); self._range[key] = var
+            ent = ttk.Entry(bar, textvariable=var, width=12); ent.pack(side=tk.LEFT, padx=6)
+            ent.bind("<Return>", lambda _e: self.refresh())
+        ttk.Button(bar, text="Refresh", command=self.refresh).pack(side=tk.RIGHT)
+        self.tree = ttk.Treeview(self, columns=self.columns, show="headings")
+        for col, head in zip(self.columns, self.headings, strict=False):
+            self.tree.heading(col, text=head, anchor=tk.W)
+            self.tree.column(col, width=260 if col == "label" else 130, anchor=tk.W, stretch=(col == "label"))
+        self.tree.pack(fill=tk.BOTH, expand=True)
+        self._total_var = tk.StringVar(); ttk.Label(self, textvariable=self._total_var).pack(anchor="w", pady=(6,0))
+        self.refresh()
+    def refresh(self) -> None:
+        for iid in self.tree.get_children(): self.tree.delete(iid)
+        start, end = (self._range[k].get().strip() or None for k in ("start","end"))
+        rows = billing.revenue_summary(self._by_var.get(), start, end, db_path=DB_PATH)
+        for label, n, billed, collected, outstanding in rows:
+            self.tree.insert("", "end", values=(label, n, f"{billed:,.2f}", f"{collected:,.2f}", f"{outstanding:,.2f}"))
+        self._total_var.set("Total billed ₹{:,.2f} · collected ₹{:,.2f} · outstanding ₹{:,.2f}".format(
+            *(sum(r[i] for r in rows) for i in (2, 3, 4))))
+
 # ================= APP =================
 class App(tk.Tk):
     def __init__(self) -> None:
         super().__init__()
-        self.title("🐾 VetAI Clinic Intelligence System")
+        self.title("🐾 VetAI Clinic Intelligence System"
+                   + (f" — {branches.active_branch()}" if os.environ.get("VETAI_BRANCH") else ""))
         self.geometry("1200x760"); self.minsize(1000, 640)
 
         self.theme = ThemeManager(self)
-        _ensure_appointments_table()
+        ensure_schema(DB_PATH)
 
         self._build_menu()
         self._build_layout()
@@ -476,6 +554,7 @@ class App(tk.Tk):
         dbmenu = tk.Menu(menubar, tearoff=False); menubar.add_cascade(label="Database", menu=dbmenu)
         dbmenu.add_command(label="Initialize Schema", command=self.on_init_db)
         dbmenu.add_command(label="Insert Dummy Data", command=self.on_seed)
+        dbmenu.add_command(label="Backup Now", command=self.on_backup)
         viewmenu = tk.Menu(menubar, tearoff=False); menubar.add_cascade(label="View", menu=viewmenu)
         viewmenu.add_checkbutton(label="Dark Mode", command=self.toggle_dark_mode)
         helpmenu = tk.Menu(menubar, tearoff=False); menubar.add_cascade(label="Help", menu=helpmenu)
@@ -501,7 +580,7 @@ class App(tk.Tk):
             columns = ["id","prescription_id","patient","total_amount","paid_amount","billing_date"]
             headings= ["ID","Prescription ID","Patient","Total (₹)","Paid (₹)","Billing Date"]
             def query_all(self):
-                with sqlite3.connect(DB_PATH) as c:
+                with connect(DB_PATH) as c:
                     return c.execute("""
                         SELECT b.id, b.prescription_id, pt.name, b.total_amount, b.paid_amount, b.billing_date
                         FROM billing b
@@ -512,24 +591,26 @@ class App(tk.Tk):
             def _insert_dialog(self):
                 dlg = tk.Toplevel(self); dlg.title("Generate Bill"); dlg.transient(self.winfo_toplevel()); dlg.grab_set()
                 frm = ttk.Frame(dlg, padding=12); frm.pack(fill=tk.BOTH, expand=True)
-                with sqlite3.connect(DB_PATH) as c:
-                    prescs = c.execute("""
-                        SELECT p.id, pt.name, p.medication, p.date
-                        FROM prescriptions p
-                        JOIN patients pt ON p.patient_id = pt.id
-                        ORDER BY p.id DESC
-                    """).fetchall()
                 def row(l): r=ttk.Frame(frm); r.pack(fill=tk.X, pady=4); ttk.Label(r, text=l, width=16).pack(side=tk.LEFT); return r
+                def by_patient(text):  # a misspelt patient name lists the closest patients' prescriptions
+                    ids = [i for i, _, _ in search.fuzzy_lookup("patient", text, AUTOCOMPLETE_LIMIT, db_path=DB_PATH)]
+                    with connect(DB_PATH) as c:
+                        rows = c.execute(f"""
+                            SELECT p.id, pt.name, p.medication, p.date FROM prescriptions p
+                            JOIN patients pt ON p.patient_id = pt.id
+                            WHERE p.patient_id IN ({','.join('?' * len(ids))}) ORDER BY p.id DESC LIMIT 200""", ids).fetchall()
+                    return [(pid, f"{pname} - {med} ({dt})") for pid,pname,med,dt in rows]
                 r=row("Prescription"); v=tk.StringVar()
-                ttk.Combobox(r, textvariable=v, state="readonly",
-                    values=[f"{pid} - {pname} - {med} ({dt})" for pid,pname,med,dt in prescs]).pack(side=tk.LEFT, fill=tk.X, expand=True)
+                autocomplete_combobox(r, v, "prescription", fallback=by_patient).pack(side=tk.LEFT, fill=tk.X, expand=True)
                 r=row("Total (₹)"); e_total=ttk.Entry(r); e_total.pack(side=tk.LEFT, fill=tk.X, expand=True)
                 r=row("Paid (₹)"); e_paid=ttk.Entry(r); e_paid.pack(side=tk.LEFT, fill=tk.X, expand=True)
                 res={"ok":False,"values":None}; btns=ttk.Frame(frm); btns.pack(fill=tk.X, pady=(8,0))
                 def ok():
                     if not v.get(): messagebox.showerror("Missing","Choose a prescription."); return
+                    presc_id=picked_id(v, "prescriptions")
+                    if presc_id is None: messagebox.showerror("Invalid","Pick the prescription from the list."); return
                     try:
-                        presc_id=int(v.get().split(" - ",1)[0]); total=float(e_total.get().strip()); paid=float(e_paid.get().strip())
+                        total=float(e_total.get().strip()); paid=float(e_paid.get().strip())
                     except ValueError: messagebox.showerror("Invalid","Amounts must be numbers."); return
                     res["ok"]=True; res["values"]=dict(presc_id=presc_id,total=total,paid=paid); dlg.destroy()
                 ttk.Button(btns, text="Cancel", command=dlg.destroy).pack(side=tk.RIGHT)
@@ -538,18 +619,13 @@ class App(tk.Tk):
             def insert_row(self, _v):
                 ok, data = self._insert_dialog()
                 if not ok: return
-                from datetime import date
-                with sqlite3.connect(DB_PATH) as c:
-                    c.execute("INSERT INTO billing (prescription_id,total_amount,paid_amount,billing_date) VALUES (?,?,?,?)",
-                              (data["presc_id"], data["total"], data["paid"], date.today().isoformat())); c.commit()
+                billing.generate_bill(data["presc_id"], data["total"], data["paid"])
             def update_row(self, row_id, v):
                 try: paid=float(v["paid_amount"])
                 except ValueError: raise ValueError("Paid amount must be a number.")
-                with sqlite3.connect(DB_PATH) as c:
-                    c.execute("UPDATE billing SET paid_amount=? WHERE id=?", (paid, row_id)); c.commit()
+                billing.update_bill_payment(row_id, paid)
             def delete_row(self, row_id):
-                with sqlite3.connect(DB_PATH) as c:
-                    c.execute("DELETE FROM billing WHERE id=?", (row_id,)); c.commit()
+                billing.delete_bill(row_id)
         self.tab_billing = BillingTab(self.notebook)
         self.tab_appointments = AppointmentsTab(self.notebook)
 
@@ -567,6 +643,10 @@ class App(tk.Tk):
         self.log_stream = GuiStream(self.log_text)
         self.tab_ai = AITab(self.notebook, self.log_stream)
         self.notebook.add(self.tab_ai, text="AI")
+        self.tab_revenue = RevenueTab(self.notebook)
+        self.notebook.add(self.tab_revenue, text="Revenue")
+        self.tab_stats = StatsTab(self.notebook)
+        self.notebook.add(self.tab_stats, text="Query Stats")
         log_tab = ttk.Frame(self.notebook, padding=8)
         self.notebook.add(log_tab, text="Log")
         self.log_text.pack(in_=log_tab, fill=tk.BOTH, expand=True)
@@ -585,14 +665,13 @@ class App(tk.Tk):
         self.theme.apply_text_widget_colors(self.log_text)
 
     def on_init_db(self) -> None:
-        if not confirm("Initialize Database", "This will (re)create the schema. Continue?"): return
+        if not confirm("Initialize Database", "This will create missing tables and apply pending schema upgrades. Continue?"): return
         def task():
             old_out, old_err = sys.stdout, sys.stderr
             try:
                 sys.stdout = self.log_stream; sys.stderr = self.log_stream
                 print("\n--- Initializing Database ---")
-                initialize_db()
-                _ensure_appointments_table()
+                initialize_db(db_path=DB_PATH)
                 print("Done."); self._refresh_all_tabs()
             except Exception:
                 traceback.print_exc()
@@ -605,7 +684,7 @@ class App(tk.Tk):
             old_out, old_err = sys.stdout, sys.stderr
             try:
                 sys.stdout = self.log_stream; sys.stderr = self.log_stream
-                print("\n--- Inserting Dummy Data ---"); insert_dummy_data(); print("Done.")
+                print("\n--- Inserting Dummy Data ---"); insert_dummy_data(db_path=DB_PATH); print("Done.")
                 self._refresh_all_tabs()
             except Exception:
                 traceback.print_exc()
@@ -613,11 +692,27 @@ class App(tk.Tk):
                 sys.stdout, sys.stderr = old_out, old_err
         in_thread(task)
 
+    def on_backup(self) -> None:
+        def task():
+            old_out, old_err = sys.stdout, sys.stderr
+            try:
+                sys.stdout = self.log_stream; sys.stderr = self.log_stream
+                print("\n--- Backing up Database ---")
+                backup.backup(DB_PATH, os.path.join(os.path.dirname(DB_PATH), "backups"))
+            except Exception:
+                traceback.print_exc()
+            finally:
+                sys.stdout, sys.stderr = old_out, old_err
+        in_thread(task)
+
     def _refresh_all_tabs(self) -> None:
         for tab in (self.tab_doctors, self.tab_patients, self.tab_inventory,
-                    self.tab_prescriptions, self.tab_billing, self.tab_appointments):
+                    self.tab_prescriptions, self.tab_billing, self.tab_appointments, self.tab_revenue):
             self.after(0, tab.refresh)
 
 if __name__ == "__main__":
+    if os.environ.get("VETAI_BRANCH"):  # as in main.py: this window and every module use that branch's database
+        DB_PATH = branches.activate(os.environ["VETAI_BRANCH"])
+    metrics.start_from_env(DB_PATH)
     app = App()
     app.mainloop()
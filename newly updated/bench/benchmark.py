@@ -0,0 +1,338 @@
+# bench/benchmark.py
+"""
+Scale benchmarks for every public module function and the GUI tab refresh.
+
+    python -m bench.benchmark --sizes 10k 100k --out bench/results.json
+    python -m bench.benchmark --sizes 10k --compare bench/baseline.json
+
+Databases are generated once per (size, seed) with seed.insert_dummy_data and
+cached under bench/.dbs/; every run works on a fresh copy so write benchmarks
+never leak into the next size.  CrudTab.refresh is timed headless: the real
+query/filter/sort/insert loop runs against a tree stand-in, so no display is
+needed (pass --gui to time real Treeview inserts instead).
+"""
+from __future__ import annotations
+
+import argparse
+import contextlib
+import inspect
+import io
+import itertools
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import statistics
+import sys
+import time
+from datetime import date, timedelta
+from typing import Any, Callable
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)                     # modules/, db/, seed/
+GUI_ROOT = os.path.dirname(ROOT)                 # app_tk.py
+for p in (ROOT, GUI_ROOT):
+    if p not in sys.path:
+        sys.path.insert(0, p)
+
+from db import init_db, migrations  # noqa: E402
+from modules import (doctors, patients, inventory, prescriptions, billing, appointments, ai, dedupe, search,  # noqa: E402
+                     interactions)
+from seed.insert_dummy_data import SCALES, generate  # noqa: E402
+
+MODULES = [doctors, patients, inventory, prescriptions, billing, appointments, ai, dedupe, search, interactions]
+CACHE_DIR = os.path.join(HERE, ".dbs")
+SIZES = ("10k", "100k", "1m")
+# Interactive menus are not benchmarked.
+SKIP = {"manage_doctors", "manage_patients", "manage_inventory", "manage_prescriptions",
+        "manage_billing", "manage_appointments", "run_ai_features", "print_patient_timeline",
+        "review_duplicates", "manage_owner"}
+
+
+# -------------------- Fixtures --------------------
+
+class Ctx:
+    """Per-size state handed to the case builders."""
+
+    def __init__(self, db_path: str, seed: int) -> None:
+        self.db_path = db_path
+        self.rng = random.Random(seed)
+        self.seq = itertools.count(1)
+        with sqlite3.connect(db_path) as conn:
+            self.max_id = {t: conn.execute(f"SELECT COALESCE(MAX(id), 1) FROM {t}").fetchone()[0]
+                           for t in ("doctors", "patients", "inventory", "prescriptions", "billing", "appointments")}
+
+    def any_id(self, table: str) -> int:
+        return self.rng.randint(1, self.max_id[table])
+
+
+# name -> (setup(ctx) -> args, not timed). The call itself is module.<name>(*args);
+# connections among the args are closed after each call.
+CASES: dict[str, Callable[[Ctx], tuple]] = {
+    "doctors.list_doctors": lambda c: (),
+    "doctors.add_doctor": lambda c: (f"BENCH{next(c.seq)}", "Dr. Bench", "9800000000", "bench@vet.in", 2010),
+    "doctors.update_doctor": lambda c: (c.any_id("doctors"), f"BENCHU{next(c.seq)}", "Dr. Bench", "9800000000",
+                                        "bench@vet.in", 2011),
+    "doctors.delete_doctor": lambda c: (doctors.add_doctor(f"BENCHD{next(c.seq)}", "Dr. Gone", "", "", 2000),),
+    "patients.list_patients": lambda c: (),
+    "patients.add_patient": lambda c: ("Bench", "Dog", "Indie", "Bench Owner", "9000000000"),
+    "patients.update_patient": lambda c: (c.any_id("patients"), "Bench", "Cat", "Persian", "Bench Owner", "9000000001"),
+    "patients.delete_patient": lambda c: (patients.add_patient("Gone", "Dog", "", "", ""),),
+    "patients.patient_timeline": lambda c: (c.any_id("patients"),),
+    "patients.find_owner": lambda c: ("+91 90000 00000",),
+    "patients.list_owner_pets": lambda c: (c.any_id("patients") // 2 or 1,),
+    "patients.update_owner": lambda c: (1, "Bench Owner", f"97{next(c.seq):08d}"),
+    "inventory.list_items": lambda c: (),
+    "inventory.expiring_items": lambda c: (30,),
+    "inventory.add_item": lambda c: ("Bench Drug", "Bench", 10, 9.5, "2030-01-01"),
+    "inventory.update_item": lambda c: (c.any_id("inventory"), "Bench Drug", "Bench", 11, 9.5, "2030-01-01"),
+    "inventory.delete_item": lambda c: (inventory.add_item("Gone", "", 1, 1.0, "2030-01-01"),),
+    "prescriptions.list_prescriptions": lambda c: (),
+    "prescriptions.add_prescription": lambda c: (c.any_id("patients"), c.any_id("doctors"), "Bench", "Amoxicillin",
+                                                 "10mg", "Once daily", None, None, True),
+    "prescriptions.update_prescription": lambda c: (c.any_id("prescriptions"), "Bench", "Meloxicam", "5mg", "Daily",
+                                                    None, True),
+    "prescriptions.delete_prescription": lambda c: (prescriptions.add_prescription(1, 1, "Gone", "X", "", ""),),
+    "billing.list_bills": lambda c: (),
+    "billing.generate_bill": lambda c: (c.any_id("prescriptions"), 500.0, 250.0),
+    "billing.update_bill_payment": lambda c: (c.any_id("billing"), 100.0),
+    "billing.delete_bill": lambda c: (billing.generate_bill(1, 10.0, 10.0),),
+    "billing.list_owner_bills": lambda c: (c.any_id("patients") // 2 or 1,),
+    "billing.revenue_summary": lambda c: ("week",),
+    "billing.print_revenue_summary": lambda c: ("doctor", "2024-01-01", "2024-12-31"),
+    "billing.rebuild_revenue_rollups": lambda c: (),
+    "appointments.ensure_table": lambda c: (),
+    "appointments.list_appointments": lambda c: (),
+    "appointments.appointments_between": lambda c: (date.today().isoformat(), (date.today() + timedelta(days=6)).isoformat()),
+    "appointments.add_appointment": lambda c: (c.any_id("patients"), c.any_id("doctors"), "2030-01-01", "10:00", "Bench"),
+    "appointments.update_appointment": lambda c: (c.any_id("appointments"), c.any_id("patients"), c.any_id("doctors"),
+                                                  "2030-01-02", "11:00", "Bench", "Scheduled"),
+    "appointments.delete_appointment": lambda c: (appointments.add_appointment(1, 1, "2030-01-01", "09:00", "Gone"),),
+    "ai.predict_top_drugs": lambda c: (),
+    "ai.flag_underbilled": lambda c: (),
+    "ai.flag_interactions": lambda c: (),
+    "dedupe.normalize_contact": lambda c: ("+91 98765-43210",),
+    "dedupe.normalize_name": lambda c: ("  Mr. Tommy-Lee ",),
+    "dedupe.soundex": lambda c: ("Tommy",),
+    "dedupe.blocking_keys": lambda c: ("Tommy", "Dog", "Ravi Kumar", "9876543210"),
+    "dedupe.build_index": lambda c: (),
+    "dedupe.score": lambda c: (("Tommy", "Dog", "Ravi Kumar", "9876543210"), ("Tomy", "Dog", "Ravi Kumar", "09876543210")),
+    "dedupe.find_duplicates": lambda c: (),
+    "dedupe.merge_patients": lambda c: (patients.add_patient("Keep", "Dog", "", "Bench", "9000000002"),
+                                        patients.add_patient("Kep", "Dog", "", "Bench", "9000000002")),
+    "search.trigrams": lambda c: ("Amoxicillin",),
+    "search.fuzzy_lookup": lambda c: ("patient", "Budy"),
+    "search.prefix_lookup": lambda c: ("patient", "Bu"),
+    "interactions.normalize": lambda c: ("  Metacam (1.5 mg/ml) ",),
+    "interactions.describe": lambda c: (interactions.Finding(1, None, "Meloxicam", "interaction", "Prednisolone", 1,
+                                                             "major", "GI ulceration"),),
+    "interactions.knowledge_base": lambda c: (),
+    "interactions.check_conn": lambda c: (sqlite3.connect(c.db_path), c.any_id("patients"), "Meloxicam"),
+    "interactions.check": lambda c: (c.any_id("patients"), "Meloxicam"),
+    "interactions.check_edit_conn": lambda c: (sqlite3.connect(c.db_path), c.any_id("prescriptions"), "Meloxicam"),
+    "interactions.check_edit": lambda c: (c.any_id("prescriptions"), "Meloxicam"),
+    "interactions.recheck_active": lambda c: (),
+}
+
+
+def public_functions() -> dict[str, Callable]:
+    found = {}
+    for mod in MODULES:
+        short = mod.__name__.rsplit(".", 1)[-1]
+        for name, fn in inspect.getmembers(mod, inspect.isfunction):
+            if fn.__module__ == mod.__name__ and not name.startswith("_") and name not in SKIP:
+                found[f"{short}.{name}"] = fn
+    return found
+
+
+def build_db(size: str, seed: int, workers: int) -> str:
+    """Return a fresh working copy of the cached database for `size`."""
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    template = os.path.join(CACHE_DIR, f"clinic-{size}-s{seed}-v{migrations.latest_version()}.db")
+    if not os.path.exists(template):
+        print(f"Building {size} database (seed={seed})...")
+        tmp = template + ".tmp"
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        with contextlib.redirect_stdout(io.StringIO()), _patched(init_db, tmp):
+            init_db.initialize_db()
+        generate(SCALES[size], seed=seed, db_path=tmp, workers=workers, end=date(2025, 6, 30))
+        os.replace(tmp, template)
+    work = os.path.join(CACHE_DIR, f"work-{size}.db")
+    shutil.copyfile(template, work)
+    return work
+
+
+@contextlib.contextmanager
+def _patched(mod: Any, db_path: str):
+    old = mod.DB_PATH
+    mod.DB_PATH = db_path
+    try:
+        yield
+    finally:
+        mod.DB_PATH = old
+
+
+# -------------------- Timing --------------------
+
+def time_call(setup: Callable[[], tuple], fn: Callable, repeat: int, budget: float) -> dict[str, float]:
+    samples: list[float] = []
+    spent = 0.0
+    while len(samples) < repeat and (not samples or spent < budget):
+        args = setup()
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                t0 = time.perf_counter()
+                fn(*args)
+                dt = time.perf_counter() - t0
+        finally:
+            for a in args:   # teardown: connections a case opened in setup
+                if isinstance(a, sqlite3.Connection):
+                    a.close()
+        samples.append(dt)
+        spent += dt
+    return {"median_ms": statistics.median(samples) * 1e3, "min_ms": min(samples) * 1e3, "runs": len(samples)}
+
+
+class _HeadlessTree:
+    """The subset of ttk.Treeview that CrudTab.refresh touches."""
+
+    def __init__(self) -> None:
+        self._rows: dict[str, tuple] = {}
+        self._next = 0
+
+    def get_children(self, *_a) -> list[str]:
+        return list(self._rows)
+
+    def delete(self, iid: str) -> None:
+        del self._rows[iid]
+
+    def insert(self, _parent: str, _index: str, values: tuple = (), tags: tuple = ()) -> str:
+        self._next += 1
+        iid = f"I{self._next}"
+        self._rows[iid] = values
+        return iid
+
+    def tag_configure(self, *_a, **_kw) -> None:
+        pass
+
+
+class _Var:
+    def get(self) -> str:
+        return ""
+
+
+def gui_cases(db_path: str, gui: bool) -> dict[str, Callable[[], Any]]:
+    """Build one refresh callable per module-level CrudTab subclass."""
+    try:
+        import app_tk
+    except Exception as e:  # tkinter missing or app import failure
+        print(f"⚠️ Skipping CrudTab.refresh: {e}")
+        return {}
+    app_tk.DB_PATH = db_path
+
+    tabs = [app_tk.DoctorsTab, app_tk.PatientsTab, app_tk.InventoryTab,
+            app_tk.PrescriptionsTab, app_tk.AppointmentsTab]
+    if gui:
+        root = app_tk.tk.Tk()
+        root.withdraw()
+        return {f"app_tk.{cls.__name__}.refresh": cls(root).refresh for cls in tabs}
+
+    out = {}
+    for cls in tabs:
+        tab = object.__new__(cls)
+        tab.tree, tab._filter_var, tab.inputs = _HeadlessTree(), _Var(), {}
+        tab._sort_col, tab._sort_desc = None, False
+        tab.winfo_toplevel = lambda: None
+        out[f"app_tk.{cls.__name__}.refresh"] = (lambda t=tab, c=cls: c.refresh(t))
+    return out
+
+
+def run_size(size: str, seed: int, workers: int, repeat: int, budget: float, gui: bool) -> dict[str, dict]:
+    db_path = build_db(size, seed, workers)
+    results: dict[str, dict] = {}
+    saved = [(m, m.DB_PATH) for m in MODULES]
+    for m in MODULES:
+        m.DB_PATH = db_path
+    try:
+        ctx = Ctx(db_path, seed)
+        for name, fn in sorted(public_functions().items()):
+            case = CASES.get(name)
+            if case is None:
+                print(f"⚠️ No benchmark case for {name}")
+                continue
+            results[name] = time_call(lambda: case(ctx), fn, repeat, budget)
+            print(f"  [{size:>4}] {name:<40}{results[name]['median_ms']:>12.3f} ms")
+        for name, refresh in gui_cases(db_path, gui).items():
+            results[name] = time_call(tuple, refresh, repeat, budget)
+            print(f"  [{size:>4}] {name:<40}{results[name]['median_ms']:>12.3f} ms")
+    finally:
+        for m, p in saved:
+            m.DB_PATH = p
+    return results
+
+
+# -------------------- Baseline comparison --------------------
+
+def compare(current: dict, baseline: dict, threshold: float, floor_ms: float = 1.0) -> list[str]:
+    """
+    Return human-readable regressions: best-of-N time slower than the baseline
+    by more than `threshold`.  Timings under `floor_ms` are treated as noise.
+    """
+    regressions = []
+    for size, funcs in current["results"].items():
+        for name, r in funcs.items():
+            base = baseline.get("results", {}).get(size, {}).get(name)
+            if not base:
+                continue
+            old, new = base["min_ms"], r["min_ms"]
+            if new > max(old, floor_ms) * (1 + threshold):
+                regressions.append(f"[{size}] {name}: {old:.3f} ms -> {new:.3f} ms (+{(new / old - 1) * 100:.0f}%)"
+                                   if old else f"[{size}] {name}: new {new:.3f} ms")
+    return regressions
+
+
+def main(argv: list[str] | None = None) -> int:
+    ap = argparse.ArgumentParser(description="Benchmark module functions at several database sizes.")
+    ap.add_argument("--sizes", nargs="+", choices=SIZES, default=["10k"])
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--budget", type=float, default=2.0, help="Seconds per function before repeats stop early.")
+    ap.add_argument("--gui", action="store_true", help="Time refresh on real Tk widgets (needs a display).")
+    ap.add_argument("--out", default=os.path.join(HERE, "results.json"))
+    ap.add_argument("--compare", metavar="BASELINE", help="Flag regressions against a stored results file.")
+    ap.add_argument("--threshold", type=float, default=0.25, help="Allowed slowdown before flagging (0.25 = 25%%).")
+    args = ap.parse_args(argv)
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "seed": args.seed,
+        },
+        "results": {size: run_size(size, args.seed, args.workers, args.repeat, args.budget, args.gui)
+                    for size in args.sizes},
+    }
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"📄 Results written to {args.out}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            regressions = compare(report, json.load(f), args.threshold)
+        if regressions:
+            print(f"❌ {len(regressions)} regression(s) over {args.threshold:.0%}:")
+            for line in regressions:
+                print("   " + line)
+            return 1
+        print("✅ No regressions against baseline.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,104 @@
+# bench/bulk_export.py
+"""
+Throughput of db.bulk on a large prescriptions table.
+
+    python -m bench.bulk_export                     # 1M prescriptions, all formats
+    python -m bench.bulk_export --rows 100000 --formats csv csv.gz
+
+The database is generated once with seed.insert_dummy_data and cached under
+bench/.dbs/.  Each format is exported, then imported back into an empty copy
+of the schema (with fresh ids, so foreign keys still resolve) to time the
+validating import path as well.
+"""
+from __future__ import annotations
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import shutil
+import sqlite3
+import sys
+import time
+from datetime import date
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from db import bulk, init_db, migrations  # noqa: E402
+from seed.insert_dummy_data import generate  # noqa: E402
+
+CACHE_DIR = os.path.join(HERE, ".dbs")
+FORMATS = ("csv", "csv.gz", "jsonl", "jsonl.gz")
+
+
+def build_db(rows: int, seed: int, workers: int) -> str:
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    path = os.path.join(CACHE_DIR, f"prescriptions-{rows}-s{seed}-v{migrations.latest_version()}.db")
+    if not os.path.exists(path):
+        print(f"Building database with {rows:,} prescriptions (seed={seed})...")
+        tmp = path + ".tmp"
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        old = init_db.DB_PATH
+        init_db.DB_PATH = tmp
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                init_db.initialize_db()
+        finally:
+            init_db.DB_PATH = old
+        counts = dict(doctors=600, patients=max(rows // 5, 1), inventory=1_000, prescriptions=rows, appointments=0)
+        generate(counts, seed=seed, db_path=tmp, workers=workers, end=date(2025, 6, 30))
+        os.replace(tmp, path)
+    return path
+
+
+def run(rows: int, formats: list[str], seed: int, workers: int, import_back: bool) -> dict:
+    db_path = build_db(rows, seed, workers)
+    out_dir = os.path.join(CACHE_DIR, "bulk")
+    os.makedirs(out_dir, exist_ok=True)
+    results = {}
+    for fmt in formats:
+        path = os.path.join(out_dir, f"prescriptions.{fmt}")
+        r = bulk.export_table("prescriptions", path, db_path)
+        results[f"export.{fmt}"] = r
+        print(f"  export {fmt:<9}{r['rows']:>10,} rows {r['seconds']:>8.2f}s {r['rows_per_s']:>10,} rows/s "
+              f"{r['bytes'] / 1e6:>8.1f} MB")
+        if import_back:
+            target = os.path.join(out_dir, "import.db")
+            shutil.copyfile(db_path, target)
+            with contextlib.closing(sqlite3.connect(target)) as conn, conn:
+                conn.execute("DELETE FROM billing")
+                conn.execute("DELETE FROM prescriptions")
+            t0 = time.perf_counter()
+            r = bulk.import_table("prescriptions", path, target, keep_ids=False, resume=False)
+            results[f"import.{fmt}"] = r
+            print(f"  import {fmt:<9}{r['inserted']:>10,} rows {r['seconds']:>8.2f}s {r['rows_per_s']:>10,} rows/s "
+                  f"({r['rejected']} rejected, {time.perf_counter() - t0:.2f}s wall)")
+            os.remove(target)
+        os.remove(path)
+    return results
+
+
+def main(argv: list[str] | None = None) -> None:
+    ap = argparse.ArgumentParser(description="Measure bulk export/import throughput on prescriptions.")
+    ap.add_argument("--rows", type=int, default=1_000_000)
+    ap.add_argument("--formats", nargs="+", choices=FORMATS, default=list(FORMATS))
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    ap.add_argument("--no-import", action="store_true", help="Only time exports.")
+    ap.add_argument("--out", help="Write the results as JSON here.")
+    args = ap.parse_args(argv)
+    results = run(args.rows, args.formats, args.seed, args.workers, not args.no_import)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump({"rows": args.rows, "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "results": results},
+                      f, indent=2)
+        print(f"📄 Results written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,294 @@
+# bench/load.py
+"""
+Busy-clinic load test: receptionists and vets working concurrently.
+
+    python -m bench.load                                    # 4 receptionists + 4 vets, 30 s, "clinic-day"
+    python -m bench.load --size 100k --receptionists 8 --vets 8 --processes
+    python -m bench.load --scenario reporting --mix vet.predict_top_drugs=10 receptionist.list_patients=0
+
+Every member of staff is a thread (or, with --processes, a process, so the
+GIL is out of the picture) that keeps picking an operation from its role's
+weighted mix and calling the real module function, optionally pausing
+--think-ms (exponentially distributed) between calls.  Reported per
+operation: calls, throughput, p50/p95/p99 latency, "database is
+locked/busy" errors and other errors.  The run works on a copy of the
+database (clinic.db, --db, or a generated --size) unless --in-place.
+"""
+from __future__ import annotations
+
+import argparse
+import contextlib
+import json
+import multiprocessing
+import os
+import queue
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+from typing import Callable
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from bench.benchmark import MODULES, build_db  # noqa: E402
+from db import migrations  # noqa: E402
+from modules import patients, prescriptions, billing, appointments, inventory, ai, search, interactions  # noqa: E402
+
+DB_PATH = os.path.join(ROOT, "clinic.db")
+SECONDS = 30.0
+MEDICATIONS = ("Amoxicillin", "Meloxicam", "Carprofen", "Doxycycline", "Metronidazole", "Prednisolone")
+SPECIES = ("Dog", "Cat", "Rabbit", "Bird")
+
+
+class Staff:
+    """One simulated member of staff: its random stream and the ids it can refer to."""
+
+    def __init__(self, db_path: str, seed: int) -> None:
+        self.rng = random.Random(seed)
+        with contextlib.closing(sqlite3.connect(db_path)) as conn:
+            self.max_id = {t: conn.execute(f"SELECT COALESCE(MAX(id), 1) FROM {t}").fetchone()[0]
+                           for t in ("doctors", "patients", "prescriptions", "billing")}
+        self.made: dict[str, list[int]] = {"patients": [], "prescriptions": []}
+
+    def any_id(self, table: str) -> int:
+        """A random existing id, preferring rows this member of staff created (recent work)."""
+        mine = self.made.get(table)
+        if mine and self.rng.random() < 0.5:
+            return self.rng.choice(mine)
+        return self.rng.randint(1, self.max_id[table])
+
+    def created(self, table: str, row_id: int) -> int:
+        self.made[table].append(row_id)
+        return row_id
+
+    def day(self, ahead: int = 14) -> str:
+        return (date.today() + timedelta(days=self.rng.randint(0, ahead))).isoformat()
+
+    def contact(self) -> str:
+        return f"9{self.rng.randint(0, 999_999_999):09d}"
+
+
+def prescribe(s: Staff) -> int:
+    # As the menus do: show the interaction check, then the vet overrides.
+    pid, med = s.any_id("patients"), s.rng.choice(MEDICATIONS)
+    interactions.check(pid, med, db_path=prescriptions.DB_PATH)
+    return s.created("prescriptions", prescriptions.add_prescription(
+        pid, s.any_id("doctors"), "Routine", med, "10mg", "Once daily", allow_interactions=True))
+
+
+# name -> call(staff).  Every call goes through the public module function.
+OPS: dict[str, Callable[[Staff], object]] = {
+    "add_patient": lambda s: s.created("patients", patients.add_patient(
+        f"Pet{s.rng.randint(1, 99_999)}", s.rng.choice(SPECIES), "", f"Owner{s.rng.randint(1, 9_999)}", s.contact())),
+    "find_owner": lambda s: patients.find_owner(s.contact()),
+    "patient_timeline": lambda s: patients.patient_timeline(s.any_id("patients")),
+    "list_patients": lambda s: patients.list_patients(),
+    "add_appointment": lambda s: appointments.add_appointment(
+        s.any_id("patients"), s.any_id("doctors"), s.day(),
+        f"{s.rng.randint(9, 17):02d}:{s.rng.choice((0, 15, 30, 45)):02d}", "Checkup"),
+    "appointments_between": lambda s: appointments.appointments_between(s.day(0), s.day(7)),
+    "list_appointments": lambda s: appointments.list_appointments(),
+    "add_prescription": prescribe,
+    "list_prescriptions": lambda s: prescriptions.list_prescriptions(),
+    "generate_bill": lambda s: billing.generate_bill(s.any_id("prescriptions"), 500.0, s.rng.choice((0.0, 250.0, 500.0))),
+    "update_bill_payment": lambda s: billing.update_bill_payment(s.any_id("billing"), 500.0),
+    "list_bills": lambda s: billing.list_bills(),
+    "revenue_summary": lambda s: billing.revenue_summary("week"),
+    "expiring_items": lambda s: inventory.expiring_items(30),
+    "fuzzy_lookup": lambda s: search.fuzzy_lookup("patient", f"Pet{s.rng.randint(1, 999)}"),
+    "predict_top_drugs": lambda s: ai.predict_top_drugs(),
+    "flag_underbilled": lambda s: ai.flag_underbilled(),
+}
+
+# scenario -> role -> {operation: weight}
+SCENARIOS: dict[str, dict[str, dict[str, float]]] = {
+    "clinic-day": {
+        "receptionist": {"add_patient": 2, "find_owner": 4, "add_appointment": 4, "appointments_between": 4,
+                         "generate_bill": 3, "update_bill_payment": 2, "fuzzy_lookup": 2, "list_appointments": 0.2},
+        "vet": {"add_prescription": 5, "patient_timeline": 5, "appointments_between": 3, "fuzzy_lookup": 1,
+                "expiring_items": 1, "predict_top_drugs": 0.2, "list_prescriptions": 0.1},
+    },
+    "front-desk-rush": {
+        "receptionist": {"add_patient": 5, "find_owner": 3, "add_appointment": 6, "generate_bill": 4,
+                         "update_bill_payment": 3},
+        "vet": {"add_prescription": 6, "patient_timeline": 2},
+    },
+    "reporting": {
+        "receptionist": {"list_patients": 1, "list_bills": 1, "list_appointments": 1, "revenue_summary": 2,
+                         "add_appointment": 2},
+        "vet": {"list_prescriptions": 1, "predict_top_drugs": 2, "flag_underbilled": 2, "add_prescription": 2},
+    },
+}
+
+
+def parse_mix(scenario: str, overrides: list[str]) -> dict[str, dict[str, float]]:
+    """The scenario's mixes with `role.operation=weight` overrides applied (weight 0 removes it)."""
+    mixes = {role: dict(mix) for role, mix in SCENARIOS[scenario].items()}
+    for item in overrides:
+        try:
+            key, weight = item.split("=")
+            role, op = key.split(".")
+            weight = float(weight)
+        except ValueError:
+            raise ValueError(f"Bad mix override {item!r}; expected role.operation=weight.") from None
+        if role not in mixes or op not in OPS:
+            raise ValueError(f"Unknown role or operation in {item!r}.")
+        mixes[role][op] = weight
+    for role, mix in mixes.items():
+        mixes[role] = {op: w for op, w in mix.items() if w > 0}
+    return mixes
+
+
+# -------------------- Workers --------------------
+
+def _lock_error(err: sqlite3.OperationalError) -> bool:
+    msg = str(err).lower()
+    return "locked" in msg or "busy" in msg
+
+
+def _work(role: str, mix: dict[str, float], db_path: str, seconds: float, think_ms: float, seed: int,
+          barrier, out) -> None:
+    """Run one member of staff for `seconds` after the barrier; puts its tallies on `out`."""
+    for mod in MODULES:
+        mod.DB_PATH = db_path
+    staff = Staff(db_path, seed)
+    names, weights = list(mix), list(mix.values())
+    latencies: dict[str, list[float]] = {op: [] for op in names}
+    locks = dict.fromkeys(names, 0)
+    errors = dict.fromkeys(names, 0)
+    barrier.wait()
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        op = staff.rng.choices(names, weights)[0]
+        t0 = time.perf_counter()
+        try:
+            OPS[op](staff)
+        except sqlite3.OperationalError as e:
+            (locks if _lock_error(e) else errors)[op] += 1
+        except Exception:
+            errors[op] += 1
+        else:
+            latencies[op].append(time.perf_counter() - t0)
+        if think_ms:
+            time.sleep(staff.rng.expovariate(1000 / think_ms))
+    out.put({"role": role, "latencies": latencies, "locks": locks, "errors": errors})
+
+
+def _process_main(*args) -> None:
+    sys.stdout = open(os.devnull, "w")        # the AI functions print their summaries
+    _work(*args)
+
+
+def _percentile(sorted_values: list[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+def run(receptionists: int = 4, vets: int = 4, seconds: float = SECONDS, scenario: str = "clinic-day",
+        mix: list[str] | None = None, db_path: str | None = None, in_place: bool = False,
+        processes: bool = False, think_ms: float = 0.0, seed: int = 42) -> dict:
+    """Simulate the staff against `db_path` (a copy unless `in_place`); returns the per-operation results."""
+    mixes = parse_mix(scenario, mix or [])
+    roles = ["receptionist"] * receptionists + ["vet"] * vets
+    with tempfile.TemporaryDirectory() as tmp:
+        work = db_path or DB_PATH
+        if not in_place:
+            copy = os.path.join(tmp, "load.db")
+            with contextlib.closing(sqlite3.connect(work)) as src, contextlib.closing(sqlite3.connect(copy)) as dst:
+                src.backup(dst)
+            work = copy
+        migrations.ensure_schema(work)
+
+        saved = [(m, m.DB_PATH) for m in MODULES]
+        if processes:
+            ctx = multiprocessing.get_context("spawn")
+            barrier, out = ctx.Barrier(len(roles) + 1), ctx.Queue()
+            workers = [ctx.Process(target=_process_main,
+                                   args=(r, mixes[r], work, seconds, think_ms, seed + n, barrier, out))
+                       for n, r in enumerate(roles)]
+        else:
+            barrier, out = threading.Barrier(len(roles) + 1), queue.Queue()
+            workers = [threading.Thread(target=_work,
+                                        args=(r, mixes[r], work, seconds, think_ms, seed + n, barrier, out))
+                       for n, r in enumerate(roles)]
+        try:
+            with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+                for w in workers:
+                    w.start()
+                barrier.wait()
+                t0 = time.perf_counter()
+                tallies = [out.get() for _ in workers]
+                elapsed = time.perf_counter() - t0
+                for w in workers:
+                    w.join()
+        finally:
+            for m, p in saved:
+                m.DB_PATH = p
+
+    per_op: dict[str, dict] = {}
+    for t in tallies:
+        for op, lat in t["latencies"].items():
+            r = per_op.setdefault(op, {"latencies": [], "lock_errors": 0, "errors": 0})
+            r["latencies"] += lat
+            r["lock_errors"] += t["locks"][op]
+            r["errors"] += t["errors"][op]
+    results = {}
+    for op, r in sorted(per_op.items()):
+        lat = sorted(r["latencies"])
+        results[op] = {"calls": len(lat), "per_s": round(len(lat) / elapsed, 1),
+                       "p50_ms": round(_percentile(lat, 0.50) * 1e3, 2),
+                       "p95_ms": round(_percentile(lat, 0.95) * 1e3, 2),
+                       "p99_ms": round(_percentile(lat, 0.99) * 1e3, 2),
+                       "lock_errors": r["lock_errors"], "errors": r["errors"]}
+    total = sum(r["calls"] for r in results.values())
+    return {"scenario": scenario, "receptionists": receptionists, "vets": vets,
+            "mode": "processes" if processes else "threads", "seconds": round(elapsed, 3),
+            "ops": total, "ops_per_s": round(total / elapsed, 1),
+            "lock_errors": sum(r["lock_errors"] for r in results.values()),
+            "errors": sum(r["errors"] for r in results.values()), "operations": results}
+
+
+def main(argv: list[str] | None = None) -> None:
+    ap = argparse.ArgumentParser(description="Simulate concurrent receptionists and vets against the clinic database.")
+    ap.add_argument("--receptionists", type=int, default=4)
+    ap.add_argument("--vets", type=int, default=4)
+    ap.add_argument("--seconds", type=float, default=SECONDS)
+    ap.add_argument("--scenario", choices=sorted(SCENARIOS), default="clinic-day")
+    ap.add_argument("--mix", nargs="*", default=[], metavar="ROLE.OP=WEIGHT",
+                    help=f"Override the scenario's weights. Operations: {', '.join(OPS)}.")
+    ap.add_argument("--think-ms", type=float, default=0.0, help="Mean pause between a staff member's operations.")
+    ap.add_argument("--processes", action="store_true", help="One process per staff member instead of a thread.")
+    src = ap.add_mutually_exclusive_group()
+    src.add_argument("--db", default=DB_PATH)
+    src.add_argument("--size", choices=("10k", "100k", "1m"), help="Use a generated benchmark database.")
+    ap.add_argument("--in-place", action="store_true", help="Write to --db itself instead of a copy.")
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--out", help="Write the results as JSON here.")
+    args = ap.parse_args(argv)
+
+    db_path = build_db(args.size, args.seed, os.cpu_count() or 1) if args.size else args.db
+    r = run(args.receptionists, args.vets, args.seconds, args.scenario, args.mix, db_path,
+            args.in_place or bool(args.size), args.processes, args.think_ms, args.seed)
+    print(f"\n🏥 {r['scenario']}: {r['receptionists']} receptionists + {r['vets']} vets ({r['mode']}), "
+          f"{r['seconds']:.1f} s")
+    print(f"  {'operation':<22}{'calls':>8}{'ops/s':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+          f"{'locked':>8}{'errors':>8}")
+    for op, o in r["operations"].items():
+        print(f"  {op:<22}{o['calls']:>8,}{o['per_s']:>9,.1f}{o['p50_ms']:>10.2f}{o['p95_ms']:>10.2f}"
+              f"{o['p99_ms']:>10.2f}{o['lock_errors']:>8}{o['errors']:>8}")
+    print(f"  {'total':<22}{r['ops']:>8,}{r['ops_per_s']:>9,.1f}{'':>30}{r['lock_errors']:>8}{r['errors']:>8}")
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump({"timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "results": r}, f, indent=2)
+        print(f"📄 Results written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+# bench/writer.py
+"""
+Write throughput with concurrent producers: one commit per write versus the
+group-commit writer (db.writer), used directly and through the modules.
+
+    python -m bench.writer                          # 16 producers x 500 inserts each
+    python -m bench.writer --producers 32 --writes 200 --window-ms 5
+
+Each producer inserts patients as fast as it can and waits for every write to
+be durable before issuing the next, like a front-desk client.  "direct" opens a
+connection and commits per write; "writer" sends the same INSERT through a
+writer; "modules" calls patients.add_patient, which reaches the process's
+writer through db.transaction.connection_for.  Runs on a fresh database in WAL
+mode.
+"""
+from __future__ import annotations
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import sqlite3
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from db import init_db, writer  # noqa: E402
+from db.instrument import connect  # noqa: E402
+from modules import patients  # noqa: E402
+
+SQL = "INSERT INTO patients (name, species, breed, owner_name, owner_contact) VALUES (?, ?, ?, ?, ?)"
+
+
+def _fresh_db(directory: str) -> str:
+    path = os.path.join(directory, "writer-bench.db")
+    old = init_db.DB_PATH
+    init_db.DB_PATH = path
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            init_db.initialize_db()
+    finally:
+        init_db.DB_PATH = old
+    return path
+
+
+def _direct(db_path: str, i: int) -> None:
+    with contextlib.closing(connect(db_path, timeout=30)) as conn:
+        conn.execute(SQL, (f"Pet{i}", "Dog", "", "Bench", f"9{i:09d}"))
+        conn.commit()
+
+
+def run(mode: str, producers: int, writes: int, window_ms: float) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = _fresh_db(tmp)
+        w = writer.Writer(db_path, window=window_ms / 1000) if mode == "writer" else None
+        if mode == "modules":
+            old_path, patients.DB_PATH = patients.DB_PATH, db_path
+            writer.get_writer(db_path).window = window_ms / 1000
+        latencies: list[list[float]] = [[] for _ in range(producers)]
+        errors = [0] * producers
+        start = threading.Barrier(producers + 1)
+
+        def producer(n: int) -> None:
+            start.wait()
+            for k in range(writes):
+                i = n * writes + k
+                t0 = time.perf_counter()
+                try:
+                    if mode == "direct":
+                        _direct(db_path, i)
+                    elif mode == "modules":
+                        patients.add_patient(f"Pet{i}", "Dog", "", "Bench", f"9{i:09d}")
+                    else:
+                        w.execute(SQL, (f"Pet{i}", "Dog", "", "Bench", f"9{i:09d}")).result()
+                except sqlite3.OperationalError:
+                    errors[n] += 1
+                latencies[n].append(time.perf_counter() - t0)
+
+        threads = [threading.Thread(target=producer, args=(n,)) for n in range(producers)]
+        for t in threads:
+            t.start()
+        start.wait()
+        t0 = time.perf_counter()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - t0
+        batches = None
+        if mode == "modules":
+            w, patients.DB_PATH = writer.get_writer(db_path), old_path
+        if w is not None:
+            w.close()
+            batches = w.stats["batches"]
+        with contextlib.closing(sqlite3.connect(db_path)) as conn:
+            stored = conn.execute("SELECT COUNT(*) FROM patients").fetchone()[0]
+
+    lat = sorted(x for per in latencies for x in per)
+    q = statistics.quantiles(lat, n=100)
+    return {"mode": mode, "producers": producers, "writes": producers * writes, "stored": stored,
+            "seconds": round(elapsed, 3), "writes_per_s": round(producers * writes / elapsed),
+            "p50_ms": round(q[49] * 1e3, 2), "p99_ms": round(q[98] * 1e3, 2),
+            "lock_errors": sum(errors), "batches": batches}
+
+
+def main(argv: list[str] | None = None) -> None:
+    ap = argparse.ArgumentParser(description="Compare per-write commits with the group-commit writer.")
+    ap.add_argument("--producers", type=int, default=16)
+    ap.add_argument("--writes", type=int, default=500, help="Writes per producer.")
+    ap.add_argument("--window-ms", type=float, default=writer.WINDOW_S * 1000)
+    ap.add_argument("--modes", nargs="+", choices=("direct", "writer", "modules"),
+                    default=["direct", "writer", "modules"])
+    ap.add_argument("--out", help="Write the results as JSON here.")
+    args = ap.parse_args(argv)
+    results = []
+    for mode in args.modes:
+        r = run(mode, args.producers, args.writes, args.window_ms)
+        results.append(r)
+        print(f"  {mode:<7}{r['writes_per_s']:>9,} writes/s  p50 {r['p50_ms']:>7.2f} ms  p99 {r['p99_ms']:>8.2f} ms  "
+              f"{r['lock_errors']} lock errors  {r['stored']:,} stored"
+              + (f"  ({r['batches']:,} commits)" if r["batches"] is not None else ""))
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump({"timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "results": results}, f, indent=2)
+        print(f"📄 Results written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,278 @@
+# db/archive.py
+"""
+Hot/cold archival of old prescriptions and bills.
+
+A prescription is closed once its date is a valid day before the cutoff and
+it has been billed, every bill dated before the cutoff and paid in full.
+Legacy dates that are not YYYY-MM-DD (see db.dates.invalid_dates) keep a
+prescription hot, as does a missing bill.  archive() moves closed
+prescriptions, together with their bills, into one database per year
+(<name>.archive-<year>.db next to the clinic database), a batch at a time.
+Each batch holds the clinic database's write lock while it
+
+  1. re-checks which of its prescriptions are still closed (a bill added or
+     changed since they were selected keeps a prescription hot),
+  2. copies exactly those, with their bills, into the year's archive through
+     a separate connection and commits it there,
+  3. deletes exactly those ids from the clinic database and commits.
+
+No write can land between the check and the delete, so a row is never both
+archived and hot.  A crash after step 2 leaves copies that the next run
+overwrites and then deletes, so nothing is lost and archive() can always
+simply be re-run.  (Attached databases are not committed atomically in WAL
+mode, hence the separate archive connection and the fixed order.)  Revenue
+rollups are untouched (migration 12), so revenue_summary() still covers
+archived years.  The change feed and the columnar cache see the moves as
+deletes.
+
+History is read through history(), a connection with the archives attached
+and TEMP views prescriptions_all / billing_all (hot UNION ALL archives), or
+attached() on a connection of one's own; patients.patient_timeline() reads
+the archives too.  Everything else reads the clinic database only: lists
+such as prescriptions.list_prescriptions() show hot rows, and reports like
+ai.flag_underbilled() never needed archived bills, which are paid in full.
+
+    python -m db.archive run [--older-than-days 730]
+    python -m db.archive list
+"""
+from __future__ import annotations
+
+import argparse
+import glob
+import os
+import re
+import sqlite3
+import time
+from contextlib import contextmanager
+from datetime import date, timedelta
+from typing import Iterator
+
+from db import dates, migrations
+from db.instrument import connect, readonly_uri
+
+DB_PATH = os.path.join(os.path.dirname(__file__), "..", "clinic.db")
+KEEP_DAYS = 730
+BATCH_SIZE = 2000
+MAX_ATTACH = 10         # SQLite's default limit of attached databases
+TABLES = ("prescriptions", "billing")
+ARCHIVE_INDEXES = (
+    "CREATE INDEX IF NOT EXISTS {a}.idx_prescriptions_patient_date ON prescriptions(patient_id, date)",
+    "CREATE INDEX IF NOT EXISTS {a}.idx_prescriptions_date ON prescriptions(date)",
+    "CREATE INDEX IF NOT EXISTS {a}.idx_billing_prescription ON billing(prescription_id)",
+    "CREATE INDEX IF NOT EXISTS {a}.idx_billing_date ON billing(billing_date)",
+)
+
+
+def archive_path(year: str | int, db_path: str | None = None) -> str:
+    base, _ = os.path.splitext(os.path.abspath(db_path or DB_PATH))
+    return f"{base}.archive-{year}.db"
+
+
+def list_archives(db_path: str | None = None) -> dict[str, str]:
+    """year -> archive file, oldest first."""
+    pattern = re.escape(archive_path("", db_path)[:-3]) + r"(\d{4})\.db$"
+    found = {}
+    for path in glob.glob(glob.escape(archive_path("", db_path)[:-3]) + "*.db"):
+        m = re.match(pattern, path)
+        if m:
+            found[m.group(1)] = path
+    return dict(sorted(found.items()))
+
+
+def _columns(conn: sqlite3.Connection, schema: str, table: str) -> list[tuple[str, str]]:
+    return [(r[1], r[2]) for r in conn.execute(f"PRAGMA {schema}.table_info({table})")]
+
+
+def _prepare(conn: sqlite3.Connection, sink: sqlite3.Connection) -> None:
+    """Create the archive's tables, or add columns the clinic database has gained since."""
+    for table in TABLES:
+        have = {c for c, _ in _columns(sink, "main", table)}
+        cols = _columns(conn, "main", table)
+        if not have:
+            defs = ", ".join("id INTEGER PRIMARY KEY" if c == "id" else f"{c} {t}".strip() for c, t in cols)
+            sink.execute(f"CREATE TABLE {table} ({defs})")
+        for c, t in cols:
+            if c not in have and have:
+                sink.execute(f"ALTER TABLE {table} ADD COLUMN {c} {t}".strip())
+    for sql in ARCHIVE_INDEXES:
+        sink.execute(sql.format(a="main"))
+
+
+def _closed(cutoff: str) -> tuple[str, list]:
+    """WHERE fragment (on prescriptions p) and parameters selecting closed prescriptions."""
+    where, params = dates.day_range("p.date", None, date.fromisoformat(cutoff) - timedelta(days=1))
+    return f"""{where}
+          AND EXISTS (SELECT 1 FROM billing b WHERE b.prescription_id = p.id)
+          AND NOT EXISTS (SELECT 1 FROM billing b WHERE b.prescription_id = p.id
+                          AND NOT IFNULL({dates.day_sql("b.billing_date")} < ? AND b.paid_amount >= b.total_amount, 0))
+    """, [*params, dates.epoch_day(cutoff)]
+
+
+def _candidates(conn: sqlite3.Connection, cutoff: str, after_id: int, limit: int) -> list[tuple[int, str]]:
+    """(prescription id, archive year) of the next closed prescriptions after `after_id`."""
+    where, params = _closed(cutoff)
+    rows = conn.execute(f"""
+        SELECT p.id, {dates.day_sql("p.date")} FROM prescriptions p
+        WHERE p.id > ? AND {where} ORDER BY p.id LIMIT ?""", (after_id, *params, limit)).fetchall()
+    return [(pid, f"{dates.from_epoch_day(day).year:04d}") for pid, day in rows]
+
+
+def _move(conn: sqlite3.Connection, sink: sqlite3.Connection, ids: list[int], cutoff: str) -> tuple[int, int]:
+    """Move those of prescriptions `ids` still closed, and their bills, to `sink`; returns counts."""
+    cols = {t: [c for c, _ in _columns(conn, "main", t)] for t in TABLES}
+    where, params = _closed(cutoff)
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        ids = [r[0] for r in conn.execute(
+            f"SELECT p.id FROM prescriptions p WHERE p.id IN ({','.join('?' * len(ids))}) AND {where}",
+            (*ids, *params))]
+        marks = ",".join("?" * len(ids))
+        rows = {"prescriptions": conn.execute(f"SELECT {', '.join(cols['prescriptions'])} FROM prescriptions "
+                                              f"WHERE id IN ({marks})", ids).fetchall(),
+                "billing": conn.execute(f"SELECT {', '.join(cols['billing'])} FROM billing "
+                                        f"WHERE prescription_id IN ({marks})", ids).fetchall()}
+        if ids:
+            sink.execute("BEGIN")
+            try:
+                for table in TABLES:
+                    sink.executemany(f"INSERT OR REPLACE INTO {table} ({', '.join(cols[table])}) "
+                                     f"VALUES ({', '.join('?' * len(cols[table]))})", rows[table])
+                sink.execute("COMMIT")
+            except BaseException:
+                if sink.in_transaction:
+                    sink.execute("ROLLBACK")
+                raise
+            conn.execute("INSERT INTO archive_guard (active) VALUES (1)")
+            conn.execute(f"DELETE FROM billing WHERE prescription_id IN ({marks})", ids)
+            conn.execute(f"DELETE FROM prescriptions WHERE id IN ({marks})", ids)
+            conn.execute("DELETE FROM archive_guard")
+        conn.execute("COMMIT")
+    except BaseException:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        raise
+    return len(rows["prescriptions"]), len(rows["billing"])
+
+
+def archive(keep_days: int = KEEP_DAYS, before: str | None = None, batch_size: int = BATCH_SIZE,
+            db_path: str | None = None, verbose: bool = False) -> dict[str, tuple[int, int]]:
+    """
+    Move closed prescriptions dated before `before` (default: `keep_days`
+    ago) and their bills to the yearly archives; returns
+    {year: (prescriptions, bills)} moved.
+    """
+    db_path = db_path or DB_PATH
+    migrations.ensure_schema(db_path)
+    cutoff = before or (date.today() - timedelta(days=keep_days)).isoformat()
+    moved: dict[str, list[int]] = {}
+    conn = connect(db_path, isolation_level=None, timeout=30)
+    sinks: dict[str, sqlite3.Connection] = {}
+    try:
+        last_id, t0 = 0, time.perf_counter()
+        while True:
+            batch = _candidates(conn, cutoff, last_id, batch_size)
+            if not batch:
+                break
+            last_id = batch[-1][0]
+            by_year: dict[str, list[int]] = {}
+            for pid, year in batch:
+                by_year.setdefault(year, []).append(pid)
+            for year, ids in by_year.items():
+                if year not in sinks:
+                    if len(sinks) == MAX_ATTACH:
+                        for sink in sinks.values():
+                            sink.close()
+                        sinks.clear()
+                    sink = sinks[year] = connect(archive_path(year, db_path), isolation_level=None, timeout=30)
+                    _prepare(conn, sink)
+                rx, bills = _move(conn, sinks[year], ids, cutoff)
+                totals = moved.setdefault(year, [0, 0])
+                totals[0] += rx
+                totals[1] += bills
+            if verbose:
+                n = sum(t[0] for t in moved.values())
+                print(f"  {n:,} prescriptions archived ({n / (time.perf_counter() - t0):,.0f}/s)")
+    finally:
+        for sink in sinks.values():
+            sink.close()
+        conn.close()
+    return {year: (rx, bills) for year, (rx, bills) in moved.items()}
+
+
+@contextmanager
+def attached(conn: sqlite3.Connection, years: list[str] | None = None,
+             db_path: str | None = None) -> Iterator[dict[str, str]]:
+    """Attach the archives (all, or `years`) read-only to `conn`; yields {alias: year}."""
+    archives = list_archives(db_path or DB_PATH)
+    years = list(archives) if years is None else [y for y in map(str, years) if y in archives]
+    if len(years) > MAX_ATTACH:
+        raise ValueError(f"At most {MAX_ATTACH} archive years can be attached at once; pass years=.")
+    present = {row[1] for row in conn.execute("PRAGMA database_list")}
+    aliases, mine = {}, []
+    try:
+        for year in years:
+            if f"a{year}" not in present:   # still attached from earlier in this transaction
+                conn.execute(f"ATTACH DATABASE ? AS a{year}", (readonly_uri(archives[year]),))
+                mine.append(f"a{year}")
+            aliases[f"a{year}"] = year
+        yield aliases
+    finally:
+        # DETACH is refused inside a transaction; the caller's rollback/close (or the
+        # writer, after its batch) releases them then.
+        if not conn.in_transaction:
+            for alias in mine:
+                conn.execute(f"DETACH DATABASE {alias}")
+
+
+@contextmanager
+def history(years: list[str] | None = None, db_path: str | None = None) -> Iterator[sqlite3.Connection]:
+    """
+    Connection to the clinic database with its archives attached and TEMP
+    views prescriptions_all and billing_all covering hot and archived rows.
+    """
+    db_path = db_path or DB_PATH
+    conn = connect(db_path, uri=True)
+    try:
+        with attached(conn, years, db_path) as aliases:
+            for table in TABLES:
+                cols = [c for c, _ in _columns(conn, "main", table)]
+                arms = [f"SELECT {', '.join(cols)} FROM main.{table}"]
+                for alias in aliases:
+                    have = {c for c, _ in _columns(conn, alias, table)}
+                    arms.append(f"SELECT {', '.join(c if c in have else f'NULL AS {c}' for c in cols)} "
+                                f"FROM {alias}.{table}")
+                conn.execute(f"CREATE TEMP VIEW {table}_all AS {' UNION ALL '.join(arms)}")
+            yield conn
+    finally:
+        conn.close()
+
+
+def main(argv: list[str] | None = None) -> None:
+    ap = argparse.ArgumentParser(description="Archive closed prescriptions and bills into yearly databases.")
+    ap.add_argument("--db", default=DB_PATH)
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    run = sub.add_parser("run")
+    run.add_argument("--older-than-days", type=int, default=KEEP_DAYS)
+    run.add_argument("--before", help="YYYY-MM-DD cutoff (overrides --older-than-days)")
+    run.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    sub.add_parser("list")
+    args = ap.parse_args(argv)
+
+    if args.cmd == "run":
+        moved = archive(args.older_than_days, args.before, args.batch_size, args.db, verbose=True)
+        for year, (rx, bills) in moved.items():
+            print(f"🗄️  {year}: {rx:,} prescriptions, {bills:,} bills archived")
+        if not moved:
+            print("Nothing to archive.")
+    else:
+        for year, path in list_archives(args.db).items():
+            conn = connect(path)
+            try:
+                rx, bills = (conn.execute(f"SELECT COUNT(*) FROM {t}").fetchone()[0] for t in TABLES)
+            finally:
+                conn.close()
+            print(f"{year}  {rx:>10,} prescriptions {bills:>10,} bills  {path}")
+
+
+if __name__ == "__main__":
+    main()
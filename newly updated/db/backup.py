@@ -0,0 +1,201 @@
+# db/backup.py
+"""
+Online backups through the SQLite backup API.
+
+Pages are copied in small steps with a pause between them, so the clinic can
+keep writing while a snapshot is taken (copying a live file, as the old
+clinic.db.bak was made, can capture a torn database).  Snapshots are
+timestamped, integrity-checked, rotated, and described by a JSON sidecar
+with size, checksum and throughput.
+
+    python -m db.backup                      # take a snapshot into backups/
+    python -m db.backup --list
+    python -m db.backup --restore backups/clinic-20250101-101500-000000.db --to restored.db
+"""
+from __future__ import annotations
+
+import argparse
+import glob
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from datetime import datetime
+
+from db.instrument import readonly_uri
+
+DB_PATH = os.path.join(os.path.dirname(__file__), "..", "clinic.db")
+BACKUP_DIR = os.path.join(os.path.dirname(__file__), "..", "backups")
+PAGES_PER_STEP = 256          # ~1 MB with 4 KB pages
+STEP_SLEEP = 0.005            # seconds between steps; writers get the lock in between
+KEEP = 7
+MAX_RESTARTS = 3              # then fall back to a single-step copy
+
+
+class _Restarted(Exception):
+    """The source kept changing mid-backup, so SQLite kept restarting the copy."""
+
+
+def _checksum(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def verify(snapshot: str, quick: bool = False) -> bool:
+    """Run (quick_|integrity_)check on a snapshot and compare its sidecar checksum."""
+    conn = sqlite3.connect(readonly_uri(snapshot), uri=True)
+    try:
+        result = conn.execute("PRAGMA quick_check" if quick else "PRAGMA integrity_check").fetchone()[0]
+    finally:
+        conn.close()
+    if result != "ok":
+        return False
+    meta_path = snapshot + ".json"
+    if os.path.exists(meta_path):
+        with open(meta_path, "r", encoding="utf-8") as f:
+            return json.load(f).get("sha256") in (None, _checksum(snapshot))
+    return True
+
+
+def backup(db_path: str | None = None, dest_dir: str | None = None, keep: int = KEEP,
+           pages: int = PAGES_PER_STEP, sleep: float = STEP_SLEEP, verbose: bool = True) -> dict:
+    """
+    Snapshot `db_path` into `dest_dir` without blocking writers for long.
+    Returns the snapshot's metadata (also written next to it as <file>.json).
+    """
+    db_path = db_path or DB_PATH
+    dest_dir = dest_dir or BACKUP_DIR
+    os.makedirs(dest_dir, exist_ok=True)
+    base = os.path.splitext(os.path.basename(db_path))[0]
+    # Microseconds keep names unique and lexically sortable by age.
+    target = os.path.join(dest_dir, f"{base}-{datetime.now():%Y%m%d-%H%M%S-%f}.db")
+    partial = target + ".partial"
+
+    steps = restarts = 0
+    last_remaining = None
+
+    def progress(_status: int, remaining: int, total: int) -> None:
+        nonlocal steps, restarts, last_remaining
+        steps += 1
+        if last_remaining is not None and remaining > last_remaining:
+            restarts += 1
+            if restarts > MAX_RESTARTS:
+                raise _Restarted()
+        last_remaining = remaining
+
+    t0 = time.perf_counter()
+    src = sqlite3.connect(db_path)
+    dst = sqlite3.connect(partial)
+    try:
+        try:
+            src.backup(dst, pages=pages, progress=progress, sleep=sleep)
+        except _Restarted:
+            # Busy source: copy in one step (one read transaction; WAL writers are not blocked).
+            src.backup(dst, pages=-1)
+        page_size = dst.execute("PRAGMA page_size").fetchone()[0]
+        page_count = dst.execute("PRAGMA page_count").fetchone()[0]
+    finally:
+        dst.close()
+        src.close()
+    copy_s = time.perf_counter() - t0
+
+    t1 = time.perf_counter()
+    ok = verify(partial)
+    verify_s = time.perf_counter() - t1
+    if not ok:
+        os.remove(partial)
+        raise RuntimeError(f"Backup of {db_path} failed integrity_check; snapshot discarded.")
+    os.replace(partial, target)
+
+    size = os.path.getsize(target)
+    meta = {
+        "source": os.path.abspath(db_path),
+        "snapshot": os.path.abspath(target),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "bytes": size,
+        "pages": page_count,
+        "page_size": page_size,
+        "steps": steps,
+        "restarts": restarts,
+        "copy_seconds": round(copy_s, 4),
+        "verify_seconds": round(verify_s, 4),
+        "mb_per_second": round(size / 1e6 / copy_s, 2) if copy_s else None,
+        "sha256": _checksum(target),
+    }
+    with open(target + ".json", "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+    removed = rotate(dest_dir, base, keep)
+
+    if verbose:
+        print(f"✅ Backup {os.path.basename(target)}: {size / 1e6:.1f} MB in {copy_s:.2f}s "
+              f"({meta['mb_per_second']} MB/s, {steps} steps), verified in {verify_s:.2f}s"
+              + (f", rotated out {len(removed)}" if removed else ""))
+    return meta
+
+
+def snapshots(dest_dir: str | None = None, base: str = "clinic") -> list[str]:
+    """Snapshot paths, oldest first."""
+    return sorted(glob.glob(os.path.join(dest_dir or BACKUP_DIR, f"{base}-*.db")))
+
+
+def rotate(dest_dir: str, base: str, keep: int) -> list[str]:
+    old = snapshots(dest_dir, base)[:-keep] if keep > 0 else []
+    for path in old:
+        for p in (path, path + ".json"):
+            if os.path.exists(p):
+                os.remove(p)
+    return old
+
+
+def restore(snapshot: str, dest_path: str, verbose: bool = True) -> float:
+    """
+    Restore a verified snapshot into a fresh `dest_path` (never over an
+    existing file) in a single backup step; returns seconds taken.
+    """
+    if os.path.exists(dest_path):
+        raise FileExistsError(f"{dest_path} already exists; restore into a fresh path.")
+    if not verify(snapshot, quick=True):
+        raise RuntimeError(f"{snapshot} failed verification; not restoring.")
+    t0 = time.perf_counter()
+    src = sqlite3.connect(readonly_uri(snapshot), uri=True)
+    dst = sqlite3.connect(dest_path)
+    try:
+        src.backup(dst, pages=-1)
+    finally:
+        dst.close()
+        src.close()
+    elapsed = time.perf_counter() - t0
+    if verbose:
+        print(f"✅ Restored {os.path.basename(snapshot)} to {dest_path} in {elapsed:.2f}s")
+    return elapsed
+
+
+def main(argv: list[str] | None = None) -> None:
+    ap = argparse.ArgumentParser(description="Online SQLite backups with rotation and verification.")
+    ap.add_argument("--db", default=DB_PATH)
+    ap.add_argument("--dir", default=BACKUP_DIR)
+    ap.add_argument("--keep", type=int, default=KEEP)
+    ap.add_argument("--pages", type=int, default=PAGES_PER_STEP, help="Pages copied per step.")
+    ap.add_argument("--sleep", type=float, default=STEP_SLEEP, help="Seconds to pause between steps.")
+    ap.add_argument("--list", action="store_true", help="List snapshots and whether they verify.")
+    ap.add_argument("--restore", metavar="SNAPSHOT")
+    ap.add_argument("--to", metavar="PATH", help="Destination for --restore.")
+    args = ap.parse_args(argv)
+
+    if args.list:
+        for path in snapshots(args.dir, os.path.splitext(os.path.basename(args.db))[0]):
+            print(f"{'ok ' if verify(path, quick=True) else 'BAD'} {path} ({os.path.getsize(path) / 1e6:.1f} MB)")
+    elif args.restore:
+        if not args.to:
+            ap.error("--restore needs --to PATH")
+        restore(args.restore, args.to)
+    else:
+        backup(args.db, args.dir, keep=args.keep, pages=args.pages, sleep=args.sleep)
+
+
+if __name__ == "__main__":
+    main()
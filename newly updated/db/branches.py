@@ -0,0 +1,270 @@
+# db/branches.py
+"""
+One database file per clinic branch, plus cross-branch reports.
+
+branches.json maps a branch id to its name and database file; without it
+there is a single branch, "main", stored in clinic.db, and it stays
+registered when the first extra branch is added.  activate() routes
+every module that holds a DB_PATH (ROUTED: the clinic modules, the db tools,
+the seeder) to a branch by pointing it at that branch's file, so a branch
+never touches another branch's data and adding branches costs a single
+branch nothing.
+
+Cross-branch reports either ATTACH the shards read-only to one connection
+and run a single UNION ALL query (at most MAX_ATTACH shards per connection,
+groups of shards run in parallel), or run the per-branch function on every
+shard in a thread pool and merge the results.
+
+    python -m db.branches list
+    python -m db.branches add north "North Clinic"
+    python -m db.branches report top-drugs|revenue|underbilled
+"""
+from __future__ import annotations
+
+import argparse
+import importlib
+import json
+import os
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Callable, Iterator
+
+from db import dates, migrations
+from db.instrument import connect, readonly_uri
+
+ROOT = os.path.join(os.path.dirname(__file__), "..")
+DB_PATH = os.path.join(ROOT, "clinic.db")
+REGISTRY_PATH = os.environ.get("VETAI_BRANCHES", os.path.join(ROOT, "branches.json"))
+BRANCH_DIR = os.path.join(ROOT, "branches")
+DEFAULT_BRANCH = "main"
+MAX_ATTACH = 8          # SQLite's default limit is 10 attached databases
+# Modules whose DB_PATH follows the active branch: every default database path except this module's.
+ROUTED = (
+    "modules", "modules.doctors", "modules.patients", "modules.inventory", "modules.prescriptions",
+    "modules.billing", "modules.appointments", "modules.ai", "modules.dedupe", "modules.interactions",
+    "modules.search",
+    "db.archive", "db.backup", "db.bulk", "db.changes", "db.columnar", "db.dates", "db.explain", "db.init_db",
+    "db.metrics", "db.migrations", "db.refcache", "db.snapshot", "db.transaction", "db.writer",
+    "seed.insert_dummy_data",
+)
+
+_lock = threading.Lock()
+_active = DEFAULT_BRANCH
+
+
+# -------------------- Registry --------------------
+
+def load_registry(path: str | None = None) -> dict[str, dict]:
+    """branch id -> {"name", "path"}; paths in the file are relative to it."""
+    path = path or REGISTRY_PATH
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return {DEFAULT_BRANCH: {"name": "Main clinic", "path": os.path.abspath(DB_PATH)}}
+    base = os.path.dirname(os.path.abspath(path))
+    return {b: {"name": v["name"], "path": os.path.normpath(os.path.join(base, v["path"]))} for b, v in data.items()}
+
+
+def _save_registry(registry: dict[str, dict], path: str) -> None:
+    base = os.path.dirname(os.path.abspath(path))
+    data = {b: {"name": v["name"], "path": os.path.relpath(v["path"], base)} for b, v in registry.items()}
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp, path)
+
+
+def list_branches(registry_path: str | None = None) -> list[tuple[str, str, str]]:
+    return [(b, v["name"], v["path"]) for b, v in load_registry(registry_path).items()]
+
+
+def branch_path(branch_id: str, registry_path: str | None = None) -> str:
+    registry = load_registry(registry_path)
+    if branch_id not in registry:
+        raise ValueError(f"Unknown branch {branch_id!r}; known: {', '.join(registry)}.")
+    return registry[branch_id]["path"]
+
+
+def add_branch(branch_id: str, name: str, path: str | None = None, registry_path: str | None = None) -> str:
+    """Register a branch and create its database (fully migrated); returns the file path."""
+    registry_path = registry_path or REGISTRY_PATH
+    with _lock:
+        registry = load_registry(registry_path)
+        if branch_id in registry:
+            raise ValueError(f"Branch {branch_id!r} already exists.")
+        path = os.path.abspath(path or os.path.join(BRANCH_DIR, f"{branch_id}.db"))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        migrations.migrate(path, verbose=False)
+        registry[branch_id] = {"name": name, "path": path}
+        _save_registry(registry, registry_path)
+    return path
+
+
+# -------------------- Routing --------------------
+
+def active_branch() -> str:
+    return _active
+
+
+def activate(branch_id: str, registry_path: str | None = None) -> str:
+    """Point every routed module at `branch_id`'s database; returns its path."""
+    global _active
+    path = branch_path(branch_id, registry_path)
+    migrations.ensure_schema(path)
+    for name in ROUTED:
+        importlib.import_module(name).DB_PATH = path
+    _active = branch_id
+    return path
+
+
+@contextmanager
+def use(branch_id: str, registry_path: str | None = None) -> Iterator[str]:
+    """Route to `branch_id` for the duration of the block, then restore the previous routing."""
+    global _active
+    saved = [(m, m.DB_PATH) for m in map(importlib.import_module, ROUTED)]
+    previous = _active
+    try:
+        yield activate(branch_id, registry_path)
+    finally:
+        for m, path in saved:
+            m.DB_PATH = path
+        _active = previous
+
+
+# -------------------- Federation --------------------
+
+def _shards(branches: list[str] | None, registry_path: str | None) -> dict[str, str]:
+    shards = {b: branch_path(b, registry_path) for b in branches or load_registry(registry_path)}
+    for path in shards.values():
+        migrations.ensure_schema(path)
+    return shards
+
+
+def fanout(fn: Callable[[str], object], branches: list[str] | None = None,
+           registry_path: str | None = None, workers: int | None = None) -> dict[str, object]:
+    """Run fn(db_path) on every branch in parallel; returns {branch: result}."""
+    shards = _shards(branches, registry_path)
+    with ThreadPoolExecutor(max_workers=workers or min(8, len(shards)) or 1) as pool:
+        futures = {b: pool.submit(fn, path) for b, path in shards.items()}
+        return {b: f.result() for b, f in futures.items()}
+
+
+@contextmanager
+def attached(shards: dict[str, str]) -> Iterator[tuple]:
+    """One connection with each shard attached read-only; yields (conn, {alias: branch})."""
+    if len(shards) > MAX_ATTACH:
+        raise ValueError(f"At most {MAX_ATTACH} shards can be attached at once.")
+    conn = connect(":memory:", uri=True)
+    try:
+        aliases = {}
+        for i, (branch, path) in enumerate(shards.items()):
+            conn.execute(f"ATTACH DATABASE ? AS s{i}", (readonly_uri(path),))
+            aliases[f"s{i}"] = branch
+        yield conn, aliases
+    finally:
+        conn.close()
+
+
+def federated_query(sql: str, params: tuple = (), branches: list[str] | None = None,
+                    registry_path: str | None = None) -> list[tuple]:
+    """
+    Run `sql` against every shard and return the rows with the branch id
+    prepended.  `sql` names tables as {db}.table; shards are attached in groups
+    of MAX_ATTACH, each group one UNION ALL query, groups in parallel.
+    """
+    shards = _shards(branches, registry_path)
+    items = list(shards.items())
+    groups = [dict(items[i:i + MAX_ATTACH]) for i in range(0, len(items), MAX_ATTACH)]
+
+    def run(group: dict[str, str]) -> list[tuple]:
+        with attached(group) as (conn, aliases):
+            union = " UNION ALL ".join(f"SELECT ? AS branch, * FROM ({sql.format(db=a)})" for a in aliases)
+            args = [x for b in aliases.values() for x in (b, *params)]
+            return conn.execute(union, args).fetchall()
+
+    if len(groups) == 1:
+        return run(groups[0])
+    with ThreadPoolExecutor(max_workers=min(8, len(groups))) as pool:
+        return [row for rows in pool.map(run, groups) for row in rows]
+
+
+# -------------------- Cross-branch reports --------------------
+
+def top_drugs(days: int = 90, top_n: int = 5, branches: list[str] | None = None,
+              registry_path: str | None = None) -> list[tuple[str, int]]:
+    """(medication, count) over all branches for the last `days`, like ai.predict_top_drugs."""
+    where, params = dates.day_range("date", datetime.now().date() - timedelta(days=days))
+    rows = federated_query(f"SELECT medication, COUNT(*) FROM {{db}}.prescriptions WHERE {where} GROUP BY +medication",
+                           tuple(params), branches, registry_path)
+    counts: Counter = Counter()
+    for _, med, n in rows:
+        counts[med] += n
+    return counts.most_common(top_n)
+
+
+def underbilled(threshold: float = 0.6, branches: list[str] | None = None,
+                registry_path: str | None = None) -> list[tuple]:
+    """(branch, bill_id, prescription_id, patient_name, total, paid), like ai.flag_underbilled."""
+    return sorted(federated_query("""
+        SELECT b.id, b.prescription_id, pt.name, b.total_amount, b.paid_amount
+        FROM {db}.billing b
+        JOIN {db}.prescriptions p ON b.prescription_id = p.id
+        JOIN {db}.patients pt     ON p.patient_id    = pt.id
+        WHERE b.paid_amount < ? * b.total_amount""", (threshold,), branches, registry_path))
+
+
+def revenue(by: str = "month", start: str | None = None, end: str | None = None,
+            branches: list[str] | None = None, registry_path: str | None = None) -> list[tuple]:
+    """billing.revenue_summary summed over branches (doctors stay per branch)."""
+    from modules import billing
+
+    per_branch = fanout(lambda path: billing.revenue_summary(by, start, end, db_path=path), branches, registry_path)
+    totals: dict[str, list] = {}
+    for branch, rows in per_branch.items():
+        for label, n, billed, collected, _ in rows:
+            key = f"{branch}: {label}" if by == "doctor" else label
+            t = totals.setdefault(key, [0, 0.0, 0.0])
+            t[0] += n
+            t[1] += billed
+            t[2] += collected
+    out = [(k, n, round(b, 2), round(c, 2), round(b - c, 2)) for k, (n, b, c) in totals.items()]
+    return sorted(out) if by in ("day", "week", "month") else sorted(out, key=lambda r: -r[2])
+
+
+def main(argv: list[str] | None = None) -> None:
+    ap = argparse.ArgumentParser(description="Manage clinic branches and run cross-branch reports.")
+    ap.add_argument("--registry", default=REGISTRY_PATH)
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("list")
+    add = sub.add_parser("add")
+    add.add_argument("branch_id")
+    add.add_argument("name")
+    add.add_argument("--path")
+    rep = sub.add_parser("report")
+    rep.add_argument("kind", choices=("top-drugs", "revenue", "underbilled"))
+    rep.add_argument("--branches", nargs="+")
+    args = ap.parse_args(argv)
+
+    if args.cmd == "list":
+        for b, name, path in list_branches(args.registry):
+            print(f"{b:<12} {name:<24} {path}")
+    elif args.cmd == "add":
+        print(f"✅ Branch {args.branch_id} created at {add_branch(args.branch_id, args.name, args.path, args.registry)}")
+    elif args.kind == "top-drugs":
+        for i, (med, n) in enumerate(top_drugs(branches=args.branches, registry_path=args.registry), 1):
+            print(f"{i}. {med} — used {n} times")
+    elif args.kind == "revenue":
+        for label, n, billed, collected, outstanding in revenue(branches=args.branches, registry_path=args.registry):
+            print(f"{label:<28} {n:>7} ₹{billed:>14,.2f} ₹{collected:>14,.2f} ₹{outstanding:>14,.2f}")
+    else:
+        for branch, bill_id, presc_id, patient, total, paid in underbilled(branches=args.branches,
+                                                                           registry_path=args.registry):
+            print(f"[{branch}] Bill #{bill_id} | Rx {presc_id} | {patient} | ₹{paid:.2f} / ₹{total:.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,361 @@
+# db/bulk.py
+"""
+Streaming bulk export/import for every clinic table, as CSV or JSON lines.
+
+Both directions are generator pipelines (rows -> records -> file, and
+file -> records -> validated batches -> executemany), so memory stays flat
+whatever the table size.  A ".gz" suffix turns on gzip.
+
+Exports read inside one pinned read transaction (db.snapshot.pinned): the
+file is a consistent picture of the table and the front desk is never
+blocked.  Imports validate a whole batch at a time - types and NOT NULL in
+Python, foreign keys with one IN (...) query per referenced table - and
+commit each batch together with its checkpoint row in `bulk_imports`, so an
+interrupted import resumes after the last committed batch without
+duplicating rows.  Rows that fail validation or constraints go to
+<file>.rejects.jsonl with the reason.
+
+Columns in DERIVED (patients.owner_id) are left out of exports and ignored
+on import; the owner triggers re-link each patient from its owner contact,
+so a patients file loads into a database without the same owners.
+
+CSV writes NULL as NULL_MARKER (\\N), so an empty string stays an empty
+string through a round trip.  On import an empty field in an INTEGER or REAL
+column is also read as NULL (hand-written files often leave numbers blank).
+
+    python -m db.bulk export prescriptions exports/prescriptions.csv.gz
+    python -m db.bulk export --all exports/ --format jsonl
+    python -m db.bulk import prescriptions exports/prescriptions.csv.gz
+"""
+from __future__ import annotations
+
+import argparse
+import csv
+import gzip
+import json
+import os
+import sqlite3
+import time
+from itertools import islice
+from typing import Iterable, Iterator
+
+from db import migrations, snapshot
+from db.instrument import connect
+
+DB_PATH = os.path.join(os.path.dirname(__file__), "..", "clinic.db")
+TABLES = ("doctors", "patients", "inventory", "prescriptions", "billing", "appointments")
+# Columns that triggers derive from the others: never exported, ignored on import.
+# patients.owner_id is re-linked from owner_name/owner_contact (migration 10).
+DERIVED = {"patients": ("owner_id",)}
+FORMATS = ("csv", "jsonl")
+EXPORT_BATCH = 10_000
+IMPORT_BATCH = 5_000
+NULL_MARKER = "\\N"
+
+_CASTS = {"INTEGER": int, "REAL": float}
+
+
+# -------------------- Files --------------------
+
+def _format(path: str, fmt: str | None) -> str:
+    if fmt:
+        return fmt
+    name = path[:-3] if path.endswith(".gz") else path
+    ext = os.path.splitext(name)[1].lstrip(".").lower()
+    if ext not in FORMATS:
+        raise ValueError(f"Can't tell the format of {path}; use .csv/.jsonl (optionally .gz) or pass fmt.")
+    return ext
+
+
+def _open(path: str, mode: str, compress: bool | None = None):
+    if path.endswith(".gz") if compress is None else compress:
+        return gzip.open(path, mode + "t", encoding="utf-8", newline="", compresslevel=6)
+    return open(path, mode, encoding="utf-8", newline="")
+
+
+def _check_table(table: str) -> None:
+    if table not in TABLES:
+        raise ValueError(f"Unknown table {table!r}; expected one of {', '.join(TABLES)}.")
+
+
+def _columns(conn: sqlite3.Connection, table: str) -> list[tuple[str, str, bool]]:
+    """(name, declared type, NOT NULL without default) per column, without DERIVED ones."""
+    derived = DERIVED.get(table, ())
+    return [(r[1], r[2].upper(), bool(r[3]) and r[4] is None and not r[5])
+            for r in conn.execute(f"PRAGMA table_info({table})") if r[1] not in derived]
+
+
+# -------------------- Export --------------------
+
+def _select(conn: sqlite3.Connection, table: str, cols: list[str], batch: int) -> Iterator[tuple]:
+    cur = conn.execute(f"SELECT {', '.join(cols)} FROM {table} ORDER BY id")
+    while True:
+        rows = cur.fetchmany(batch)
+        if not rows:
+            return
+        yield from rows
+
+
+def _write_csv(f, cols: list[str], rows: Iterable[tuple]) -> int:
+    w = csv.writer(f)
+    w.writerow(cols)
+    n = 0
+    for row in rows:
+        w.writerow([NULL_MARKER if v is None else v for v in row])
+        n += 1
+    return n
+
+
+def _write_jsonl(f, cols: list[str], rows: Iterable[tuple]) -> int:
+    dumps = json.JSONEncoder(ensure_ascii=False, separators=(",", ":")).encode
+    n = 0
+    for row in rows:
+        f.write(dumps(dict(zip(cols, row))))
+        f.write("\n")
+        n += 1
+    return n
+
+
+def export_table(table: str, path: str, db_path: str | None = None, fmt: str | None = None,
+                 batch_size: int = EXPORT_BATCH) -> dict:
+    """Stream `table` to `path`; returns rows, bytes, seconds and rows/s."""
+    _check_table(table)
+    fmt = _format(path, fmt)
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    partial = path + ".partial"
+    t0 = time.perf_counter()
+    with snapshot.pinned(db_path or DB_PATH) as (conn, as_of), _open(partial, "w", path.endswith(".gz")) as f:
+        cols = [c for c, _, _ in _columns(conn, table)]
+        rows = _select(conn, table, cols, batch_size)
+        n = (_write_csv if fmt == "csv" else _write_jsonl)(f, cols, rows)
+    os.replace(partial, path)
+    elapsed = time.perf_counter() - t0
+    return {"table": table, "path": path, "format": fmt, "rows": n, "bytes": os.path.getsize(path),
+            "seconds": round(elapsed, 4), "rows_per_s": round(n / elapsed) if elapsed else None,
+            "as_of": as_of.strftime("%Y-%m-%dT%H:%M:%S")}
+
+
+def export_all(dest_dir: str, db_path: str | None = None, fmt: str = "csv", compress: bool = False) -> list[dict]:
+    suffix = f".{fmt}" + (".gz" if compress else "")
+    return [export_table(t, os.path.join(dest_dir, t + suffix), db_path, fmt) for t in TABLES]
+
+
+# -------------------- Import --------------------
+
+def _read_csv(f) -> Iterator[dict]:
+    for rec in csv.DictReader(f):
+        yield {k: (None if v == NULL_MARKER else v) for k, v in rec.items()}
+
+
+def _read_jsonl(f) -> Iterator[dict]:
+    for line in f:
+        if line.strip():
+            yield json.loads(line)
+
+
+def _foreign_keys(conn: sqlite3.Connection, table: str) -> list[tuple[str, str, str]]:
+    """(column, parent table, parent column) for each FK of `table`."""
+    return [(r[3], r[2], r[4] or "id") for r in conn.execute(f"PRAGMA foreign_key_list({table})")]
+
+
+def _validate(conn: sqlite3.Connection, records: list[dict], cols: list[tuple[str, str, bool]],
+              fks: list[tuple[str, str, str]]) -> tuple[list[tuple], list[tuple[dict, str]]]:
+    """Split a batch into insertable tuples and (record, reason) rejects."""
+    typed: list[tuple[dict, list]] = []
+    rejects: list[tuple[dict, str]] = []
+    names = [c for c, _, _ in cols]
+    for rec in records:
+        unknown = rec.keys() - set(names)
+        if unknown:
+            rejects.append((rec, f"unknown column(s): {', '.join(sorted(unknown))}"))
+            continue
+        values, error = [], None
+        for name, decl, required in cols:
+            v = rec.get(name)
+            if v == "" and decl in _CASTS:
+                v = None
+            if v is None:
+                if required:
+                    error = f"{name} is required"
+                    break
+            elif decl in _CASTS:
+                try:
+                    v = _CASTS[decl](v)
+                except (TypeError, ValueError):
+                    error = f"{name}: {v!r} is not {decl}"
+                    break
+            values.append(v)
+        if error:
+            rejects.append((rec, error))
+        else:
+            typed.append((rec, values))
+
+    # One lookup per referenced table for the whole batch.
+    for col, parent, pcol in fks:
+        i = names.index(col)
+        wanted = {vals[i] for _, vals in typed if vals[i] is not None}
+        found: set = set()
+        ids = list(wanted)
+        for start in range(0, len(ids), 900):   # stay under SQLITE_MAX_VARIABLE_NUMBER on old builds
+            chunk = ids[start:start + 900]
+            found.update(r[0] for r in conn.execute(
+                f"SELECT {pcol} FROM {parent} WHERE {pcol} IN ({','.join('?' * len(chunk))})", chunk))
+        if found != wanted:
+            keep = []
+            for rec, vals in typed:
+                if vals[i] is not None and vals[i] not in found:
+                    rejects.append((rec, f"{col}={vals[i]} has no matching {parent}.{pcol}"))
+                else:
+                    keep.append((rec, vals))
+            typed = keep
+    return [tuple(v) for _, v in typed], rejects
+
+
+def _source_key(path: str) -> tuple[str, int, int]:
+    st = os.stat(path)
+    return os.path.abspath(path), st.st_size, st.st_mtime_ns
+
+
+def import_table(table: str, path: str, db_path: str | None = None, fmt: str | None = None,
+                 batch_size: int = IMPORT_BATCH, keep_ids: bool = True, resume: bool = True) -> dict:
+    """
+    Stream `path` into `table`.  With resume=True, records committed by an
+    earlier (interrupted) run of the same unchanged file are skipped.
+    keep_ids=False drops the `id` column so rows get fresh ids (merging branches).
+    Returns counts of inserted/rejected/skipped records and rows/s.
+    """
+    _check_table(table)
+    fmt = _format(path, fmt)
+    db_path = db_path or DB_PATH
+    migrations.ensure_schema(db_path)
+    source, size, mtime = _source_key(path)
+    rejects_path = path + ".rejects.jsonl"
+
+    t0 = time.perf_counter()
+    inserted = rejected = 0
+    conn = connect(db_path, isolation_level=None, timeout=30)
+    try:
+        cols = _columns(conn, table)
+        if not keep_ids:
+            cols = [c for c in cols if c[0] != "id"]
+        fks = [fk for fk in _foreign_keys(conn, table) if fk[0] not in DERIVED.get(table, ())]
+        names = [c for c, _, _ in cols]
+        sql = f"INSERT INTO {table} ({', '.join(names)}) VALUES ({', '.join('?' * len(names))})"
+
+        row = conn.execute("SELECT size, mtime_ns, records, done FROM bulk_imports WHERE source=? AND table_name=?",
+                           (source, table)).fetchone()
+        skip = 0
+        if row and resume:
+            if (row[0], row[1]) != (size, mtime):
+                raise ValueError(f"{path} changed since its earlier import into {table}; "
+                                 f"pass resume=False to import it again from the start.")
+            skip = row[2]
+            if row[3]:
+                return {"table": table, "path": path, "inserted": 0, "rejected": 0, "skipped": skip,
+                        "seconds": 0.0, "rows_per_s": None, "already_done": True}
+
+        with _open(path, "r") as f, open(rejects_path, "a" if skip else "w", encoding="utf-8") as rej:
+            records = islice((_read_csv if fmt == "csv" else _read_jsonl)(f), skip, None)
+            dropped = set(DERIVED.get(table, ())) | (set() if keep_ids else {"id"})
+            if dropped:
+                records = ({k: v for k, v in r.items() if k not in dropped} for r in records)
+            done = skip
+            while True:
+                batch = list(islice(records, batch_size))
+                if not batch:
+                    break
+                good, bad = _validate(conn, batch, cols, fks)
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    try:
+                        conn.execute("SAVEPOINT batch")
+                        conn.executemany(sql, good)
+                        conn.execute("RELEASE batch")
+                    except sqlite3.IntegrityError:
+                        # A constraint failed somewhere in the batch: isolate the offending rows.
+                        conn.execute("ROLLBACK TO batch")
+                        conn.execute("RELEASE batch")
+                        ok = []
+                        for values in good:
+                            try:
+                                conn.execute(sql, values)
+                                ok.append(values)
+                            except sqlite3.IntegrityError as e:
+                                bad.append((dict(zip(names, values)), str(e)))
+                        good = ok
+                    done += len(batch)
+                    conn.execute("""INSERT INTO bulk_imports (source, table_name, size, mtime_ns, records, done, updated_at)
+                                    VALUES (?, ?, ?, ?, ?, 0, datetime('now'))
+                                    ON CONFLICT(source, table_name) DO UPDATE SET
+                                      size=excluded.size, mtime_ns=excluded.mtime_ns,
+                                      records=excluded.records, done=0, updated_at=excluded.updated_at""",
+                                 (source, table, size, mtime, done))
+                    conn.execute("COMMIT")
+                except BaseException:
+                    if conn.in_transaction:
+                        conn.execute("ROLLBACK")
+                    raise
+                for rec, reason in bad:
+                    rej.write(json.dumps({"reason": reason, "record": rec}, ensure_ascii=False, default=str) + "\n")
+                inserted += len(good)
+                rejected += len(bad)
+        conn.execute("""INSERT INTO bulk_imports (source, table_name, size, mtime_ns, records, done, updated_at)
+                        VALUES (?, ?, ?, ?, ?, 1, datetime('now'))
+                        ON CONFLICT(source, table_name) DO UPDATE SET done=1, updated_at=excluded.updated_at""",
+                     (source, table, size, mtime, done))
+    finally:
+        conn.close()
+    if not rejected and os.path.exists(rejects_path) and os.path.getsize(rejects_path) == 0:
+        os.remove(rejects_path)
+    elapsed = time.perf_counter() - t0
+    return {"table": table, "path": path, "inserted": inserted, "rejected": rejected, "skipped": skip,
+            "seconds": round(elapsed, 4), "rows_per_s": round((inserted + rejected) / elapsed) if elapsed else None}
+
+
+# -------------------- CLI --------------------
+
+def _summary(r: dict) -> str:
+    rate = f"{r['rows_per_s']:,} rows/s" if r.get("rows_per_s") else "-"
+    if "inserted" in r:
+        if r.get("already_done"):
+            return f"⏭️ {r['path']} was already fully imported into {r['table']}"
+        return (f"✅ {r['table']}: {r['inserted']:,} inserted, {r['rejected']:,} rejected"
+                + (f", {r['skipped']:,} resumed past" if r["skipped"] else "") + f" in {r['seconds']:.2f}s ({rate})")
+    return f"✅ {r['table']}: {r['rows']:,} rows -> {r['path']} ({r['bytes'] / 1e6:.1f} MB) in {r['seconds']:.2f}s ({rate})"
+
+
+def main(argv: list[str] | None = None) -> None:
+    ap = argparse.ArgumentParser(description="Bulk CSV/JSONL export and import for clinic tables.")
+    ap.add_argument("--db", default=DB_PATH)
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    ex = sub.add_parser("export")
+    ex.add_argument("table", nargs="?", choices=TABLES)
+    ex.add_argument("path", help="Output file, or directory with --all.")
+    ex.add_argument("--all", action="store_true", help="Export every table into the directory `path`.")
+    ex.add_argument("--format", choices=FORMATS, default=None)
+    ex.add_argument("--gzip", action="store_true", help="With --all: write .gz files.")
+    im = sub.add_parser("import")
+    im.add_argument("table", choices=TABLES)
+    im.add_argument("path")
+    im.add_argument("--format", choices=FORMATS, default=None)
+    im.add_argument("--batch-size", type=int, default=IMPORT_BATCH)
+    im.add_argument("--new-ids", action="store_true", help="Ignore the file's ids and assign fresh ones.")
+    im.add_argument("--restart", action="store_true", help="Ignore any checkpoint and start from the top.")
+    args = ap.parse_args(argv)
+
+    if args.cmd == "export":
+        if args.all:
+            results = export_all(args.path, args.db, args.format or "csv", args.gzip)
+        elif args.table:
+            results = [export_table(args.table, args.path, args.db, args.format)]
+        else:
+            ap.error("export needs a table or --all")
+    else:
+        results = [import_table(args.table, args.path, args.db, args.format, args.batch_size,
+                                keep_ids=not args.new_ids, resume=not args.restart)]
+    for r in results:
+        print(_summary(r))
+
+
+if __name__ == "__main__":
+    main()
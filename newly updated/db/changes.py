@@ -0,0 +1,194 @@
+# db/changes.py
+"""
+Change-data-capture feed over the six clinic tables.
+
+Triggers (migration 11) append one change_log row per inserted, updated or
+deleted row: table, row id, operation ('I', 'U', 'D'), UTC timestamp and,
+for updates, the comma-separated columns that changed.  Updates that change
+nothing are not logged.  `seq` only grows, so a consumer remembers the last
+sequence number it has processed and asks for what came after it.
+
+Named consumers keep their position in change_consumers:
+
+    for batch in changes.tail("search-sync"):          # acks each batch after the loop body
+        for c in batch:
+            reindex(c.table, c.row_id)
+
+compact() deletes entries every registered consumer has acknowledged, so the
+log stays as long as the slowest consumer's backlog.  With no consumers
+registered nothing is deleted.
+
+    python -m db.changes status
+    python -m db.changes tail <consumer> [--follow]
+    python -m db.changes compact
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import time
+from datetime import datetime
+from typing import Iterator, NamedTuple
+
+from db.instrument import connect
+from db.transaction import connection_for
+
+DB_PATH = os.path.join(os.path.dirname(__file__), "..", "clinic.db")
+BATCH_SIZE = 500
+COMPACT_BATCH = 10_000
+POLL_INTERVAL = 1.0
+
+
+class Change(NamedTuple):
+    seq: int
+    table: str
+    row_id: int
+    op: str
+    ts: str
+    columns: tuple[str, ...]
+
+
+def _change(row: tuple) -> Change:
+    seq, table, row_id, op, ts, cols = row
+    return Change(seq, table, row_id, op, ts, tuple(cols.split(",")) if cols else ())
+
+
+def _now() -> str:
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+
+# -------------------- Reading --------------------
+
+def last_seq(db_path: str | None = None) -> int:
+    """Sequence number of the newest change (0 if nothing was ever logged)."""
+    with connect(db_path or DB_PATH) as conn:
+        row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'change_log'").fetchone()
+    return row[0] if row else 0
+
+
+def read(after_seq: int = 0, limit: int = BATCH_SIZE, tables: tuple[str, ...] | None = None,
+         db_path: str | None = None) -> list[Change]:
+    """Up to `limit` changes with seq > after_seq, oldest first."""
+    sql = "SELECT seq, tbl, row_id, op, ts, columns FROM change_log WHERE seq > ?"
+    params: list = [after_seq]
+    if tables:
+        sql += f" AND tbl IN ({','.join('?' * len(tables))})"
+        params += tables
+    with connect(db_path or DB_PATH) as conn:
+        rows = conn.execute(sql + " ORDER BY seq LIMIT ?", (*params, limit)).fetchall()
+    return [_change(r) for r in rows]
+
+
+# -------------------- Consumers --------------------
+
+def register(consumer: str, from_start: bool = False, db_path: str | None = None) -> int:
+    """
+    Create `consumer` if needed and return its acknowledged position.  A new
+    consumer starts at the current end of the log unless `from_start`.
+    """
+    with connection_for(db_path or DB_PATH) as conn:
+        start = 0 if from_start else (conn.execute(
+            "SELECT seq FROM sqlite_sequence WHERE name = 'change_log'").fetchone() or (0,))[0]
+        conn.execute("INSERT OR IGNORE INTO change_consumers (name, acked_seq, updated_at) VALUES (?, ?, ?)",
+                     (consumer, start, _now()))
+        return conn.execute("SELECT acked_seq FROM change_consumers WHERE name = ?", (consumer,)).fetchone()[0]
+
+
+def ack(consumer: str, seq: int, db_path: str | None = None) -> None:
+    """Record that `consumer` has processed everything up to and including `seq`."""
+    with connection_for(db_path or DB_PATH) as conn:
+        cur = conn.execute("UPDATE change_consumers SET acked_seq = MAX(acked_seq, ?), updated_at = ? WHERE name = ?",
+                           (seq, _now(), consumer))
+        if cur.rowcount == 0:
+            raise ValueError(f"Unknown consumer {consumer!r}; register() it first.")
+
+
+def unregister(consumer: str, db_path: str | None = None) -> None:
+    """Forget `consumer` so it no longer holds back compaction."""
+    with connection_for(db_path or DB_PATH) as conn:
+        conn.execute("DELETE FROM change_consumers WHERE name = ?", (consumer,))
+
+
+def consumers(db_path: str | None = None) -> list[tuple[str, int, int, str]]:
+    """(name, acked_seq, backlog, updated_at) for every registered consumer."""
+    with connect(db_path or DB_PATH) as conn:
+        end = (conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'change_log'").fetchone() or (0,))[0]
+        rows = conn.execute("SELECT name, acked_seq, updated_at FROM change_consumers ORDER BY name").fetchall()
+    return [(name, acked, end - acked, at) for name, acked, at in rows]
+
+
+def tail(consumer: str, batch_size: int = BATCH_SIZE, follow: bool = False,
+         poll_interval: float = POLL_INTERVAL, from_start: bool = False,
+         db_path: str | None = None) -> Iterator[list[Change]]:
+    """
+    Yield the consumer's unprocessed changes in batches of at most
+    `batch_size`.  A batch is acknowledged when the caller asks for the next
+    one, so a consumer that crashes mid-batch sees that batch again.  Stops
+    when caught up unless `follow`, in which case it polls for new changes.
+    """
+    db_path = db_path or DB_PATH
+    pos = register(consumer, from_start, db_path)
+    while True:
+        batch = read(pos, batch_size, db_path=db_path)
+        if not batch:
+            if not follow:
+                return
+            time.sleep(poll_interval)
+            continue
+        yield batch
+        pos = batch[-1].seq
+        ack(consumer, pos, db_path)
+
+
+# -------------------- Compaction --------------------
+
+def compact(batch_size: int = COMPACT_BATCH, db_path: str | None = None) -> int:
+    """Delete changes acknowledged by every consumer, `batch_size` per transaction; returns the count."""
+    db_path = db_path or DB_PATH
+    with connect(db_path) as conn:
+        upto = conn.execute("SELECT MIN(acked_seq) FROM change_consumers").fetchone()[0]
+    if upto is None:
+        return 0
+    deleted = 0
+    while True:
+        # Short transactions keep the write lock free for the clinic between batches.
+        with connection_for(db_path) as conn:
+            n = conn.execute("""DELETE FROM change_log WHERE seq IN
+                                (SELECT seq FROM change_log WHERE seq <= ? ORDER BY seq LIMIT ?)""",
+                             (upto, batch_size)).rowcount
+        deleted += n
+        if n < batch_size:
+            return deleted
+
+
+def main(argv: list[str] | None = None) -> None:
+    ap = argparse.ArgumentParser(description="Inspect, tail and compact the change log.")
+    ap.add_argument("--db", default=DB_PATH)
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("status")
+    t = sub.add_parser("tail")
+    t.add_argument("consumer")
+    t.add_argument("--follow", action="store_true")
+    t.add_argument("--from-start", action="store_true")
+    sub.add_parser("compact")
+    args = ap.parse_args(argv)
+
+    from db import migrations
+    migrations.ensure_schema(args.db)
+    if args.cmd == "status":
+        print(f"📜 Last change: #{last_seq(args.db)}")
+        for name, acked, backlog, at in consumers(args.db):
+            print(f"{name:<24} acked #{acked:<10} backlog {backlog:<8} {at}")
+    elif args.cmd == "tail":
+        try:
+            for batch in tail(args.consumer, follow=args.follow, from_start=args.from_start, db_path=args.db):
+                for c in batch:
+                    print(f"#{c.seq} {c.ts} {c.op} {c.table}[{c.row_id}] {','.join(c.columns)}")
+        except KeyboardInterrupt:
+            pass
+    else:
+        print(f"🧹 Removed {compact(db_path=args.db)} acknowledged changes.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,354 @@
+# db/columnar.py
+"""
+Memory-mapped columnar cache of the analytics columns of prescriptions,
+billing and patients.
+
+Each column is a .npy file opened with mmap, so a cold start costs a few
+open() calls and only the pages a query touches are read.  Dates are stored
+as epoch days (int32), amounts as float64, and text columns used for
+grouping (medication, species) as int32 codes into an append-only
+dictionary; code 0 is NULL.  A `live` mask marks rows deleted since they
+were cached.
+
+Each table is stored as id-ordered segments of up to SEGMENT_ROWS rows.
+refresh() is incremental: rows with ids above the last cached id are
+appended to the last segment, and rows updated or deleted since the last
+refresh (recorded by the columnar_dirty triggers, migration 5) are patched
+into copies of the segments holding them; untouched segments are shared
+between generations.  meta.json lists a generation's segments and is swapped
+last, so readers keep a consistent view and a crash never leaves a
+half-written cache.  Refreshes take a file lock in the cache directory, so
+processes sharing the database never interleave them.
+
+A refresh scans through db.snapshot.reader, like the SQL reports: it never
+holds a lock the front desk waits on.  The columnar_dirty rows it consumed
+are pruned afterwards through the db.writer queue.
+
+NumPy is optional: without it load() returns None and callers use SQL.
+
+    python -m db.columnar            # refresh the cache for clinic.db
+"""
+from __future__ import annotations
+
+import argparse
+import itertools
+import json
+import os
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+from datetime import date, datetime
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+try:
+    import numpy as np
+except ImportError:  # analytics fall back to SQL
+    np = None
+
+from db import dates, metrics, migrations, snapshot
+from db.transaction import connection_for
+
+DB_PATH = os.path.join(os.path.dirname(__file__), "..", "clinic.db")
+FETCH_BATCH = 50_000
+SEGMENT_ROWS = 65_536
+NULL_DAY = -2147483648
+
+_DAY = "IFNULL({}, -2147483648)"
+
+# table -> [(column, SQL expression, dtype, dictionary name or None)]
+SPEC: dict[str, list[tuple[str, str, str, str | None]]] = {
+    "prescriptions": [
+        ("day", _DAY.format(migrations.epoch_day_sql("date")), "int32", None),
+        ("patient_id", "patient_id", "int32", None),
+        ("doctor_id", "doctor_id", "int32", None),
+        ("medication", "medication", "int32", "medication"),
+    ],
+    "billing": [
+        ("prescription_id", "prescription_id", "int32", None),
+        ("day", _DAY.format(migrations.epoch_day_sql("billing_date")), "int32", None),
+        ("total_amount", "total_amount", "float64", None),
+        ("paid_amount", "paid_amount", "float64", None),
+    ],
+    "patients": [
+        ("species", "species", "int32", "species"),
+    ],
+}
+
+_lock = threading.Lock()
+_serial = itertools.count()
+
+
+def cache_dir(db_path: str) -> str:
+    return os.path.abspath(db_path) + ".columnar"
+
+
+def to_day(value: str | date) -> int:
+    """Epoch day of a 'YYYY-MM-DD' string or date."""
+    return dates.epoch_day(value)
+
+
+def most_common(codes: "np.ndarray", dictionary: list, n: int) -> list[tuple[str | None, int]]:
+    """(value, count) for the `n` most frequent dictionary codes, like Counter.most_common."""
+    tally = np.bincount(codes, minlength=len(dictionary))
+    return [(dictionary[c], int(tally[c])) for c in np.argsort(-tally, kind="stable")[:n] if tally[c]]
+
+
+class Columns:
+    """One cache generation: tables[table][column] -> array, plus the dictionaries."""
+
+    def __init__(self, root: str, meta: dict) -> None:
+        self.meta = meta
+        self.as_of = datetime.fromtimestamp(meta["refreshed_at"])
+        self.dicts: dict[str, list[str | None]] = meta["dicts"]
+        self.tables = {}
+        for t in SPEC:
+            parts = [_read_segment(root, seg, t) for seg in meta["segments"][t]]
+            # A single segment stays memory-mapped; several are joined once per generation (see load()).
+            self.tables[t] = parts[0] if len(parts) == 1 else {
+                c: np.concatenate([p[c] for p in parts]) if parts else np.zeros(0, dtype=_dtype(t, c))
+                for c in _columns(t)}
+
+    def __getitem__(self, table: str) -> dict:
+        return self.tables[table]
+
+    def lookup(self, table: str, ids) -> "np.ndarray":
+        """Row positions of `ids` in `table` (-1 where absent or deleted)."""
+        t = self.tables[table]
+        ids = np.asarray(ids, dtype="int64")
+        if not len(t["id"]):
+            return np.full(len(ids), -1)
+        pos = np.minimum(np.searchsorted(t["id"], ids), len(t["id"]) - 1)
+        return np.where((t["id"][pos] == ids) & t["live"][pos], pos, -1)
+
+
+def _columns(table: str) -> list[str]:
+    return ["id", "live"] + [s[0] for s in SPEC[table]]
+
+
+def _dtype(table: str, column: str) -> str:
+    return {"id": "int64", "live": "bool"}.get(column) or next(s[2] for s in SPEC[table] if s[0] == column)
+
+
+def _read_meta(root: str) -> dict | None:
+    try:
+        with open(os.path.join(root, "meta.json"), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return meta if "segments" in meta else None   # a cache from before segments: rebuild it
+
+
+@contextmanager
+def _file_lock(path: str):
+    """Exclusive lock on `path` between processes (threads of this one also hold _lock)."""
+    with open(path, "a+b") as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:   # LK_LOCK gives up after ten seconds; keep waiting
+                    pass
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def _read_segment(root: str, seg: dict, table: str) -> dict[str, "np.ndarray"]:
+    return {c: np.load(os.path.join(root, seg["name"], f"{c}.npy"), mmap_mode="r") for c in _columns(table)}
+
+
+def _write_segment(root: str, table: str, cols: dict[str, "np.ndarray"]) -> dict:
+    name = f"seg-{table}-{os.getpid()}-{time.time_ns()}-{next(_serial)}"
+    os.makedirs(os.path.join(root, name))
+    for c, arr in cols.items():
+        np.save(os.path.join(root, name, f"{c}.npy"), arr)
+    return {"name": name, "rows": len(cols["id"]), "first": int(cols["id"][0]), "last": int(cols["id"][-1])}
+
+
+def _encode(values: list, dictionary: list, index: dict) -> list[int]:
+    out = []
+    for v in values:
+        if v is None or v == "":
+            out.append(0)
+            continue
+        code = index.get(v)
+        if code is None:
+            code = index[v] = len(dictionary)
+            dictionary.append(v)
+        out.append(code)
+    return out
+
+
+def _fetch(conn, table: str, where: str, params: tuple, dicts: dict, index: dict) -> dict[str, "np.ndarray"]:
+    spec = SPEC[table]
+    cur = conn.execute(f"SELECT id, {', '.join(s[1] for s in spec)} FROM {table} WHERE {where} ORDER BY id", params)
+    parts: dict[str, list] = {c: [] for c in ["id"] + [s[0] for s in spec]}
+    while True:
+        rows = cur.fetchmany(FETCH_BATCH)
+        if not rows:
+            break
+        cols = list(zip(*rows))
+        parts["id"].append(np.array(cols[0], dtype="int64"))
+        for i, (name, _, dtype, dname) in enumerate(spec, 1):
+            values = cols[i]
+            if dname:
+                values = _encode(values, dicts[dname], index[dname])
+            elif dtype == "float64":
+                values = [0.0 if v is None else v for v in values]
+            else:
+                values = [0 if v is None else v for v in values]
+            parts[name].append(np.array(values, dtype=dtype))
+    out = {name: np.concatenate(chunks) if chunks else np.zeros(0, dtype=_dtype(table, name))
+           for name, chunks in parts.items()}
+    out["live"] = np.ones(len(out["id"]), bool)
+    return out
+
+
+def _patch(cols: dict[str, "np.ndarray"], ids: "np.ndarray", fresh: dict[str, "np.ndarray"]) -> dict:
+    """Segment `cols` with the dirty `ids` re-read as `fresh` (ids missing from it were deleted)."""
+    cols = {c: np.array(a) for c, a in cols.items()}   # private copy of the mapped segment
+    pos = np.minimum(np.searchsorted(cols["id"], ids), len(cols["id"]) - 1)
+    cols["live"][pos[cols["id"][pos] == ids]] = False
+    p = np.minimum(np.searchsorted(cols["id"], fresh["id"]), len(cols["id"]) - 1)
+    known = cols["id"][p] == fresh["id"]
+    for c in fresh:
+        cols[c][p[known]] = fresh[c][known]
+    if not known.all():   # inserted below the high-water mark (explicit ids)
+        cols = {c: np.concatenate([cols[c], fresh[c][~known]]) for c in cols}
+        order = np.argsort(cols["id"], kind="stable")
+        cols = {c: a[order] for c, a in cols.items()}
+    return cols
+
+
+def refresh(db_path: str | None = None, force: bool = False) -> dict | None:
+    """
+    Bring the cache for `db_path` up to date; returns its meta (None without
+    NumPy).  Costs three small queries when nothing changed.
+    """
+    if np is None:
+        return None
+    db_path = os.path.abspath(db_path or DB_PATH)
+    migrations.ensure_schema(db_path)
+    root = cache_dir(db_path)
+    os.makedirs(root, exist_ok=True)
+    # The cache and columnar_dirty are shared by every process on this file (CLI, GUI, bench.load).
+    with _lock, _file_lock(os.path.join(root, "refresh.lock")):
+        previous = _read_meta(root)
+        meta = None if force else previous
+        # One consistent read-only view for the whole refresh.
+        with snapshot.reader(db_path) as (conn, as_of):
+            max_ids = {t: conn.execute(f"SELECT COALESCE(MAX(id), 0) FROM {t}").fetchone()[0] for t in SPEC}
+            # sqlite_sequence keeps counting after consumed entries are deleted.
+            row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'columnar_dirty'").fetchone()
+            max_seq = row[0] if row else 0
+            # A cache built from another copy of this file (or before a restore): start over.
+            if meta and (max_seq < meta["seq"] or
+                         max_seq == meta["seq"] and any(max_ids[t] < meta["max_id"][t] for t in SPEC)):
+                meta = None
+            if meta and max_seq == meta["seq"] and max_ids == meta["max_id"]:
+                metrics.cache_hit("columnar")
+                return meta
+            metrics.cache_miss("columnar")
+
+            dicts = {d: list(v) for d, v in (meta["dicts"] if meta else {"medication": [None], "species": [None]}).items()}
+            index = {d: {v: i for i, v in enumerate(vals) if v is not None} for d, vals in dicts.items()}
+            dirty: dict[str, set[int]] = {t: set() for t in SPEC}
+            if meta:
+                for tbl, row_id in conn.execute("SELECT tbl, row_id FROM columnar_dirty WHERE seq > ? AND seq <= ?",
+                                                (meta["seq"], max_seq)):
+                    if tbl in dirty:
+                        dirty[tbl].add(row_id)
+
+            # Only segments holding dirty rows and the partly filled last one are rewritten.
+            segments = {t: list(meta["segments"][t]) if meta else [] for t in SPEC}
+            for table, segs in segments.items():
+                last = meta["last_id"][table] if meta else 0
+                ids = np.array(sorted(i for i in dirty[table] if i <= last), dtype="int64")
+                if segs and len(ids):
+                    fresh = [_fetch(conn, table, f"id IN ({','.join('?' * len(chunk))})", chunk, dicts, index)
+                             for chunk in (tuple(int(i) for i in ids[s:s + 900]) for s in range(0, len(ids), 900))]
+                    fresh = {c: np.concatenate([f[c] for f in fresh]) for c in fresh[0]}
+                    # A row belongs to the last segment starting at or below its id.
+                    firsts = np.array([s["first"] for s in segs])
+                    seg_of = np.maximum(np.searchsorted(firsts, ids, side="right") - 1, 0)
+                    fresh_of = np.maximum(np.searchsorted(firsts, fresh["id"], side="right") - 1, 0)
+                    for i in np.unique(seg_of).tolist():
+                        cols = _patch(_read_segment(root, segs[i], table), ids[seg_of == i],
+                                      {c: a[fresh_of == i] for c, a in fresh.items()})
+                        segs[i] = _write_segment(root, table, cols)
+                new = _fetch(conn, table, "id > ? AND id <= ?", (last, max_ids[table]), dicts, index)
+                if len(new["id"]):
+                    if segs and segs[-1]["rows"] < SEGMENT_ROWS:
+                        tail = _read_segment(root, segs.pop(), table)
+                        new = {c: np.concatenate([tail[c], new[c]]) for c in new}
+                    for start in range(0, len(new["id"]), SEGMENT_ROWS):
+                        segs.append(_write_segment(root, table,
+                                                   {c: a[start:start + SEGMENT_ROWS] for c, a in new.items()}))
+
+        last_ids = {t: max(max_ids[t], meta["last_id"][t] if meta else 0) for t in SPEC}
+        meta = {"generation": f"{time.time_ns()}-{os.getpid()}", "refreshed_at": as_of.timestamp(), "seq": max_seq,
+                "max_id": max_ids, "last_id": last_ids, "dicts": dicts, "segments": segments}
+        tmp = os.path.join(root, "meta.json.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(tmp, os.path.join(root, "meta.json"))
+        # Consumed: the triggers' log only needs to hold what the next refresh hasn't seen.
+        with connection_for(db_path) as conn:
+            conn.execute("DELETE FROM columnar_dirty WHERE seq <= ?", (max_seq,))
+        # The previous generation stays for readers that have just read its meta; anything
+        # else is older or left by a failed refresh (no other refresh runs while we hold the lock).
+        keep = {s["name"] for m in (meta, previous) if m for segs in m["segments"].values() for s in segs}
+        for name in os.listdir(root):
+            if name.startswith(("seg-", "gen-")) and name not in keep:
+                shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+        return meta
+
+
+_views: dict[str, Columns] = {}
+
+
+def load(db_path: str | None = None, refresh_first: bool = True) -> Columns | None:
+    """Memory-mapped view of the cache (refreshed first by default); None without NumPy."""
+    if np is None:
+        return None
+    db_path = db_path or DB_PATH
+    meta = refresh(db_path) if refresh_first else _read_meta(cache_dir(db_path))
+    if meta is None:
+        meta = refresh(db_path)
+    root = cache_dir(db_path)
+    view = _views.get(root)
+    if view is None or view.meta["generation"] != meta["generation"]:
+        view = _views[root] = Columns(root, meta)
+    return view
+
+
+def main(argv: list[str] | None = None) -> None:
+    ap = argparse.ArgumentParser(description="Refresh the columnar analytics cache.")
+    ap.add_argument("--db", default=DB_PATH)
+    ap.add_argument("--rebuild", action="store_true", help="Discard the cache and rebuild it from scratch.")
+    args = ap.parse_args(argv)
+    if np is None:
+        print("❌ NumPy is not installed; the columnar cache is unavailable.")
+        return
+    t0 = time.perf_counter()
+    meta = refresh(args.db, force=args.rebuild)
+    print(f"✅ Columnar cache up to date in {time.perf_counter() - t0:.2f}s (last ids: {meta['last_id']})")
+
+
+if __name__ == "__main__":
+    main()
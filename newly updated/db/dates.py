@@ -0,0 +1,106 @@
+# db/dates.py
+"""
+Integer dates and date-range queries.
+
+Dates are stored as 'YYYY-MM-DD' text and appointment times as 'HH:MM'.
+Migration 13 indexes their integer values - days since 1970-01-01 and
+minutes since midnight, NULL when the text is not a real date or time - and
+refuses malformed values on new writes.  Range queries built here compare
+those integers through the indexes, so a stray value can no longer sort into
+the middle of a window.  day_sql()/minute_sql() emit exactly the indexed
+expressions; SQLite only uses the index for an identical expression.
+
+    where, params = dates.day_range("p.date", since, None)
+    conn.execute(f"SELECT ... FROM prescriptions p WHERE {where}", params)
+
+    python -m db.dates              # count malformed dates left from before migration 13
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import re
+from datetime import date, timedelta
+
+from db import migrations
+from db.instrument import connect
+
+DB_PATH = os.path.join(os.path.dirname(__file__), "..", "clinic.db")
+EPOCH = date(1970, 1, 1)
+
+_DATE_RE = re.compile(r"\d{4}-\d{2}-\d{2}")
+_TIME_RE = re.compile(r"(\d{2}):(\d{2})(:\d{2})?")
+
+
+def epoch_day(value: str | date) -> int:
+    """Days since 1970-01-01 of a 'YYYY-MM-DD' string or a date; ValueError if malformed."""
+    if isinstance(value, str):
+        if not _DATE_RE.fullmatch(value):
+            raise ValueError(f"{value!r} is not a YYYY-MM-DD date")
+        value = date.fromisoformat(value)
+    return (value - EPOCH).days
+
+
+def from_epoch_day(day: int) -> date:
+    return EPOCH + timedelta(days=day)
+
+
+def minute_of_day(value: str) -> int:
+    """Minutes since midnight of 'HH:MM' (or 'HH:MM:SS'); ValueError if malformed."""
+    m = _TIME_RE.fullmatch(value)
+    if not m or int(m.group(1)) > 23 or int(m.group(2)) > 59 or (m.group(3) and int(m.group(3)[1:]) > 59):
+        raise ValueError(f"{value!r} is not an HH:MM time")
+    return int(m.group(1)) * 60 + int(m.group(2))
+
+
+def day_sql(column: str) -> str:
+    """The indexed epoch-day expression of a date column ('date', 'p.date', ...)."""
+    return migrations.epoch_day_sql(column)
+
+
+def minute_sql(column: str) -> str:
+    """The indexed minute-of-day expression of a time column."""
+    return migrations.minute_of_day_sql(column)
+
+
+def day_range(column: str, start: str | date | None = None, end: str | date | None = None) -> tuple[str, list[int]]:
+    """WHERE fragment and parameters for start <= column <= end (inclusive days; either may be None)."""
+    day = day_sql(column)
+    where, params = [], []
+    if start is not None:
+        where.append(f"{day} >= ?")
+        params.append(epoch_day(start))
+    if end is not None:
+        where.append(f"{day} <= ?")
+        params.append(epoch_day(end))
+    return " AND ".join(where) or f"{day} IS NOT NULL", params
+
+
+def invalid_dates(db_path: str | None = None) -> dict[str, int]:
+    """'table.column' -> rows whose non-empty text is not a valid date/time."""
+    out = {}
+    with connect(db_path or DB_PATH) as conn:
+        for table, specs in migrations.DATE_COLUMNS.items():
+            for col, kind in specs:
+                n = conn.execute(f"SELECT COUNT(*) FROM {table} "
+                                 f"WHERE NULLIF({col}, '') IS NOT NULL AND {migrations.date_sql(kind, col)} IS NULL"
+                                 ).fetchone()[0]
+                if n:
+                    out[f"{table}.{col}"] = n
+    return out
+
+
+def main(argv: list[str] | None = None) -> None:
+    ap = argparse.ArgumentParser(description="Report dates and times that are not YYYY-MM-DD / HH:MM.")
+    ap.add_argument("--db", default=DB_PATH)
+    args = ap.parse_args(argv)
+    migrations.ensure_schema(args.db)
+    bad = invalid_dates(args.db)
+    if not bad:
+        print("✅ All dates and times are well-formed.")
+    for column, n in bad.items():
+        print(f"⚠️  {column}: {n:,} malformed value(s) - excluded from date-range queries")
+
+
+if __name__ == "__main__":
+    main()
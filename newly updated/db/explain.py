@@ -0,0 +1,391 @@
+# db/explain.py
+"""
+Query-plan inspector and index advisor.
+
+Collects the SQL the clinic runs - every literal statement passed to
+execute()/executemany() in modules/*.py, app_tk.py and db/refcache.py (the
+menu lists), plus the statements recorded in the slow-query log and this
+process's query statistics (which also covers SQL built with f-strings) -
+and runs EXPLAIN QUERY PLAN on each against the clinic database.  Reported per statement:
+
+  * full scans of tables with at least LARGE_TABLE_ROWS rows (including
+    full walks of a non-covering index),
+  * temp B-trees built for ORDER BY / GROUP BY / DISTINCT,
+  * automatic indexes (a join column without an index),
+  * index lookups that must also visit the table (no covering index).
+
+For each problem the advisor derives candidate indexes from the statement
+(equality columns, then a range or the ORDER BY, then up to COVER_EXTRA
+other columns it reads - more only for statements the slow log shows have
+cost WIDE_COVER_MS; never the INTEGER PRIMARY KEY, which every index already
+holds as the rowid) and, like sqlite3's ".expert", creates them in an empty in-memory
+copy of the schema - with the database's sqlite_stat1, if ANALYZE has run -
+to see whether the planner would use them.  Only candidates that remove a
+problem are suggested, ranked by the time the statement has cost in the
+slow log.
+
+    python main.py --explain [--db clinic.db] [--slow-log slow_queries.log] [--all]
+"""
+from __future__ import annotations
+
+import argparse
+import ast
+import glob
+import json
+import os
+import re
+import sqlite3
+from collections import defaultdict
+from typing import NamedTuple
+
+from db import instrument, migrations
+
+ROOT = os.path.join(os.path.dirname(__file__), "..")
+DB_PATH = os.path.join(ROOT, "clinic.db")
+SOURCES = [os.path.join(ROOT, "modules", "*.py"), os.path.join(ROOT, "..", "app_tk.py"),
+           os.path.join(ROOT, "db", "refcache.py")]
+LARGE_TABLE_ROWS = 1000
+COVER_EXTRA = 3             # covering columns allowed beyond the key...
+WIDE_COVER_MS = 1000.0      # ...unless the statement has cost this much in the slow log
+
+_PLANNED = ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH", "REPLACE")
+_PARAM_RE = re.compile(r"'(?:[^']|'')*'|\"[^\"]*\"|(\?\d*|[:@$][A-Za-z_]\w*)")
+_TABLE_RE = re.compile(r"\b(?:FROM|JOIN|UPDATE|INTO)\s+(\w+)(?:\s+(?:AS\s+)?(?!ON\b|WHERE\b|JOIN\b|LEFT\b|INNER\b"
+                       r"|CROSS\b|USING\b|SET\b|GROUP\b|ORDER\b|LIMIT\b|VALUES\b|INDEXED\b|NATURAL\b)(\w+))?", re.I)
+
+
+class Statement(NamedTuple):
+    sql: str
+    source: str          # "file:line function" or "slow log" / "statistics"
+    calls: int = 0
+    total_ms: float = 0.0
+
+
+class Finding(NamedTuple):
+    kind: str            # "scan", "temp-btree", "auto-index", "lookup"
+    alias: str
+    detail: str
+
+
+# -------------------- Collecting statements --------------------
+
+def _normalize(sql: str) -> str:
+    return " ".join(sql.split())
+
+
+class _Calls(ast.NodeVisitor):
+    """execute()/executemany() calls with the innermost enclosing function."""
+
+    def __init__(self) -> None:
+        self.stack: list[str] = []
+        self.calls: list[tuple[ast.expr, int, str]] = []
+
+    def visit_FunctionDef(self, node: ast.FunctionDef) -> None:
+        self.stack.append(node.name)
+        self.generic_visit(node)
+        self.stack.pop()
+
+    visit_AsyncFunctionDef = visit_FunctionDef
+
+    def visit_Call(self, node: ast.Call) -> None:
+        if isinstance(node.func, ast.Attribute) and node.func.attr in ("execute", "executemany") and node.args:
+            self.calls.append((node.args[0], node.lineno, self.stack[-1] if self.stack else ""))
+        self.generic_visit(node)
+
+
+def extract(paths: list[str] | None = None) -> tuple[list[Statement], list[str]]:
+    """Literal SQL passed to execute()/executemany() in the sources; also returns where SQL is built dynamically."""
+    found, dynamic = [], []
+    for path in sorted(f for pattern in (paths or SOURCES) for f in glob.glob(pattern)):
+        with open(path, "r", encoding="utf-8") as f:
+            visitor = _Calls()
+            visitor.visit(ast.parse(f.read(), path))
+        rel = os.path.relpath(path, os.path.join(ROOT, ".."))
+        for arg, line, func in visitor.calls:
+            where = f"{rel}:{line} {func}".rstrip()
+            if isinstance(arg, ast.Constant) and isinstance(arg.value, str):
+                found.append(Statement(_normalize(arg.value), where))
+            else:
+                dynamic.append(where)
+    return found, dynamic
+
+
+def observed(slow_log: str | None = None) -> list[Statement]:
+    """Statements from the slow-query log and this process's statistics, with their cost."""
+    totals: dict[str, list] = defaultdict(lambda: [0, 0.0, set()])
+    path = slow_log or instrument.SLOW_LOG_PATH
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                t = totals[_normalize(entry["sql"])]
+                t[0] += 1
+                t[1] += float(entry.get("ms", 0))
+                t[2].add("slow log")
+    except FileNotFoundError:
+        pass
+    for st in instrument.stats():
+        t = totals[st["sql"]]
+        t[0] += st["count"]
+        t[1] += st["total_ms"]
+        t[2].add("statistics")
+    return [Statement(sql, " + ".join(sorted(src)), n, ms) for sql, (n, ms, src) in totals.items()]
+
+
+# -------------------- Plans --------------------
+
+def _params(sql: str):
+    names = [m.group(1) for m in _PARAM_RE.finditer(sql) if m.group(1)]
+    named = [n[1:] for n in names if n[0] in ":@$"]
+    return {n: None for n in named} if named else (None,) * len(names)
+
+
+def plan(conn: sqlite3.Connection, sql: str) -> list[str]:
+    return [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, _params(sql))]
+
+
+def tables(sql: str, known: set[str] | dict | None = None) -> dict[str, str]:
+    """alias -> table for the (`known`) tables a statement names; a table is its own alias too."""
+    out = {}
+    for table, alias in _TABLE_RE.findall(sql):
+        if known is not None and table not in known:
+            continue
+        out[table] = table
+        if alias:
+            out[alias] = table
+    return out
+
+
+def findings(steps: list[str], aliases: dict[str, str], sizes: dict[str, int]) -> list[Finding]:
+    out = []
+    for step in steps:
+        m = re.match(r"(SCAN|SEARCH) (\w+)(?: USING (COVERING )?INDEX (\w+)| USING (?:INTEGER )?PRIMARY KEY)?", step)
+        if m and m.group(2) in aliases:
+            kind, alias, covering, index = m.groups()
+            table = aliases[alias]
+            if kind == "SCAN" and sizes.get(table, 0) >= LARGE_TABLE_ROWS:
+                how = f" via {index}" + ("" if covering else ", not covering") if index else ""
+                out.append(Finding("scan", alias, f"full scan of {table} ({sizes[table]:,} rows){how}"))
+            elif kind == "SEARCH" and index and not covering and "PRIMARY KEY" not in step:
+                out.append(Finding("lookup", alias, f"{table}: {index} is not covering, every match reads the table"))
+        elif step.startswith("USE TEMP B-TREE"):
+            out.append(Finding("temp-btree", "", step.replace("USE TEMP B-TREE FOR", "temp B-tree for")))
+        elif "AUTOMATIC" in step:
+            m = re.search(r"(?:SEARCH|SCAN) (\w+)", step)
+            alias = m.group(1) if m else ""
+            out.append(Finding("auto-index", alias, f"{aliases.get(alias, alias)}: automatic index built per query"))
+    return out
+
+
+def _sizes(conn: sqlite3.Connection) -> dict[str, int]:
+    out = {}
+    for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'"):
+        try:
+            out[name] = conn.execute(f"SELECT MAX(rowid) FROM {name}").fetchone()[0] or 0
+        except sqlite3.OperationalError:       # WITHOUT ROWID
+            out[name] = conn.execute(f"SELECT COUNT(*) FROM {name}").fetchone()[0]
+    return out
+
+
+# -------------------- Index advice --------------------
+
+def _schema_clone(conn: sqlite3.Connection) -> sqlite3.Connection:
+    """Empty in-memory copy of the tables and indexes, with the source's planner statistics."""
+    clone = sqlite3.connect(":memory:")
+    for (sql,) in conn.execute("""SELECT sql FROM sqlite_master WHERE type IN ('table', 'index')
+                                  AND sql IS NOT NULL AND name NOT LIKE 'sqlite_%'
+                                  ORDER BY type = 'index'"""):
+        clone.execute(sql)
+    has_stats = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'").fetchone()
+    if has_stats:
+        clone.execute("ANALYZE sqlite_master")      # creates an empty sqlite_stat1
+        clone.executemany("INSERT INTO sqlite_stat1 VALUES (?, ?, ?)",
+                          conn.execute("SELECT tbl, idx, stat FROM sqlite_stat1"))
+        clone.execute("ANALYZE sqlite_master")      # reload the copied statistics
+    return clone
+
+
+def _columns_of(sql: str, alias: str, table: str, cols: list[str], single: bool) -> dict[str, list[str]]:
+    """Columns of `table` that the statement uses for equality, ranges, ordering and output."""
+    ref = rf"\b{alias}\.(\w+)" if not single else r"\b(?:\w+\.)?(\w+)"
+    out: dict[str, list[str]] = {"eq": [], "range": [], "order": [], "all": []}
+
+    def add(kind: str, col: str) -> None:
+        if col in cols and col not in out[kind]:
+            out[kind].append(col)
+
+    for col in re.findall(ref + r"\s*(?:=|\bIN\b|\bIS\b(?!\s+NOT))", sql, re.I):
+        add("eq", col)
+    for col in re.findall(r"=\s*" + ref.lstrip(r"\b"), sql):
+        add("eq", col)
+    for col in re.findall(ref + r"\s*(?:<|>|\bBETWEEN\b|\bLIKE\b)", sql, re.I):
+        add("range", col)
+    m = re.search(r"\b(?:ORDER|GROUP) BY\s+(.+?)(?:\bLIMIT\b|\)|$)", sql, re.I)
+    if m:
+        for term in m.group(1).split(","):
+            term = re.sub(r"\s+(ASC|DESC)\s*$", "", term.strip(), flags=re.I)
+            mm = re.fullmatch(ref.replace(r"\b", "") if not single else r"(?:\w+\.)?(\w+)", term)
+            if mm:
+                add("order", mm.group(1))
+    for col in re.findall(ref, sql):
+        add("all", col)
+    return out
+
+
+def _rowid_alias(clone: sqlite3.Connection, table: str) -> str | None:
+    """The INTEGER PRIMARY KEY column, which every index already stores as the rowid."""
+    pk = [r for r in clone.execute(f"PRAGMA table_info({table})") if r[5]]
+    return pk[0][1] if len(pk) == 1 and pk[0][2].upper() == "INTEGER" else None
+
+
+def candidates(sql: str, alias: str, table: str, cols: list[str], single: bool,
+               rowid: str | None = "id", wide: bool = False) -> list[list[str]]:
+    """
+    Candidate index columns: the key alone, then the key plus the other
+    columns read - at most COVER_EXTRA of them unless `wide`.  The rowid
+    alias is never a column: the index carries it already.
+    """
+    used = {k: [c for c in v if c != rowid] for k, v in _columns_of(sql, alias, table, cols, single).items()}
+    eq = used["eq"]
+    keys = [eq + used["range"][:1], eq + [c for c in used["order"] if c not in eq]]
+    out = []
+    for key in keys:
+        extra = [c for c in used["all"] if c not in key]
+        cover = [key + extra] if extra and (wide or len(extra) <= COVER_EXTRA) else []
+        for cand in [key, *cover]:
+            if cand and cand not in out:
+                out.append(cand)
+    return out
+
+
+def advise(clone: sqlite3.Connection, sql: str, problems: list[Finding], aliases: dict[str, str],
+           sizes: dict[str, int], total_ms: float = 0.0) -> str | None:
+    """
+    The smallest candidate index that removes at least one problem, as CREATE
+    INDEX, or None.  Covering indexes wider than the key plus COVER_EXTRA
+    columns are only tried for statements that cost WIDE_COVER_MS in the slow log.
+    """
+    single = len(set(aliases.values())) == 1
+    best = None
+    for alias in {f.alias or a for f in problems for a in ([f.alias] if f.alias else aliases)}:
+        table = aliases.get(alias)
+        if table is None:
+            continue
+        cols = [r[1] for r in clone.execute(f"PRAGMA table_info({table})")]
+        for cand in candidates(sql, alias, table, cols, single, _rowid_alias(clone, table),
+                               total_ms >= WIDE_COVER_MS):
+            name = f"idx_{table}_{'_'.join(cand)}"
+            create = f"CREATE INDEX {name} ON {table}({', '.join(cand)})"
+            try:
+                clone.execute(create)
+            except sqlite3.OperationalError:       # an identical index already exists
+                continue
+            try:
+                after = plan(clone, sql)
+                remaining = findings(after, aliases, sizes)
+            finally:
+                clone.execute(f"DROP INDEX {name}")
+            if any(name in step for step in after) and len(remaining) < len(problems):
+                score = (len(remaining), len(cand))
+                if best is None or score < best[0]:
+                    best = (score, create)
+    return best[1] if best else None
+
+
+# -------------------- Report --------------------
+
+def inspect(db_path: str | None = None, slow_log: str | None = None, paths: list[str] | None = None,
+            include_notes: bool = False) -> dict:
+    """
+    {"statements": [{sql, source, calls, total_ms, plan, findings, suggestion}],
+     "dynamic": [source locations], "errors": [(source, sql, error)]}
+    Lookups without a covering index are only reported (and advised on) for
+    statements seen in the slow log or statistics, unless `include_notes`.
+    """
+    db_path = db_path or DB_PATH
+    migrations.ensure_schema(db_path)
+    static, dynamic = extract(paths)
+    seen = {s.sql: s for s in observed(slow_log)}
+    statements = [s._replace(calls=seen[s.sql].calls, total_ms=seen[s.sql].total_ms) if s.sql in seen else s
+                  for s in static]
+    known = {s.sql for s in static}
+    statements += [s for s in seen.values() if s.sql not in known]
+
+    conn = sqlite3.connect(db_path)           # not instrumented: the inspector's own SQL is not clinic load
+    try:
+        sizes = _sizes(conn)
+        clone = _schema_clone(conn)
+        out, errors = [], []
+        for st in statements:
+            if not st.sql.lstrip().upper().startswith(_PLANNED):
+                continue
+            try:
+                steps = plan(conn, st.sql)
+            except sqlite3.Error as e:
+                errors.append((st.source, st.sql, str(e)))
+                continue
+            aliases = tables(st.sql, sizes)
+            probs = [f for f in findings(steps, aliases, sizes)
+                     if f.kind != "lookup" or include_notes or st.calls]
+            suggestion = advise(clone, st.sql, probs, aliases, sizes, st.total_ms) if probs else None
+            out.append({"sql": st.sql, "source": st.source, "calls": st.calls, "total_ms": st.total_ms,
+                        "plan": steps, "findings": probs, "suggestion": suggestion})
+        clone.close()
+    finally:
+        conn.close()
+    out.sort(key=lambda r: (-r["total_ms"], not r["findings"], r["source"]))
+    return {"statements": out, "dynamic": dynamic, "errors": errors}
+
+
+def report(db_path: str | None = None, slow_log: str | None = None, show_all: bool = False) -> dict:
+    result = inspect(db_path, slow_log, include_notes=show_all)
+    rows = result["statements"]
+    flagged = [r for r in rows if r["findings"]]
+    print(f"\n🔎 Query plans: {len(rows)} statements checked, {len(flagged)} with findings, "
+          f"{len(result['dynamic'])} built at run time (checked once they appear in the slow log)")
+    for r in rows if show_all else flagged:
+        cost = f"  [{r['calls']} calls, {r['total_ms']:,.0f} ms observed]" if r["calls"] else ""
+        sql = r["sql"] if len(r["sql"]) <= 110 else r["sql"][:107] + "..."
+        print(f"\n{'⚠️ ' if r['findings'] else '✅'} {r['source']}{cost}\n    {sql}")
+        for f in r["findings"]:
+            print(f"    - {f.detail}")
+        if show_all:
+            for step in r["plan"]:
+                print(f"      | {step}")
+        if r["suggestion"]:
+            print(f"    💡 {r['suggestion']};")
+    # Slow-log entries may predate a migration or use TEMP views; only source statements must prepare.
+    stale = [e for e in result["errors"] if ".py:" not in e[0]]
+    for source, sql, err in result["errors"]:
+        if show_all or ".py:" in source:
+            print(f"\n❌ {source}: {err}\n    {sql[:110]}")
+    if stale and not show_all:
+        print(f"\nℹ️  {len(stale)} slow-log statement(s) no longer prepare against this schema (--all lists them)")
+
+    suggestions: dict[str, list] = {}
+    for r in flagged:
+        if r["suggestion"]:
+            s = suggestions.setdefault(r["suggestion"], [0.0, 0])
+            s[0] += r["total_ms"]
+            s[1] += 1
+    if suggestions:
+        print("\n💡 Suggested indexes (by observed time, then statements helped):")
+        for create, (ms, n) in sorted(suggestions.items(), key=lambda kv: (-kv[1][0], -kv[1][1])):
+            print(f"   {create};   -- {n} statement(s), {ms:,.0f} ms observed")
+    return result
+
+
+def main(argv: list[str] | None = None) -> None:
+    ap = argparse.ArgumentParser(description="EXPLAIN QUERY PLAN every statement the clinic runs and suggest indexes.")
+    ap.add_argument("--db", default=DB_PATH)
+    ap.add_argument("--slow-log", default=instrument.SLOW_LOG_PATH)
+    ap.add_argument("--all", action="store_true", help="also list clean statements, plans and non-covering lookups")
+    args = ap.parse_args(argv)
+    report(args.db, args.slow_log, args.all)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,30 +3,45 @@ from __future__ import annotations
 
 import os
 import sqlite3
+import sys
+
+if __package__ in (None, ""):  # allow `python db/init_db.py`
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db import migrations
 
 SCHEMA_PATH = os.path.join(os.path.dirname(__file__), "schema_sqlite.sql")
 DB_PATH = os.path.join(os.path.dirname(__file__), "..", "clinic.db")
 
 
-def initialize_db() -> None:
-    """(Re)create the SQLite database using schema_sqlite.sql."""
+def initialize_db(reset: bool = False, db_path: str | None = None) -> None:
+    """
+    Create or upgrade the SQLite database in place by applying pending
+    migrations.  Existing data is kept unless `reset=True`, which drops every
+    table first.
+    """
+    db_path = db_path or DB_PATH
     # Ensure folder exists
-    os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
-
-    with open(SCHEMA_PATH, "r", encoding="utf-8") as f:
-        schema_sql = f.read()
+    os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
 
-    conn = sqlite3.connect(DB_PATH)
     try:
-        conn.executescript(schema_sql)
-        conn.commit()
-        print("✅ Database initialized with all tables.")
+        if reset:
+            conn = sqlite3.connect(db_path)
+            try:
+                with conn:
+                    objects = conn.execute("""SELECT type, name FROM sqlite_master
+                                              WHERE type IN ('table', 'view') AND name NOT LIKE 'sqlite_%'""").fetchall()
+                    for kind, name in objects:
+                        conn.execute(f"DROP {kind.upper()} IF EXISTS {name}")
+                    conn.execute("PRAGMA user_version = 0")
+            finally:
+                conn.close()
+            migrations.forget(db_path)
+        version = migrations.migrate(db_path, verbose=False)
+        print(f"✅ Database initialized with all tables (schema v{version}).")
     except Exception as e:
-        conn.rollback()
         print(f"❌ Failed to initialize database: {e}")
         raise
-    finally:
-        conn.close()
 
 
 if __name__ == "__main__":
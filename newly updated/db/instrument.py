@@ -0,0 +1,284 @@
+# db/instrument.py
+"""
+Low-overhead SQL instrumentation.
+
+connect() is a drop-in replacement for sqlite3.connect() whose connections
+record, per distinct statement: call count, total time (execute plus
+fetches), rows returned and a latency histogram.  Each cursor keeps its own
+counts and records a statement once, so fetching rows takes no lock.
+Statements slower than SLOW_MS are appended to the slow query log (JSON
+lines) together with their EXPLAIN QUERY PLAN.
+
+Set VETAI_INSTRUMENT=0 to get plain sqlite3 connections.
+"""
+from __future__ import annotations
+
+import bisect
+import json
+import os
+import sqlite3
+import threading
+import time
+from urllib.request import pathname2url
+
+ENABLED = os.environ.get("VETAI_INSTRUMENT", "1") != "0"
+SLOW_MS = float(os.environ.get("VETAI_SLOW_MS", "100"))
+SLOW_LOG_PATH = os.environ.get("VETAI_SLOW_LOG",
+                               os.path.join(os.path.dirname(__file__), "..", "slow_queries.log"))
+
+# Upper bounds (ms) of the histogram buckets; the last bucket is open-ended.
+BUCKETS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+
+_lock = threading.Lock()
+_stats: dict[str, list] = {}      # sql -> [count, total_s, rows, max_s, hist, changed]
+_lock_waits = [0, 0.0]            # [errors, seconds] for "database is locked/busy"
+_norm_cache: dict[str, str] = {}
+
+
+def _normalize(sql: str) -> str:
+    key = _norm_cache.get(sql)
+    if key is None:
+        key = " ".join(sql.split())
+        if len(_norm_cache) < 10_000:  # guard against ad-hoc SQL growing the cache forever
+            _norm_cache[sql] = key
+    return key
+
+
+def _record(sql: str, elapsed: float, rows: int, calls: int = 1, changed: int = 0) -> None:
+    key = _normalize(sql)
+    with _lock:
+        st = _stats.get(key)
+        if st is None:
+            st = _stats[key] = [0, 0.0, 0, 0.0, [0] * (len(BUCKETS_MS) + 1), 0]
+        st[0] += calls
+        st[1] += elapsed
+        st[2] += rows
+        st[5] += changed
+        if elapsed > st[3]:
+            st[3] = elapsed
+        if calls:
+            st[4][bisect.bisect_left(BUCKETS_MS, elapsed * 1e3)] += 1
+
+
+def _record_lock_wait(err: sqlite3.OperationalError, elapsed: float) -> None:
+    msg = str(err)
+    if "locked" in msg or "busy" in msg:
+        with _lock:
+            _lock_waits[0] += 1
+            _lock_waits[1] += elapsed
+
+
+def _log_slow(conn: sqlite3.Connection, sql: str, params, elapsed: float) -> None:
+    plan: list[str] = []
+    if sql.lstrip()[:6].upper().startswith(("SELECT", "INSERT", "UPDATE", "DELETE", "WITH")):
+        try:
+            cur = sqlite3.Cursor(conn)  # plain cursor: not recorded
+            plan = [row[3] for row in cur.execute("EXPLAIN QUERY PLAN " + sql, params or ())]
+        except sqlite3.Error:
+            pass
+    entry = {"ts": time.strftime("%Y-%m-%dT%H:%M:%S"), "ms": round(elapsed * 1e3, 3),
+             "sql": _normalize(sql), "plan": plan}
+    try:
+        with _lock, open(SLOW_LOG_PATH, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry) + "\n")
+    except OSError:
+        pass
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """
+    Times and counts rows on the cursor itself; the statement is recorded once,
+    when it is finished: it returns no rows, its rows run out, or the cursor
+    is re-executed, closed or collected.
+    """
+    _sql: str | None = None
+    _elapsed = 0.0
+    _params = None
+    _rows = 0
+    _changed = 0
+
+    def _flush(self) -> None:
+        if self._sql is not None:
+            _record(self._sql, self._elapsed, self._rows, changed=self._changed)
+            self._sql = None
+
+    # Base methods bound as defaults: cheaper than super() on every call.
+    def execute(self, sql, params=(), _execute=sqlite3.Cursor.execute):
+        if self._sql is not None:
+            self._flush()
+        t0 = time.perf_counter()
+        try:
+            cur = _execute(self, sql, params)
+        except sqlite3.Error as e:
+            dt = time.perf_counter() - t0
+            if isinstance(e, sqlite3.OperationalError):
+                _record_lock_wait(e, dt)
+            _record(sql, dt, 0)
+            raise
+        dt = time.perf_counter() - t0
+        self._sql, self._elapsed, self._params, self._rows = sql, dt, params, 0
+        self._changed = max(self.rowcount, 0)
+        if dt * 1e3 >= SLOW_MS:
+            _log_slow(self.connection, sql, params, dt)
+        if self.description is None:   # no result rows to wait for
+            self._flush()
+        return cur
+
+    def executemany(self, sql, seq_of_params):
+        self._flush()
+        t0 = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_params)
+        except sqlite3.OperationalError as e:
+            _record_lock_wait(e, time.perf_counter() - t0)
+            raise
+        finally:
+            _record(sql, time.perf_counter() - t0, 0, changed=max(self.rowcount, 0))
+
+    def executescript(self, script):
+        self._flush()
+        t0 = time.perf_counter()
+        try:
+            return super().executescript(script)
+        finally:
+            _record(script, time.perf_counter() - t0, 0)
+
+    def _fetched(self, t0: float, rows: int, done: bool) -> None:
+        if self._sql is None:
+            return
+        before = self._elapsed
+        self._elapsed += time.perf_counter() - t0
+        self._rows += rows
+        if before * 1e3 < SLOW_MS <= self._elapsed * 1e3:
+            _log_slow(self.connection, self._sql, self._params, self._elapsed)
+        if done:
+            self._flush()
+
+    def fetchall(self):
+        t0 = time.perf_counter()
+        rows = super().fetchall()
+        self._fetched(t0, len(rows), True)
+        return rows
+
+    def fetchmany(self, size=None):
+        size = self.arraysize if size is None else size
+        t0 = time.perf_counter()
+        rows = super().fetchmany(size)
+        self._fetched(t0, len(rows), len(rows) < size)
+        return rows
+
+    def fetchone(self, _fetchone=sqlite3.Cursor.fetchone):
+        t0 = time.perf_counter()
+        row = _fetchone(self)
+        self._fetched(t0, int(row is not None), row is None)
+        return row
+
+    def __next__(self, _next=sqlite3.Cursor.__next__):
+        try:
+            row = _next(self)
+        except StopIteration:
+            self._flush()
+            raise
+        self._rows += 1
+        return row
+
+    def close(self):
+        self._flush()
+        super().close()
+
+    def __del__(self):
+        if self._sql is not None:
+            try:
+                self._flush()
+            except Exception:  # interpreter shutdown
+                pass
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, params=()):
+        return InstrumentedCursor(self).execute(sql, params)
+
+    def executemany(self, sql, seq_of_params):
+        return InstrumentedCursor(self).executemany(sql, seq_of_params)
+
+    def executescript(self, script):
+        return InstrumentedCursor(self).executescript(script)
+
+
+def readonly_uri(path: str) -> str:
+    """file: URI opening `path` read-only (paths may contain spaces)."""
+    return f"file:{pathname2url(os.path.abspath(path))}?mode=ro"
+
+
+def connect(database: str, **kwargs) -> sqlite3.Connection:
+    """sqlite3.connect() with per-statement timing (unless VETAI_INSTRUMENT=0)."""
+    if ENABLED:
+        kwargs.setdefault("factory", InstrumentedConnection)
+    return sqlite3.connect(database, **kwargs)
+
+
+# -------------------- Reporting --------------------
+
+def set_slow_threshold(ms: float) -> None:
+    global SLOW_MS
+    SLOW_MS = float(ms)
+
+
+def _percentile(hist: list[int], q: float) -> float:
+    """Upper bucket bound holding the q-quantile (inf for the open bucket)."""
+    total = sum(hist)
+    if not total:
+        return 0.0
+    seen = 0
+    for i, n in enumerate(hist):
+        seen += n
+        if seen >= q * total:
+            return BUCKETS_MS[i] if i < len(BUCKETS_MS) else float("inf")
+    return float("inf")
+
+
+def stats(sort: str = "total_ms", limit: int | None = None) -> list[dict]:
+    """Snapshot of per-statement statistics, slowest (by `sort`) first."""
+    with _lock:
+        items = [(sql, st[0], st[1], st[2], st[3], list(st[4]), st[5]) for sql, st in _stats.items()]
+    out = [{
+        "sql": sql,
+        "count": count,
+        "total_ms": total * 1e3,
+        "avg_ms": total * 1e3 / count if count else 0.0,
+        "max_ms": mx * 1e3,
+        "p95_ms": _percentile(hist, 0.95),
+        "rows": rows,
+        "changed": changed,
+        "histogram": dict(zip([f"<={b}ms" for b in BUCKETS_MS] + [f">{BUCKETS_MS[-1]}ms"], hist)),
+    } for sql, count, total, rows, mx, hist, changed in items]
+    out.sort(key=lambda r: r[sort], reverse=True)
+    return out[:limit] if limit else out
+
+
+def lock_waits() -> tuple[int, float]:
+    """(errors, seconds) spent on statements that failed with database locked/busy."""
+    with _lock:
+        return _lock_waits[0], _lock_waits[1]
+
+
+def reset() -> None:
+    with _lock:
+        _stats.clear()
+        _lock_waits[:] = [0, 0.0]
+
+
+def report(limit: int = 15) -> None:
+    """Print the top statements by total time (CLI panel)."""
+    rows = stats(limit=limit)
+    print(f"\n📊 Query statistics (slow threshold {SLOW_MS:g} ms, log: {os.path.normpath(SLOW_LOG_PATH)})")
+    if not rows:
+        print("No statements recorded yet.")
+        return
+    print(f"{'calls':>8} {'total ms':>10} {'avg ms':>8} {'p95 ms':>8} {'rows':>9}  statement")
+    for r in rows:
+        sql = r["sql"] if len(r["sql"]) <= 70 else r["sql"][:67] + "..."
+        print(f"{r['count']:>8} {r['total_ms']:>10.1f} {r['avg_ms']:>8.2f} {r['p95_ms']:>8g} {r['rows']:>9}  {sql}")
@@ -0,0 +1,268 @@
+# db/metrics.py
+"""
+Clinic operational metrics in Prometheus text exposition format.
+
+Everything is read from counters that are already kept, so a scrape is cheap:
+  * statement/operation rates per table come from db.instrument's statistics,
+  * table row counts come from the row_counts table, which insert/delete
+    triggers keep current (migration 16): six rows read per scrape, including
+    writes from other processes and independent of instrument.reset(),
+  * WAL size is a stat() call, AI job durations and cache hit/miss counts are
+    pushed here by the code that does the work.
+
+    python -m db.metrics --port 9108                 # serve /metrics
+    python -m db.metrics --textfile clinic.prom      # rewrite a file every 15s
+
+The standalone exporter only sees file sizes and row counts; set
+VETAI_METRICS_PORT (or VETAI_METRICS_FILE) when starting the CLI/GUI to export
+that process's live statement, lock, job and cache counters.
+"""
+from __future__ import annotations
+
+import argparse
+import bisect
+import os
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Iterator
+
+from db import instrument
+
+DB_PATH = os.path.join(os.path.dirname(__file__), "..", "clinic.db")
+TABLES = ("doctors", "patients", "inventory", "prescriptions", "billing", "appointments")
+JOB_BUCKETS_S = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+_lock = threading.Lock()
+_jobs: dict[str, list] = {}                 # job -> [count, sum_s, buckets]
+_cache: dict[tuple[str, str], int] = {}     # (cache, "hit"|"miss") -> n
+
+_STMT_RE = re.compile(r"^\s*(?:WITH\b.*?\)\s*)?(?:(SELECT)\b.*?\bFROM\s+|(INSERT(?:\s+OR\s+\w+)?\s+INTO|REPLACE\s+INTO"
+                      r"|UPDATE(?:\s+OR\s+\w+)?|DELETE\s+FROM)\s+)([A-Za-z_][\w.]*)", re.I | re.S)
+_parsed: dict[str, tuple[str, str] | None] = {}
+
+
+# -------------------- Push API (called by workers) --------------------
+
+def observe_job(job: str, seconds: float) -> None:
+    with _lock:
+        st = _jobs.setdefault(job, [0, 0.0, [0] * len(JOB_BUCKETS_S)])
+        st[0] += 1
+        st[1] += seconds
+        i = bisect.bisect_left(JOB_BUCKETS_S, seconds)
+        if i < len(JOB_BUCKETS_S):
+            st[2][i] += 1
+
+
+@contextmanager
+def timed_job(job: str) -> Iterator[None]:
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_job(job, time.perf_counter() - t0)
+
+
+def cache_hit(cache: str, n: int = 1) -> None:
+    with _lock:
+        _cache[(cache, "hit")] = _cache.get((cache, "hit"), 0) + n
+
+
+def cache_miss(cache: str, n: int = 1) -> None:
+    with _lock:
+        _cache[(cache, "miss")] = _cache.get((cache, "miss"), 0) + n
+
+
+# -------------------- Collectors --------------------
+
+def _classify(sql: str) -> tuple[str, str] | None:
+    """(op, table) for a normalised statement, cached per statement text."""
+    if sql not in _parsed:
+        m = _STMT_RE.match(sql)
+        _parsed[sql] = ((m.group(1) or m.group(2)).split()[0].lower(), m.group(3).split(".")[-1].lower()) if m else None
+    return _parsed[sql]
+
+
+def _table_ops() -> dict[tuple[str, str], list]:
+    """(table, op) -> [count, seconds, changed rows]."""
+    out: dict[tuple[str, str], list] = {}
+    for st in instrument.stats(sort="count"):
+        cls = _classify(st["sql"])
+        if cls is None:
+            continue
+        op, table = cls
+        acc = out.setdefault((table, op), [0, 0.0, 0])
+        acc[0] += st["count"]
+        acc[1] += st["total_ms"] / 1e3
+        acc[2] += st["changed"]
+    return out
+
+
+def _row_counts(db_path: str) -> dict[str, int]:
+    """Trigger-kept counts; empty for a database not yet migrated to row_counts."""
+    if not os.path.exists(db_path):
+        return {}
+    try:
+        conn = sqlite3.connect(instrument.readonly_uri(db_path), uri=True)
+        try:
+            rows = conn.execute(f"SELECT tbl, n FROM row_counts WHERE tbl IN ({','.join('?' * len(TABLES))})",
+                                TABLES).fetchall()
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        return {}
+    return dict(rows)
+
+
+def _esc(value: object) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _fmt_labels(**labels: object) -> str:
+    return "{" + ",".join(f'{k}="{_esc(v)}"' for k, v in labels.items()) + "}" if labels else ""
+
+
+def render(db_path: str | None = None) -> str:
+    """Current metrics in Prometheus text exposition format (version 0.0.4)."""
+    db_path = db_path or DB_PATH
+    lines: list[str] = []
+
+    def family(name: str, kind: str, help_: str) -> None:
+        lines.append(f"# HELP {name} {help_}")
+        lines.append(f"# TYPE {name} {kind}")
+
+    ops = _table_ops()
+    family("vetai_db_operations_total", "counter", "SQL statements executed, by table and operation.")
+    for (table, op), (n, _, _) in sorted(ops.items()):
+        lines.append(f"vetai_db_operations_total{_fmt_labels(table=table, op=op)} {n}")
+    family("vetai_db_operation_seconds_total", "counter", "Time spent in SQL statements, by table and operation.")
+    for (table, op), (_, secs, _) in sorted(ops.items()):
+        lines.append(f"vetai_db_operation_seconds_total{_fmt_labels(table=table, op=op)} {secs:.6f}")
+    family("vetai_db_rows_changed_total", "counter", "Rows inserted/updated/deleted, by table and operation.")
+    for (table, op), (_, _, changed) in sorted(ops.items()):
+        if op != "select":
+            lines.append(f"vetai_db_rows_changed_total{_fmt_labels(table=table, op=op)} {changed}")
+
+    errors, waited = instrument.lock_waits()
+    family("vetai_db_lock_errors_total", "counter", "Statements that failed with database locked/busy.")
+    lines.append(f"vetai_db_lock_errors_total {errors}")
+    family("vetai_db_lock_wait_seconds_total", "counter", "Time spent waiting before a locked/busy failure.")
+    lines.append(f"vetai_db_lock_wait_seconds_total {waited:.6f}")
+
+    family("vetai_db_file_bytes", "gauge", "Size of the database and its write-ahead log.")
+    for kind, path in (("db", db_path), ("wal", db_path + "-wal")):
+        lines.append(f"vetai_db_file_bytes{_fmt_labels(file=kind)} {os.path.getsize(path) if os.path.exists(path) else 0}")
+
+    family("vetai_table_rows", "gauge", "Row count per table (trigger-maintained).")
+    for table, n in sorted(_row_counts(db_path).items()):
+        lines.append(f"vetai_table_rows{_fmt_labels(table=table)} {n}")
+
+    with _lock:
+        jobs = {k: (v[0], v[1], list(v[2])) for k, v in _jobs.items()}
+        cache = dict(_cache)
+    family("vetai_ai_job_seconds", "histogram", "Duration of AI/analytics jobs.")
+    for job, (count, total, buckets) in sorted(jobs.items()):
+        cum = 0
+        for bound, n in zip(JOB_BUCKETS_S, buckets):
+            cum += n
+            lines.append(f"vetai_ai_job_seconds_bucket{_fmt_labels(job=job, le=f'{bound:g}')} {cum}")
+        lines.append(f"vetai_ai_job_seconds_bucket{_fmt_labels(job=job, le='+Inf')} {count}")
+        lines.append(f"vetai_ai_job_seconds_sum{_fmt_labels(job=job)} {total:.6f}")
+        lines.append(f"vetai_ai_job_seconds_count{_fmt_labels(job=job)} {count}")
+
+    family("vetai_cache_requests_total", "counter", "Cache lookups by cache and result.")
+    for (name, result), n in sorted(cache.items()):
+        lines.append(f"vetai_cache_requests_total{_fmt_labels(cache=name, result=result)} {n}")
+    family("vetai_cache_hit_ratio", "gauge", "Hits / lookups per cache since start.")
+    for name in sorted({c for c, _ in cache}):
+        hits, misses = cache.get((name, "hit"), 0), cache.get((name, "miss"), 0)
+        lines.append(f"vetai_cache_hit_ratio{_fmt_labels(cache=name)} {hits / (hits + misses) if hits + misses else 0:.4f}")
+
+    return "\n".join(lines) + "\n"
+
+
+# -------------------- Exporters --------------------
+
+def serve(port: int = 9108, host: str = "127.0.0.1", db_path: str | None = None) -> ThreadingHTTPServer:
+    """Serve /metrics from a daemon thread; returns the server (call .shutdown() to stop)."""
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self) -> None:
+            if self.path.split("?", 1)[0] not in ("/", "/metrics"):
+                self.send_error(404)
+                return
+            body = render(db_path).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *_a) -> None:  # keep the CLI quiet
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True, name="metrics-http").start()
+    return server
+
+
+def write_textfile(path: str, db_path: str | None = None) -> None:
+    """Atomically rewrite `path` (node_exporter textfile collector format)."""
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(render(db_path))
+    os.replace(tmp, path)
+
+
+def start_textfile_writer(path: str, interval: float = 15.0, db_path: str | None = None) -> threading.Event:
+    """Rewrite `path` every `interval` seconds from a daemon thread; set the returned event to stop."""
+    stop = threading.Event()
+
+    def loop() -> None:
+        while not stop.is_set():
+            try:
+                write_textfile(path, db_path)
+            except OSError:
+                pass
+            stop.wait(interval)
+
+    threading.Thread(target=loop, daemon=True, name="metrics-textfile").start()
+    return stop
+
+
+def start_from_env(db_path: str | None = None) -> None:
+    """Start exporters requested via VETAI_METRICS_PORT / VETAI_METRICS_FILE."""
+    port = os.environ.get("VETAI_METRICS_PORT")
+    if port:
+        serve(int(port), db_path=db_path)
+    path = os.environ.get("VETAI_METRICS_FILE")
+    if path:
+        start_textfile_writer(path, float(os.environ.get("VETAI_METRICS_INTERVAL", "15")), db_path)
+
+
+def main(argv: list[str] | None = None) -> None:
+    ap = argparse.ArgumentParser(description="Export clinic metrics in Prometheus text format.")
+    ap.add_argument("--db", default=DB_PATH)
+    ap.add_argument("--port", type=int, default=9108)
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--textfile", help="Rewrite this file periodically instead of serving HTTP.")
+    ap.add_argument("--interval", type=float, default=15.0)
+    args = ap.parse_args(argv)
+    if args.textfile:
+        print(f"Writing metrics to {args.textfile} every {args.interval:g}s (Ctrl+C to stop)")
+        stop = start_textfile_writer(args.textfile, args.interval, args.db)
+    else:
+        serve(args.port, args.host, args.db)
+        print(f"Serving metrics on http://{args.host}:{args.port}/metrics (Ctrl+C to stop)")
+        stop = threading.Event()
+    try:
+        while not stop.wait(1.0):
+            pass
+    except KeyboardInterrupt:
+        stop.set()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,688 @@
+# db/migrations.py
+"""
+Versioned, in-place schema migrations keyed on PRAGMA user_version.
+
+ensure_schema() is cheap enough to call on every start: once a database is
+known to be current in this process it returns without touching SQLite, and
+otherwise it costs a single `PRAGMA user_version` read when nothing is pending.
+Pending migrations run in order, each in its own transaction together with
+the user_version bump, so a failure leaves the database at the last good
+version (migrations registered transactional=False must be idempotent).
+
+    python -m db.migrations            # migrate clinic.db
+    python -m db.migrations --status   # show current / latest version
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import sqlite3
+import threading
+import time
+from typing import Callable
+
+from db.instrument import connect
+
+DB_PATH = os.path.join(os.path.dirname(__file__), "..", "clinic.db")
+SCHEMA_PATH = os.path.join(os.path.dirname(__file__), "schema_sqlite.sql")
+BATCH_SIZE = 50_000
+
+MIGRATIONS: list[tuple[int, str, Callable[[sqlite3.Connection], None], bool]] = []
+_current: set[str] = set()        # databases verified up to date in this process
+_lock = threading.Lock()
+
+
+def migration(version: int, description: str, transactional: bool = True):
+    """
+    Register a migration.  Non-transactional ones (e.g. journal_mode changes,
+    which SQLite refuses inside a transaction) must be idempotent.
+    """
+    def register(fn: Callable[[sqlite3.Connection], None]):
+        assert not MIGRATIONS or MIGRATIONS[-1][0] == version - 1, "migrations must be numbered consecutively"
+        MIGRATIONS.append((version, description, fn, transactional))
+        return fn
+    return register
+
+
+def latest_version() -> int:
+    return MIGRATIONS[-1][0] if MIGRATIONS else 0
+
+
+# -------------------- Helpers for migration bodies --------------------
+
+def run_script(conn: sqlite3.Connection, script: str) -> None:
+    """Execute a multi-statement script inside the current transaction (executescript would commit)."""
+    buf = ""
+    for line in script.splitlines(keepends=True):
+        buf += line
+        if sqlite3.complete_statement(buf):
+            if buf.strip():
+                conn.execute(buf)
+            buf = ""
+    if buf.strip() and not buf.strip().startswith("--"):
+        conn.execute(buf)
+
+
+def table_sql(conn: sqlite3.Connection, table: str) -> str | None:
+    row = conn.execute("SELECT sql FROM sqlite_master WHERE type='table' AND name=?", (table,)).fetchone()
+    return row[0] if row else None
+
+
+def columns(conn: sqlite3.Connection, table: str) -> list[str]:
+    return [r[1] for r in conn.execute(f"PRAGMA table_info({table})")]
+
+
+def rebuild_table(conn: sqlite3.Connection, table: str, create_sql: str, indexes: list[str],
+                  batch_size: int | None = None) -> None:
+    """
+    Rebuild `table` with `create_sql` (which must create `<table>__new`).
+
+    Rows are copied in rowid ranges of `batch_size` (default BATCH_SIZE), all
+    inside the caller's transaction: the write lock is held until the swap,
+    so no concurrent change can land in rows already copied, and a failure
+    rolls the whole rebuild back.
+    """
+    batch_size = batch_size or BATCH_SIZE
+    new = f"{table}__new"
+    conn.execute(create_sql)
+    cols = ", ".join(c for c in columns(conn, new) if c in set(columns(conn, table)))
+    start = 0
+    while True:
+        cur = conn.execute(f"""INSERT INTO {new} (rowid, {cols})
+                               SELECT rowid, {cols} FROM {table} WHERE rowid > ? ORDER BY rowid LIMIT ?""",
+                           (start, batch_size))
+        if cur.rowcount < batch_size:
+            break
+        start = conn.execute(f"SELECT MAX(rowid) FROM {new}").fetchone()[0]
+    conn.execute(f"DROP TABLE {table}")
+    conn.execute(f"ALTER TABLE {new} RENAME TO {table}")
+    for ddl in indexes:
+        conn.execute(ddl)
+
+
+# -------------------- Migrations --------------------
+
+@migration(1, "baseline schema")
+def _m001_baseline(conn: sqlite3.Connection) -> None:
+    # IF NOT EXISTS everywhere, so databases created before versioning are adopted as-is.
+    with open(SCHEMA_PATH, "r", encoding="utf-8") as f:
+        run_script(conn, f.read())
+
+
+@migration(2, "rebuild legacy appointments table with status CHECK and cascading FKs")
+def _m002_appointments(conn: sqlite3.Connection) -> None:
+    # Older app versions created appointments via CREATE TABLE IF NOT EXISTS without constraints.
+    if "CHECK" in (table_sql(conn, "appointments") or "").upper():
+        return
+    rebuild_table(conn, "appointments", """
+        CREATE TABLE IF NOT EXISTS appointments__new (
+          id         INTEGER PRIMARY KEY AUTOINCREMENT,
+          patient_id INTEGER NOT NULL,
+          doctor_id  INTEGER NOT NULL,
+          date       TEXT    NOT NULL,
+          time       TEXT    NOT NULL,
+          reason     TEXT,
+          status     TEXT    NOT NULL DEFAULT 'Scheduled'
+                     CHECK (status IN ('Scheduled','Completed','Cancelled')),
+          FOREIGN KEY(patient_id) REFERENCES patients(id) ON DELETE CASCADE,
+          FOREIGN KEY(doctor_id)  REFERENCES doctors(id)  ON DELETE CASCADE
+        )""", [
+        "CREATE INDEX IF NOT EXISTS idx_appointments_date_time ON appointments(date, time)",
+        "CREATE INDEX IF NOT EXISTS idx_appointments_patient   ON appointments(patient_id)",
+        "CREATE INDEX IF NOT EXISTS idx_appointments_doctor    ON appointments(doctor_id)",
+    ])
+
+
+@migration(3, "switch to WAL journaling so readers never block writers", transactional=False)
+def _m003_wal(conn: sqlite3.Connection) -> None:
+    conn.execute("PRAGMA journal_mode=WAL")
+
+
+@migration(4, "checkpoint table for resumable bulk imports")
+def _m004_bulk_imports(conn: sqlite3.Connection) -> None:
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS bulk_imports (
+          source     TEXT    NOT NULL,          -- absolute path of the imported file
+          table_name TEXT    NOT NULL,
+          size       INTEGER NOT NULL,          -- file size / mtime when the import started
+          mtime_ns   INTEGER NOT NULL,
+          records    INTEGER NOT NULL DEFAULT 0, -- records committed so far
+          done       INTEGER NOT NULL DEFAULT 0,
+          updated_at TEXT    NOT NULL,
+          PRIMARY KEY (source, table_name)
+        )""")
+
+
+@migration(5, "log updated/deleted analytics rows for the columnar cache")
+def _m005_columnar_dirty(conn: sqlite3.Connection) -> None:
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS columnar_dirty (
+          seq    INTEGER PRIMARY KEY AUTOINCREMENT,
+          tbl    TEXT    NOT NULL,
+          row_id INTEGER NOT NULL
+        )""")
+    # Only the columns the cache holds; inserts only when they land below the high-water id.
+    watched = {
+        "prescriptions": "id, date, patient_id, doctor_id, medication",
+        "billing": "id, prescription_id, billing_date, total_amount, paid_amount",
+        "patients": "id, species",
+    }
+    for table, cols in watched.items():
+        run_script(conn, f"""
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_columnar_ins AFTER INSERT ON {table}
+            WHEN NEW.id < (SELECT MAX(id) FROM {table})
+            BEGIN
+              INSERT INTO columnar_dirty (tbl, row_id) VALUES ('{table}', NEW.id);
+            END;
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_columnar_upd AFTER UPDATE OF {cols} ON {table}
+            BEGIN
+              INSERT INTO columnar_dirty (tbl, row_id) VALUES ('{table}', OLD.id);
+              INSERT INTO columnar_dirty (tbl, row_id) SELECT '{table}', NEW.id WHERE NEW.id <> OLD.id;
+            END;
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_columnar_del AFTER DELETE ON {table}
+            BEGIN
+              INSERT INTO columnar_dirty (tbl, row_id) VALUES ('{table}', OLD.id);
+            END;
+        """)
+
+
+REVENUE_ROLLUPS = {
+    # table -> (key columns, key expressions over a billing row aliased b)
+    "revenue_daily": (("day",), ("b.billing_date",)),
+    "revenue_monthly_doctor": (("month", "doctor_id"), (
+        "substr(b.billing_date, 1, 7)",
+        "COALESCE((SELECT p.doctor_id FROM prescriptions p WHERE p.id = b.prescription_id), 0)")),
+    "revenue_monthly_species": (("month", "species"), (
+        "substr(b.billing_date, 1, 7)",
+        "COALESCE((SELECT pt.species FROM prescriptions p JOIN patients pt ON pt.id = p.patient_id"
+        " WHERE p.id = b.prescription_id), '')")),
+}
+
+
+def revenue_rollup_sql(table: str, row: str, sign: str) -> str:
+    """Upsert adding (sign=+) or removing (sign=-) billing row `row` (NEW/OLD) to a rollup."""
+    keys, exprs = REVENUE_ROLLUPS[table]
+    exprs = [e.replace("b.", f"{row}.") for e in exprs]
+    return f"""
+        INSERT INTO {table} ({", ".join(keys)}, bills, billed, collected)
+        SELECT {", ".join(exprs)}, {sign}1, {sign}{row}.total_amount, {sign}{row}.paid_amount WHERE 1
+        ON CONFLICT ({", ".join(keys)}) DO UPDATE SET
+          bills = bills + excluded.bills, billed = billed + excluded.billed,
+          collected = collected + excluded.collected;"""
+
+
+def rebuild_revenue_rollups(conn: sqlite3.Connection, schemas: tuple[str, ...] = ("main",)) -> None:
+    """
+    Recompute every revenue rollup from billing (inside the caller's
+    transaction).  `schemas` lists attached databases whose billing and
+    prescriptions tables also count, e.g. yearly archives.
+    """
+    for table, (keys, exprs) in REVENUE_ROLLUPS.items():
+        conn.execute(f"DELETE FROM {table}")
+        for schema in schemas:
+            qualified = [e.replace("FROM prescriptions p", f"FROM {schema}.prescriptions p") for e in exprs]
+            conn.execute(f"""
+                INSERT INTO {table} ({", ".join(keys)}, bills, billed, collected)
+                SELECT {", ".join(qualified)}, COUNT(*), SUM(b.total_amount), SUM(b.paid_amount)
+                FROM {schema}.billing b WHERE 1 GROUP BY {", ".join(str(i + 1) for i in range(len(keys)))}
+                ON CONFLICT ({", ".join(keys)}) DO UPDATE SET
+                  bills = bills + excluded.bills, billed = billed + excluded.billed,
+                  collected = collected + excluded.collected""")
+
+
+@migration(6, "incrementally maintained revenue rollups (day, month x doctor, month x species)")
+def _m006_revenue_rollups(conn: sqlite3.Connection) -> None:
+    run_script(conn, """
+        CREATE TABLE IF NOT EXISTS revenue_daily (
+          day       TEXT    NOT NULL PRIMARY KEY,   -- YYYY-MM-DD
+          bills     INTEGER NOT NULL DEFAULT 0,
+          billed    REAL    NOT NULL DEFAULT 0,
+          collected REAL    NOT NULL DEFAULT 0
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS revenue_monthly_doctor (
+          month     TEXT    NOT NULL,               -- YYYY-MM
+          doctor_id INTEGER NOT NULL,               -- 0 = prescription missing
+          bills     INTEGER NOT NULL DEFAULT 0,
+          billed    REAL    NOT NULL DEFAULT 0,
+          collected REAL    NOT NULL DEFAULT 0,
+          PRIMARY KEY (month, doctor_id)
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS revenue_monthly_species (
+          month     TEXT    NOT NULL,
+          species   TEXT    NOT NULL,               -- '' = unknown
+          bills     INTEGER NOT NULL DEFAULT 0,
+          billed    REAL    NOT NULL DEFAULT 0,
+          collected REAL    NOT NULL DEFAULT 0,
+          PRIMARY KEY (month, species)
+        ) WITHOUT ROWID;
+    """)
+    # Attribution (doctor, species) is taken when the bill is written.
+    for event, body in (("INSERT", [("NEW", "")]),
+                        ("UPDATE OF prescription_id, total_amount, paid_amount, billing_date", [("OLD", "-"), ("NEW", "")]),
+                        ("DELETE", [("OLD", "-")])):
+        name = event.split()[0].lower()
+        stmts = "".join(revenue_rollup_sql(t, row, sign) for row, sign in body for t in REVENUE_ROLLUPS)
+        run_script(conn, f"""
+            CREATE TRIGGER IF NOT EXISTS trg_billing_revenue_{name} AFTER {event} ON billing
+            BEGIN{stmts}
+            END;""")
+    rebuild_revenue_rollups(conn)
+
+
+@migration(7, "covering (patient, date) indexes for the patient timeline")
+def _m007_timeline_indexes(conn: sqlite3.Connection) -> None:
+    # Each replaces a single-column index that is a prefix of it.
+    run_script(conn, """
+        CREATE INDEX IF NOT EXISTS idx_prescriptions_patient_date
+          ON prescriptions(patient_id, date, id, doctor_id, medication, diagnosis);
+        DROP INDEX IF EXISTS idx_prescriptions_patient;
+        CREATE INDEX IF NOT EXISTS idx_appointments_patient_date
+          ON appointments(patient_id, date, id, time, doctor_id, reason, status);
+        DROP INDEX IF EXISTS idx_appointments_patient;
+        CREATE INDEX IF NOT EXISTS idx_billing_prescription_cover
+          ON billing(prescription_id, billing_date, total_amount, paid_amount);
+        DROP INDEX IF EXISTS idx_billing_prescription;
+    """)
+
+
+
+@migration(8, "blocking-key index for duplicate-patient detection")
+def _m008_patient_blocks(conn: sqlite3.Connection) -> None:
+    # Keys are computed in Python (modules/dedupe.build_index, contacts through
+    # contact_norm like owners); the triggers only drop stale ones so the next
+    # build re-keys edited patients.
+    run_script(conn, """
+        CREATE TABLE IF NOT EXISTS patient_blocks (
+            key        TEXT NOT NULL,
+            patient_id INTEGER NOT NULL,
+            PRIMARY KEY (key, patient_id)
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS idx_patient_blocks_patient ON patient_blocks(patient_id);
+        CREATE TRIGGER IF NOT EXISTS trg_patients_blocks_update
+        AFTER UPDATE OF name, species, owner_name, owner_contact ON patients BEGIN
+            DELETE FROM patient_blocks WHERE patient_id = OLD.id;
+        END;
+        CREATE TRIGGER IF NOT EXISTS trg_patients_blocks_delete
+        AFTER DELETE ON patients BEGIN
+            DELETE FROM patient_blocks WHERE patient_id = OLD.id;
+        END;
+    """)
+
+
+
+TRIGRAM_SOURCES = {
+    # entity -> (kind code in search_terms/trigrams, table, searched column)
+    "patient": (1, "patients", "name"),
+    "doctor": (2, "doctors", "name"),
+    "medication": (3, "inventory", "item_name"),
+}
+TRIGRAM_MAX_LEN = 64   # longer names are indexed by their first 64 characters
+
+
+def trigram_sql(kind: int, where: str) -> str:
+    """INSERT of the trigrams of the search_terms rows matching `where`, padded '  name ' as in pg_trgm."""
+    return (f"INSERT OR IGNORE INTO trigrams (kind, gram, term_id) "
+            f"SELECT {kind}, substr('  ' || lower(st.term) || ' ', s.n, 3), st.id "
+            f"FROM search_terms st, trigram_seq s "
+            f"WHERE st.kind = {kind} AND {where} AND s.n <= length(st.term) + 1")
+
+
+def trigram_trigger_sql(kind: int, table: str, column: str) -> str:
+    # A term's trigrams are added with its first row and dropped with its last one.
+    add = f"""
+              INSERT OR IGNORE INTO search_terms (kind, term) SELECT {kind}, NEW.{column} WHERE NEW.{column} <> '';
+              {trigram_sql(kind, f"st.term = NEW.{column} AND NOT EXISTS (SELECT 1 FROM trigrams x WHERE x.term_id = st.id)")};"""
+    drop = f"""
+              DELETE FROM trigrams WHERE term_id = (SELECT id FROM search_terms WHERE kind = {kind} AND term = OLD.{column})
+                AND NOT EXISTS (SELECT 1 FROM {table} WHERE {column} = OLD.{column});
+              DELETE FROM search_terms WHERE kind = {kind} AND term = OLD.{column}
+                AND NOT EXISTS (SELECT 1 FROM {table} WHERE {column} = OLD.{column});"""
+    return f"""
+        CREATE TRIGGER IF NOT EXISTS trg_{table}_trigrams_insert AFTER INSERT ON {table} BEGIN{add}
+        END;
+        CREATE TRIGGER IF NOT EXISTS trg_{table}_trigrams_update AFTER UPDATE OF {column} ON {table}
+        WHEN OLD.{column} IS NOT NEW.{column} BEGIN{drop}{add}
+        END;
+        CREATE TRIGGER IF NOT EXISTS trg_{table}_trigrams_delete AFTER DELETE ON {table} BEGIN{drop}
+        END;
+    """
+
+
+@migration(9, "trigram index over distinct names for typo-tolerant lookup")
+def _m009_trigrams(conn: sqlite3.Connection) -> None:
+    # Trigrams are kept per distinct name (pet names repeat thousands of times), so
+    # posting lists stay short; rows are found from a name through its own index.
+    # Triggers can't use recursive CTEs, so positions come from a small numbers table.
+    run_script(conn, """
+        CREATE TABLE IF NOT EXISTS trigram_seq (n INTEGER PRIMARY KEY);
+        CREATE TABLE IF NOT EXISTS search_terms (
+            id   INTEGER PRIMARY KEY,
+            kind INTEGER NOT NULL,
+            term TEXT    NOT NULL,
+            UNIQUE (kind, term)
+        );
+        CREATE TABLE IF NOT EXISTS trigrams (
+            kind    INTEGER NOT NULL,
+            gram    TEXT    NOT NULL,
+            term_id INTEGER NOT NULL,
+            PRIMARY KEY (kind, gram, term_id)
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS idx_trigrams_term ON trigrams(term_id);
+    """)
+    conn.executemany("INSERT OR IGNORE INTO trigram_seq (n) VALUES (?)", [(n,) for n in range(1, TRIGRAM_MAX_LEN + 1)])
+    for kind, table, column in TRIGRAM_SOURCES.values():
+        conn.execute(f"INSERT OR IGNORE INTO search_terms (kind, term) "
+                     f"SELECT DISTINCT {kind}, {column} FROM {table} WHERE {column} <> ''")
+        conn.execute(trigram_sql(kind, "1"))
+        run_script(conn, trigram_trigger_sql(kind, table, column))
+
+
+def contact_norm_sql(expr: str) -> str:
+    """SQL for the owner key of a phone number: digits only, without a +91 / 0 trunk prefix."""
+    d = expr
+    for ch in " -+()./":
+        d = f"replace({d}, '{ch}', '')"
+    return (f"(CASE WHEN length({d}) = 12 AND {d} LIKE '91%' THEN substr({d}, 3) "
+            f"WHEN length({d}) = 11 AND {d} LIKE '0%' THEN substr({d}, 2) ELSE {d} END)")
+
+
+def contact_norm(contact: str | None) -> str:
+    """contact_norm_sql in Python, for keys computed outside SQL (modules.dedupe)."""
+    d = contact or ""
+    for ch in " -+()./":
+        d = d.replace(ch, "")
+    if len(d) == 12 and d.startswith("91"):
+        return d[2:]
+    if len(d) == 11 and d.startswith("0"):
+        return d[1:]
+    return d
+
+
+def link_owner_sql(row: str = "NEW") -> str:
+    """Create the owner of `row` (keyed by its contact) if new, and point the patient at it."""
+    norm = contact_norm_sql(f"{row}.owner_contact")
+    return f"""
+        INSERT OR IGNORE INTO owners (name, contact, contact_norm)
+          SELECT {row}.owner_name, {row}.owner_contact, {norm} WHERE {norm} <> '';
+        UPDATE patients SET owner_id = (SELECT id FROM owners WHERE contact_norm = {norm}) WHERE id = {row}.id;"""
+
+
+@migration(10, "owners table keyed by normalised contact, patients.owner_id", transactional=False)
+def _m010_owners(conn: sqlite3.Connection) -> None:
+    # Owners are identified by phone; patients without one stay unlinked.  The
+    # legacy owner_name/owner_contact columns remain for older writers, and the
+    # triggers keep owner_id in step with them.
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        if "owner_id" not in columns(conn, "patients"):
+            conn.execute("ALTER TABLE patients ADD COLUMN owner_id INTEGER REFERENCES owners(id) ON DELETE SET NULL")
+        run_script(conn, f"""
+            CREATE TABLE IF NOT EXISTS owners (
+                id           INTEGER PRIMARY KEY,
+                name         TEXT,
+                contact      TEXT,
+                contact_norm TEXT NOT NULL UNIQUE CHECK (contact_norm <> '')
+            );
+            CREATE INDEX IF NOT EXISTS idx_patients_owner ON patients(owner_id);
+            CREATE TRIGGER IF NOT EXISTS trg_patients_owner_insert AFTER INSERT ON patients
+            WHEN NEW.owner_id IS NULL BEGIN{link_owner_sql()}
+            END;
+            CREATE TRIGGER IF NOT EXISTS trg_patients_owner_update AFTER UPDATE OF owner_name, owner_contact ON patients
+            BEGIN{link_owner_sql()}
+            END;
+        """)
+        conn.execute("COMMIT")
+    except BaseException:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        raise
+    # Backfill in committed id ranges: writers get the lock between batches, and an
+    # interrupted run resumes where it stopped (only unlinked rows are touched).
+    norm = contact_norm_sql("p.owner_contact")
+    last = conn.execute("SELECT COALESCE(MAX(id), 0) FROM patients").fetchone()[0]
+    for start in range(0, last + 1, BATCH_SIZE):
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            bounds = (start, start + BATCH_SIZE)
+            conn.execute(f"""
+                INSERT OR IGNORE INTO owners (name, contact, contact_norm)
+                SELECT p.owner_name, p.owner_contact, {norm} FROM patients p
+                WHERE p.id >= ? AND p.id < ? AND p.owner_id IS NULL AND {norm} <> '' ORDER BY p.id""", bounds)
+            conn.execute(f"""
+                UPDATE patients AS p SET owner_id = (SELECT o.id FROM owners o WHERE o.contact_norm = {norm})
+                WHERE p.id >= ? AND p.id < ? AND p.owner_id IS NULL""", bounds)
+            conn.execute("COMMIT")
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+
+
+
+CHANGE_TABLES = ("doctors", "patients", "inventory", "prescriptions", "billing", "appointments")
+
+
+def change_trigger_sql(table: str, cols: list[str]) -> str:
+    """Triggers appending every insert/update/delete of `table` to change_log."""
+    changed = " || ".join(f"CASE WHEN OLD.{c} IS NOT NEW.{c} THEN ',{c}' ELSE '' END" for c in cols)
+    differs = " OR ".join(f"OLD.{c} IS NOT NEW.{c}" for c in cols)
+    return f"""
+        CREATE TRIGGER IF NOT EXISTS trg_{table}_changes_insert AFTER INSERT ON {table} BEGIN
+          INSERT INTO change_log (tbl, row_id, op) VALUES ('{table}', NEW.id, 'I');
+        END;
+        CREATE TRIGGER IF NOT EXISTS trg_{table}_changes_update AFTER UPDATE ON {table}
+        WHEN {differs} BEGIN
+          INSERT INTO change_log (tbl, row_id, op, columns) VALUES ('{table}', NEW.id, 'U', substr({changed}, 2));
+          INSERT INTO change_log (tbl, row_id, op) SELECT '{table}', OLD.id, 'D' WHERE OLD.id IS NOT NEW.id;
+        END;
+        CREATE TRIGGER IF NOT EXISTS trg_{table}_changes_delete AFTER DELETE ON {table} BEGIN
+          INSERT INTO change_log (tbl, row_id, op) VALUES ('{table}', OLD.id, 'D');
+        END;
+    """
+
+
+@migration(11, "append-only change log of the six clinic tables for incremental consumers")
+def _m011_change_log(conn: sqlite3.Connection) -> None:
+    # AUTOINCREMENT: sequence numbers are never reused after compaction.
+    run_script(conn, """
+        CREATE TABLE IF NOT EXISTS change_log (
+            seq     INTEGER PRIMARY KEY AUTOINCREMENT,
+            tbl     TEXT    NOT NULL,
+            row_id  INTEGER NOT NULL,
+            op      TEXT    NOT NULL CHECK (op IN ('I', 'U', 'D')),
+            ts      TEXT    NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%fZ', 'now')),
+            columns TEXT
+        );
+        CREATE TABLE IF NOT EXISTS change_consumers (
+            name       TEXT PRIMARY KEY,
+            acked_seq  INTEGER NOT NULL DEFAULT 0,
+            updated_at TEXT    NOT NULL
+        );
+    """)
+    for table in CHANGE_TABLES:
+        run_script(conn, change_trigger_sql(table, columns(conn, table)))
+
+
+
+@migration(12, "archive guard: moving bills to an archive keeps their revenue")
+def _m012_archive_guard(conn: sqlite3.Connection) -> None:
+    # db.archive holds a row here while it deletes archived rows, inside its own transaction.
+    conn.execute("CREATE TABLE IF NOT EXISTS archive_guard (active INTEGER PRIMARY KEY)")
+    stmts = "".join(revenue_rollup_sql(t, "OLD", "-") for t in REVENUE_ROLLUPS)
+    run_script(conn, f"""
+        DROP TRIGGER IF EXISTS trg_billing_revenue_delete;
+        CREATE TRIGGER trg_billing_revenue_delete AFTER DELETE ON billing
+        WHEN NOT EXISTS (SELECT 1 FROM archive_guard)
+        BEGIN{stmts}
+        END;""")
+
+
+# table -> [(text column, "day" (days since 1970-01-01) or "minute" (of the day))]
+DATE_COLUMNS = {
+    "prescriptions": [("date", "day")],
+    "billing": [("billing_date", "day")],
+    "appointments": [("date", "day"), ("time", "minute")],
+    "inventory": [("expiry_date", "day")],
+}
+
+
+def epoch_day_sql(expr: str) -> str:
+    """Days since 1970-01-01 of a canonical 'YYYY-MM-DD' `expr`, else NULL (no 2025-02-30, no '2025-4-1')."""
+    return f"(CASE WHEN date(julianday({expr})) IS {expr} THEN CAST(julianday({expr}) - 2440587.5 AS INTEGER) END)"
+
+
+def minute_of_day_sql(expr: str) -> str:
+    """Minutes since midnight of an 'HH:MM' (or 'HH:MM:SS') `expr`, else NULL."""
+    return (f"(CASE WHEN time({expr}) IN ({expr}, {expr} || ':00') AND {expr} < '24' "
+            f"THEN CAST(substr({expr}, 1, 2) AS INTEGER) * 60 + CAST(substr({expr}, 4, 2) AS INTEGER) END)")
+
+
+def date_sql(kind: str, expr: str) -> str:
+    return epoch_day_sql(expr) if kind == "day" else minute_of_day_sql(expr)
+
+
+@migration(13, "validated integer dates and times: expression indexes and write checks")
+def _m013_integer_dates(conn: sqlite3.Connection) -> None:
+    # Indexes on the integer expressions rather than generated columns, so SELECT *
+    # keeps its shape; queries reach them through db.dates, which emits the same SQL.
+    for table, specs in DATE_COLUMNS.items():
+        # New writes must be well-formed; NULL and '' stay allowed.  Existing rows are
+        # left alone - db.dates.invalid_dates() reports them.
+        bad = " OR ".join(f"(NULLIF(NEW.{col}, '') IS NOT NULL AND {date_sql(kind, 'NEW.' + col)} IS NULL)"
+                          for col, kind in specs)
+        message = f"{table}: dates must be YYYY-MM-DD and times HH:MM"
+        run_script(conn, f"""
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_dates_insert BEFORE INSERT ON {table} WHEN {bad}
+            BEGIN SELECT RAISE(ABORT, '{message}'); END;
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_dates_update
+            BEFORE UPDATE OF {", ".join(col for col, _ in specs)} ON {table} WHEN {bad}
+            BEGIN SELECT RAISE(ABORT, '{message}'); END;
+        """)
+    # The integer indexes replace the text ones used only for range scans.
+    run_script(conn, f"""
+        CREATE INDEX IF NOT EXISTS idx_prescriptions_day_medication
+            ON prescriptions({epoch_day_sql("date")}, medication);
+        DROP INDEX IF EXISTS idx_prescriptions_date;
+        CREATE INDEX IF NOT EXISTS idx_billing_day ON billing({epoch_day_sql("billing_date")});
+        DROP INDEX IF EXISTS idx_billing_date;
+        CREATE INDEX IF NOT EXISTS idx_appointments_day_time
+            ON appointments({epoch_day_sql("date")}, {minute_of_day_sql("time")});
+        CREATE INDEX IF NOT EXISTS idx_inventory_expiry_day ON inventory({epoch_day_sql("expiry_date")});
+    """)
+
+
+@migration(14, "index change_log by table for read-through caches")
+def _m014_change_log_by_table(conn: sqlite3.Connection) -> None:
+    # db.refcache versions a table by its latest change_log seq; the index finds it in one probe.
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_change_log_tbl ON change_log(tbl)")
+
+
+@migration(15, "case-insensitive name indexes for prefix autocomplete")
+def _m015_nocase_names(conn: sqlite3.Connection) -> None:
+    # modules.search.prefix_lookup range-scans these: cost follows the match limit, not the table.
+    for _, table, column in TRIGRAM_SOURCES.values():
+        conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_{column}_nocase ON {table}({column} COLLATE NOCASE)")
+
+
+@migration(16, "trigger-maintained row counts for the metrics exporter")
+def _m016_row_counts(conn: sqlite3.Connection) -> None:
+    # Counted once here, then kept by insert/delete triggers, so a scrape reads six rows.
+    conn.execute("CREATE TABLE IF NOT EXISTS row_counts (tbl TEXT PRIMARY KEY, n INTEGER NOT NULL) WITHOUT ROWID")
+    for table in CHANGE_TABLES:
+        conn.execute(f"INSERT OR REPLACE INTO row_counts (tbl, n) SELECT '{table}', COUNT(*) FROM {table}")
+        run_script(conn, f"""
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_rows_insert AFTER INSERT ON {table} BEGIN
+              UPDATE row_counts SET n = n + 1 WHERE tbl = '{table}';
+            END;
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_rows_delete AFTER DELETE ON {table} BEGIN
+              UPDATE row_counts SET n = n - 1 WHERE tbl = '{table}';
+            END;
+        """)
+
+
+# -------------------- Engine --------------------
+
+def current_version(conn: sqlite3.Connection) -> int:
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(db_path: str | None = None, verbose: bool = True) -> int:
+    """Apply pending migrations to `db_path`; returns the resulting version."""
+    db_path = db_path or DB_PATH
+    conn = connect(db_path, isolation_level=None)
+    try:
+        version = current_version(conn)
+        for target, description, fn, transactional in MIGRATIONS:
+            if target <= version:
+                continue
+            t0 = time.perf_counter()
+            if not transactional:
+                fn(conn)
+                conn.execute(f"PRAGMA user_version = {target:d}")
+                version = target
+                if verbose:
+                    print(f"  migration {target:03d} applied: {description} ({time.perf_counter() - t0:.2f}s)")
+                continue
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Re-check under the write lock: another process may have migrated meanwhile.
+                if current_version(conn) >= target:
+                    conn.execute("COMMIT")
+                    version = current_version(conn)
+                    continue
+                fn(conn)
+                conn.execute(f"PRAGMA user_version = {target:d}")
+                conn.execute("COMMIT")
+            except BaseException:
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+                raise
+            version = target
+            if verbose:
+                print(f"  migration {target:03d} applied: {description} ({time.perf_counter() - t0:.2f}s)")
+        return version
+    finally:
+        conn.close()
+
+
+def ensure_schema(db_path: str | None = None) -> None:
+    """Bring `db_path` up to date; a no-op (no SQL at all) once verified in this process."""
+    key = os.path.abspath(db_path or DB_PATH)
+    if key in _current:
+        return
+    with _lock:
+        if key in _current:
+            return
+        conn = connect(key)
+        try:
+            pending = current_version(conn) < latest_version()
+        finally:
+            conn.close()
+        if pending:
+            migrate(key, verbose=False)
+        _current.add(key)
+
+
+def forget(db_path: str | None = None) -> None:
+    """Drop the in-process 'up to date' mark (after a reset or restore)."""
+    _current.discard(os.path.abspath(db_path or DB_PATH))
+
+
+def main(argv: list[str] | None = None) -> None:
+    ap = argparse.ArgumentParser(description="Apply pending schema migrations.")
+    ap.add_argument("--db", default=DB_PATH)
+    ap.add_argument("--status", action="store_true", help="Only print the current and latest versions.")
+    args = ap.parse_args(argv)
+    if args.status:
+        conn = connect(args.db)
+        try:
+            print(f"{args.db}: version {current_version(conn)} (latest {latest_version()})")
+        finally:
+            conn.close()
+        return
+    version = migrate(args.db)
+    print(f"✅ {args.db} is at schema version {version}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+# db/refcache.py
+"""
+Read-through cache of reference lists, such as the patients and doctors the
+CLI prescription menu offers.
+
+Lists are kept per database, tagged with the latest change_log sequence
+number of each table they read.  A lookup costs one small query: if no
+table's number moved, the cached list is returned as is, otherwise it is
+reloaded in the same read transaction.  The log lives in the database, so
+writes from other processes invalidate too.
+
+Entries are evicted least-recently-used once there are more than
+MAX_ENTRIES lists or MAX_ROWS rows in total; a single list larger than
+MAX_ROWS is returned but not kept.
+"""
+from __future__ import annotations
+
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Callable
+
+from db import metrics, migrations
+from db.instrument import connect
+
+DB_PATH = os.path.join(os.path.dirname(__file__), "..", "clinic.db")
+MAX_ENTRIES = 32
+MAX_ROWS = 2_000_000
+
+_lock = threading.Lock()
+_entries: OrderedDict[tuple, tuple[tuple[int, ...], list]] = OrderedDict()   # key -> (versions, rows)
+_rows = [0]
+
+
+def _key(db_path: str, name: str) -> tuple:
+    # The inode tells a database swapped in under the same name (restore, reset) from the old one.
+    path = os.path.abspath(db_path)
+    return path, os.stat(path).st_ino, name
+
+
+def versions(conn: sqlite3.Connection, tables: tuple[str, ...]) -> tuple[int, ...]:
+    """
+    Each table's last change_log seq.  Once compaction has removed all of a
+    table's entries, the seq just below the oldest entry kept (or the last seq
+    handed out, with the log empty) stands in: every change it removed is at or
+    below that, so a later change still moves the number.
+    """
+    untracked = set(tables) - set(migrations.CHANGE_TABLES)
+    if untracked:
+        raise ValueError(f"change_log does not track {sorted(untracked)}")
+    latest = ", ".join("(SELECT MAX(seq) FROM change_log WHERE tbl = ?)" for _ in tables)
+    *found, floor = conn.execute(f"""
+        SELECT {latest}, COALESCE((SELECT MIN(seq) FROM change_log) - 1,
+                                  (SELECT seq FROM sqlite_sequence WHERE name = 'change_log'), 0)
+    """, tables).fetchone()
+    return tuple(floor if v is None else v for v in found)
+
+
+def _store(key: tuple, tag: tuple[int, ...], rows: list) -> None:
+    with _lock:
+        old = _entries.pop(key, None)
+        if old is not None:
+            _rows[0] -= len(old[1])
+        if len(rows) > MAX_ROWS:
+            return
+        _entries[key] = (tag, rows)
+        _rows[0] += len(rows)
+        while len(_entries) > MAX_ENTRIES or _rows[0] > MAX_ROWS:
+            _, (_, evicted) = _entries.popitem(last=False)
+            _rows[0] -= len(evicted)
+
+
+def cached(name: str, tables: tuple[str, ...], load: Callable[[sqlite3.Connection], list],
+           db_path: str | None = None) -> list:
+    """
+    The list `load(conn)` returns, reloaded only when one of `tables` changed
+    since it was cached under `name`.  Callers must not mutate the result.
+    """
+    db_path = db_path or DB_PATH
+    migrations.ensure_schema(db_path)
+    key = _key(db_path, name)
+    conn = connect(db_path, isolation_level=None)
+    try:
+        conn.execute("BEGIN")  # the counters and the rows come from one snapshot
+        tag = versions(conn, tables)
+        with _lock:
+            hit = _entries.get(key)
+            if hit is not None and hit[0] == tag:
+                _entries.move_to_end(key)
+                metrics.cache_hit("refcache")
+                return hit[1]
+        metrics.cache_miss("refcache")
+        rows = load(conn)
+        conn.execute("COMMIT")
+    finally:
+        conn.close()
+    _store(key, tag, rows)
+    return rows
+
+
+def clear() -> None:
+    with _lock:
+        _entries.clear()
+        _rows[0] = 0
+
+
+def size() -> tuple[int, int]:
+    """(lists, rows) currently cached."""
+    with _lock:
+        return len(_entries), _rows[0]
+
+
+# -------------------- Reference lists --------------------
+
+def patients_by_name(db_path: str | None = None) -> list[tuple[int, str]]:
+    return cached("patients_by_name", ("patients",),
+                  lambda c: c.execute("SELECT id, name FROM patients ORDER BY name").fetchall(), db_path)
+
+
+def doctors_by_name(db_path: str | None = None) -> list[tuple[int, str]]:
+    return cached("doctors_by_name", ("doctors",),
+                  lambda c: c.execute("SELECT id, name FROM doctors ORDER BY name").fetchall(), db_path)
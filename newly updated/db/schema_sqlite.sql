@@ -1,19 +1,9 @@
 -- db/schema_sqlite.sql
-
-PRAGMA foreign_keys = ON;
-
-BEGIN TRANSACTION;
-
--- Drop in FK-safe order
-DROP TABLE IF EXISTS billing;
-DROP TABLE IF EXISTS prescriptions;
-DROP TABLE IF EXISTS appointments;
-DROP TABLE IF EXISTS inventory;
-DROP TABLE IF EXISTS patients;
-DROP TABLE IF EXISTS doctors;
+-- Baseline schema (migration 1). Later changes live in db/migrations.py;
+-- never edit this file in a way that changes an existing database.
 
 -- -------------------- Doctors --------------------
-CREATE TABLE doctors (
+CREATE TABLE IF NOT EXISTS doctors (
   id             INTEGER PRIMARY KEY AUTOINCREMENT,
   vcn            TEXT    NOT NULL UNIQUE,
   name           TEXT    NOT NULL,
@@ -23,10 +13,10 @@ CREATE TABLE doctors (
 );
 
 -- Helpful name lookup
-CREATE INDEX idx_doctors_name ON doctors(name);
+CREATE INDEX IF NOT EXISTS idx_doctors_name ON doctors(name);
 
 -- -------------------- Patients --------------------
-CREATE TABLE patients (
+CREATE TABLE IF NOT EXISTS patients (
   id            INTEGER PRIMARY KEY AUTOINCREMENT,
   name          TEXT    NOT NULL,
   species       TEXT,
@@ -35,10 +25,10 @@ CREATE TABLE patients (
   owner_contact TEXT
 );
 
-CREATE INDEX idx_patients_name ON patients(name);
+CREATE INDEX IF NOT EXISTS idx_patients_name ON patients(name);
 
 -- -------------------- Inventory --------------------
-CREATE TABLE inventory (
+CREATE TABLE IF NOT EXISTS inventory (
   id          INTEGER PRIMARY KEY AUTOINCREMENT,
   item_name   TEXT    NOT NULL,
   description TEXT,
@@ -47,10 +37,10 @@ CREATE TABLE inventory (
   expiry_date TEXT
 );
 
-CREATE INDEX idx_inventory_item_name ON inventory(item_name);
+CREATE INDEX IF NOT EXISTS idx_inventory_item_name ON inventory(item_name);
 
 -- -------------------- Prescriptions --------------------
-CREATE TABLE prescriptions (
+CREATE TABLE IF NOT EXISTS prescriptions (
   id          INTEGER PRIMARY KEY AUTOINCREMENT,
   patient_id  INTEGER NOT NULL,
   doctor_id   INTEGER NOT NULL,
@@ -63,13 +53,13 @@ CREATE TABLE prescriptions (
   FOREIGN KEY (doctor_id)  REFERENCES doctors(id)  ON DELETE CASCADE
 );
 
-CREATE INDEX idx_prescriptions_date       ON prescriptions(date);
-CREATE INDEX idx_prescriptions_medication ON prescriptions(medication);
-CREATE INDEX idx_prescriptions_patient    ON prescriptions(patient_id);
-CREATE INDEX idx_prescriptions_doctor     ON prescriptions(doctor_id);
+CREATE INDEX IF NOT EXISTS idx_prescriptions_date       ON prescriptions(date);
+CREATE INDEX IF NOT EXISTS idx_prescriptions_medication ON prescriptions(medication);
+CREATE INDEX IF NOT EXISTS idx_prescriptions_patient    ON prescriptions(patient_id);
+CREATE INDEX IF NOT EXISTS idx_prescriptions_doctor     ON prescriptions(doctor_id);
 
 -- -------------------- Billing --------------------
-CREATE TABLE billing (
+CREATE TABLE IF NOT EXISTS billing (
   id              INTEGER PRIMARY KEY AUTOINCREMENT,
   prescription_id INTEGER NOT NULL,
   total_amount    REAL    NOT NULL CHECK (total_amount >= 0.0),
@@ -78,11 +68,11 @@ CREATE TABLE billing (
   FOREIGN KEY (prescription_id) REFERENCES prescriptions(id) ON DELETE CASCADE
 );
 
-CREATE INDEX idx_billing_prescription ON billing(prescription_id);
-CREATE INDEX idx_billing_date         ON billing(billing_date);
+CREATE INDEX IF NOT EXISTS idx_billing_prescription ON billing(prescription_id);
+CREATE INDEX IF NOT EXISTS idx_billing_date         ON billing(billing_date);
 
 -- -------------------- Appointments --------------------
-CREATE TABLE appointments (
+CREATE TABLE IF NOT EXISTS appointments (
   id         INTEGER PRIMARY KEY AUTOINCREMENT,
   patient_id INTEGER NOT NULL,
   doctor_id  INTEGER NOT NULL,
@@ -95,8 +85,6 @@ CREATE TABLE appointments (
   FOREIGN KEY(doctor_id)  REFERENCES doctors(id)  ON DELETE CASCADE
 );
 
-CREATE INDEX idx_appointments_date_time ON appointments(date, time);
-CREATE INDEX idx_appointments_patient   ON appointments(patient_id);
-CREATE INDEX idx_appointments_doctor    ON appointments(doctor_id);
-
-COMMIT;
+CREATE INDEX IF NOT EXISTS idx_appointments_date_time ON appointments(date, time);
+CREATE INDEX IF NOT EXISTS idx_appointments_patient   ON appointments(patient_id);
+CREATE INDEX IF NOT EXISTS idx_appointments_doctor    ON appointments(doctor_id);
@@ -0,0 +1,166 @@
+# db/snapshot.py
+"""
+Consistent read-only views of the clinic database for analytics.
+
+Two ways to keep long scans away from the front desk:
+  * "wal"  - a read transaction pinned on the live database.  In WAL mode
+             (schema v3+) readers and the writer never block each other, and
+             the scan sees the database exactly as it was when it started.
+             Costs nothing to "refresh".  While it is open, checkpoints can't
+             pass it, so the WAL grows for the duration of the scan.
+  * "copy" - a backup-API copy next to the database (<name>.analytics.db),
+             rebuilt only when the source has changed *and* the copy is older
+             than `max_age`.  Used for rollback-journal databases, or when the
+             scan should not touch the live file at all.
+
+Either way the caller gets the timestamp the data is valid as of.
+
+    python -m db.snapshot             # refresh the analytics copy now
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Iterator
+
+from db.instrument import connect, readonly_uri
+
+DB_PATH = os.path.join(os.path.dirname(__file__), "..", "clinic.db")
+MAX_AGE = float(os.environ.get("VETAI_SNAPSHOT_MAX_AGE", "300"))   # seconds a stale copy may be served
+MODE = os.environ.get("VETAI_SNAPSHOT_MODE", "auto")                # auto | wal | copy
+
+_lock = threading.Lock()
+_known: dict[str, tuple[tuple, float]] = {}   # copy path -> (source fingerprint, refreshed_at)
+
+
+def snapshot_path(db_path: str) -> str:
+    root, _ = os.path.splitext(db_path)
+    return root + ".analytics.db"
+
+
+def is_wal(db_path: str) -> bool:
+    """True if the file's header says WAL (bytes 18/19 == 2), without opening a connection."""
+    try:
+        with open(db_path, "rb") as f:
+            header = f.read(20)
+    except OSError:
+        return False
+    return len(header) == 20 and header[18] == 2 and header[19] == 2
+
+
+def _fingerprint(db_path: str) -> tuple:
+    out = []
+    for p in (db_path, db_path + "-wal"):
+        try:
+            st = os.stat(p)
+            out += [st.st_size, st.st_mtime_ns]
+        except FileNotFoundError:
+            out += [0, 0]
+    return tuple(out)
+
+
+def _read_meta(path: str) -> tuple[tuple, float] | None:
+    try:
+        conn = sqlite3.connect(readonly_uri(path), uri=True)
+        try:
+            row = conn.execute("SELECT fingerprint, refreshed_at FROM snapshot_meta").fetchone()
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        return None
+    return (tuple(int(x) for x in row[0].split(",")), row[1]) if row else None
+
+
+def refresh(db_path: str | None = None, max_age: float = MAX_AGE, force: bool = False) -> float:
+    """
+    Bring the analytics copy up to date if needed; returns its refreshed_at
+    (epoch seconds).  An unchanged source, or a copy younger than `max_age`,
+    costs two stat() calls.
+    """
+    db_path = os.path.abspath(db_path or DB_PATH)
+    path = snapshot_path(db_path)
+    with _lock:
+        known = _known.get(path)
+        if known is None and os.path.exists(path):
+            known = _read_meta(path)
+        fp = _fingerprint(db_path)
+        if known and not force and (known[0] == fp or time.time() - known[1] < max_age):
+            _known[path] = known
+            return known[1]
+
+        partial = path + ".partial"
+        if os.path.exists(partial):
+            os.remove(partial)
+        src = sqlite3.connect(db_path)
+        dst = sqlite3.connect(partial)
+        try:
+            refreshed_at = time.time()
+            # One step = one read transaction on the source: in WAL mode writers carry on.
+            src.backup(dst, pages=-1)
+            with dst:
+                dst.execute("PRAGMA journal_mode=DELETE")
+                dst.execute("CREATE TABLE IF NOT EXISTS snapshot_meta (fingerprint TEXT, refreshed_at REAL)")
+                dst.execute("DELETE FROM snapshot_meta")
+                dst.execute("INSERT INTO snapshot_meta VALUES (?, ?)", (",".join(map(str, fp)), refreshed_at))
+        finally:
+            dst.close()
+            src.close()
+        # Readers holding the old copy open keep reading it; new readers get this one.
+        os.replace(partial, path)
+        _known[path] = (fp, refreshed_at)
+        return refreshed_at
+
+
+@contextmanager
+def pinned(db_path: str | None = None) -> Iterator[tuple[sqlite3.Connection, datetime]]:
+    """Read-only connection inside one read transaction on the live database."""
+    conn = connect(readonly_uri(db_path or DB_PATH), uri=True, isolation_level=None, timeout=30)
+    try:
+        conn.execute("BEGIN")
+        conn.execute("SELECT 1 FROM sqlite_master LIMIT 1").fetchone()  # takes the read mark now
+        yield conn, datetime.now()
+    finally:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        conn.close()
+
+
+@contextmanager
+def reader(db_path: str | None = None, max_age: float = MAX_AGE,
+           mode: str | None = None) -> Iterator[tuple[sqlite3.Connection, datetime]]:
+    """
+    Yield (read-only connection, as_of) for an analytics scan.
+    `mode` is "wal", "copy" or "auto" (pinned if the database is in WAL mode).
+    """
+    db_path = db_path or DB_PATH
+    mode = mode or MODE
+    if mode == "wal" or (mode == "auto" and is_wal(db_path)):
+        with pinned(db_path) as pair:
+            yield pair
+        return
+    refreshed_at = refresh(db_path, max_age)
+    conn = connect(readonly_uri(snapshot_path(os.path.abspath(db_path))), uri=True)
+    try:
+        yield conn, datetime.fromtimestamp(refreshed_at)
+    finally:
+        conn.close()
+
+
+def main(argv: list[str] | None = None) -> None:
+    ap = argparse.ArgumentParser(description="Refresh the read-only analytics copy of the clinic database.")
+    ap.add_argument("--db", default=DB_PATH)
+    ap.add_argument("--max-age", type=float, default=0.0, help="Skip if the copy is younger than this (seconds).")
+    args = ap.parse_args(argv)
+    t0 = time.perf_counter()
+    refreshed_at = refresh(args.db, args.max_age, force=args.max_age <= 0)
+    print(f"✅ {snapshot_path(os.path.abspath(args.db))} as of "
+          f"{datetime.fromtimestamp(refreshed_at):%Y-%m-%d %H:%M:%S} ({time.perf_counter() - t0:.2f}s)")
+
+
+if __name__ == "__main__":
+    main()
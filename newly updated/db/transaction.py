@@ -0,0 +1,112 @@
+# db/transaction.py
+"""
+Unit-of-work transactions spanning several module calls.
+
+    import modules as clinic
+    with clinic.transaction() as tx:
+        rx = prescriptions.add_prescription(pid, did, "Otitis", "Otomax", "5 drops", "Twice daily", tx=tx)
+        billing.generate_bill(rx, 850.0, 850.0, tx=tx)
+        with tx.savepoint():                       # may fail without undoing the rest
+            appointments.update_appointment(..., status="Completed", tx=tx)
+
+Everything inside commits once (one fsync) or not at all.  Module write
+functions take `tx=`; without it they still join a transaction opened on the
+same database in the same thread, so helpers that don't pass `tx` along stay
+inside the unit of work.  A nested transaction() becomes a savepoint.  Writes
+outside any transaction go through the process's db.writer queue and are
+group-committed with the other threads' writes.
+"""
+from __future__ import annotations
+
+import contextvars
+import itertools
+import os
+import sqlite3
+from contextlib import contextmanager
+from typing import Iterator
+
+from db.instrument import connect
+
+DB_PATH = os.path.join(os.path.dirname(__file__), "..", "clinic.db")
+
+_current: contextvars.ContextVar["Transaction | None"] = contextvars.ContextVar("clinic_transaction", default=None)
+_names = itertools.count(1)
+
+
+class Transaction:
+    """An open BEGIN IMMEDIATE on `db_path`; use through transaction()."""
+
+    def __init__(self, db_path: str, conn: sqlite3.Connection) -> None:
+        self.db_path = db_path
+        self.conn = conn
+
+    @contextmanager
+    def savepoint(self) -> Iterator["Transaction"]:
+        """Roll back only this block's writes if it raises (the exception still propagates)."""
+        name = f"sp_{next(_names)}"
+        self.conn.execute(f"SAVEPOINT {name}")
+        try:
+            yield self
+        except BaseException:
+            self.conn.execute(f"ROLLBACK TO {name}")
+            self.conn.execute(f"RELEASE {name}")
+            raise
+        self.conn.execute(f"RELEASE {name}")
+
+
+def current(db_path: str | None = None) -> Transaction | None:
+    """The transaction open in this thread/context (on `db_path`, if given)."""
+    tx = _current.get()
+    if tx is not None and db_path is not None and tx.db_path != os.path.abspath(db_path):
+        return None
+    return tx
+
+
+@contextmanager
+def transaction(db_path: str | None = None) -> Iterator[Transaction]:
+    """Commit everything done inside the block at once, or roll it all back."""
+    path = os.path.abspath(db_path or DB_PATH)
+    outer = current(path)
+    if outer is not None:
+        with outer.savepoint():
+            yield outer
+        return
+    conn = connect(path, isolation_level=None, timeout=30)
+    tx = Transaction(path, conn)
+    token = _current.set(tx)
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        yield tx
+        conn.execute("COMMIT")
+    except BaseException:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        raise
+    finally:
+        _current.reset(token)
+        conn.close()
+
+
+@contextmanager
+def connection_for(db_path: str, tx: Transaction | None = None) -> Iterator[sqlite3.Connection]:
+    """
+    Connection for one module write: the transaction's (explicit `tx`, or the
+    one open on `db_path`), else the db.writer connection, committed with its
+    batch before this returns.
+    """
+    from db import writer   # writer builds on this module
+
+    path = os.path.abspath(db_path)
+    if tx is not None and tx.db_path != path:
+        raise ValueError(f"Transaction is on {tx.db_path}, not {path}.")
+    tx = tx or current(path)
+    if tx is not None:
+        yield tx.conn
+        return
+    with writer.get_writer(path).lend() as conn:
+        # Module writes nested in this one (helpers without tx=) join it.
+        token = _current.set(Transaction(path, conn))
+        try:
+            yield conn
+        finally:
+            _current.reset(token)
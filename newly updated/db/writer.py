@@ -0,0 +1,236 @@
+# db/writer.py
+"""
+Single-writer queue with group commit.
+
+One thread owns the write connection and drains a queue of write operations.
+Operations arriving within WINDOW_S of the first one in a batch (up to
+MAX_BATCH) share one transaction and therefore one fsync; each runs under its
+own SAVEPOINT, so a failing operation rolls back alone and the rest commit.
+Producers get a concurrent.futures.Future per operation, resolved with the
+operation's result (lastrowid / rowcount for execute()) or its exception once
+the batch is durable.
+
+Module writes outside a clinic.transaction() reach the writer through
+db.transaction.connection_for, which runs the write's block on the writer's
+connection with lend().  Threads of one process therefore never contend for
+SQLite's write lock.  Separate processes (CLI, GUI, a service) each have
+their own writer and still take the lock in turn, waiting up to the 30 s busy
+timeout, but for one short group commit at a time instead of one per write.
+
+    w = writer.get_writer()
+    pid = w.execute("INSERT INTO patients (name) VALUES (?)", ("Rex",)).result()
+    w.submit(lambda conn: conn.execute(...).rowcount)      # any fn(conn) without commit()
+    with w.lend() as conn:                                  # a block of statements, committed on exit
+        conn.execute(...)
+"""
+from __future__ import annotations
+
+import atexit
+import os
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator
+
+from db import metrics, transaction
+from db.instrument import connect
+
+DB_PATH = os.path.join(os.path.dirname(__file__), "..", "clinic.db")
+WINDOW_S = float(os.environ.get("VETAI_WRITER_WINDOW_MS", "2")) / 1000
+MAX_BATCH = 256
+
+_STOP = object()
+
+
+class _Aborted(Exception):
+    """A lent block raised; its savepoint is rolled back and the caller re-raises its own error."""
+
+
+def _execute(conn: sqlite3.Connection, sql: str, params) -> int:
+    cur = conn.execute(sql, params)
+    return cur.lastrowid if sql.lstrip()[:6].upper() == "INSERT" else cur.rowcount
+
+
+class Writer:
+    """Owns one write connection to `db_path`; see the module docstring."""
+
+    def __init__(self, db_path: str | None = None, window: float = WINDOW_S, max_batch: int = MAX_BATCH) -> None:
+        self.db_path = db_path or DB_PATH
+        self.file_id = _file_id(self.db_path)
+        self.window = window
+        self.max_batch = max_batch
+        self.stats = {"ops": 0, "errors": 0, "batches": 0, "commit_failures": 0}
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name=f"writer:{os.path.basename(self.db_path)}",
+                                        daemon=True)
+        self._thread.start()
+
+    # ---- producer side ----
+
+    def submit(self, fn: Callable[..., Any], *args) -> Future:
+        """Queue fn(conn, *args); it must not commit.  Returns a Future of its result."""
+        if self._closed:
+            raise RuntimeError("Writer is closed.")
+        fut: Future = Future()
+        self._queue.put((fn, args, fut))
+        return fut
+
+    def execute(self, sql: str, params=()) -> Future:
+        """Queue one statement; the Future resolves to lastrowid (INSERT) or rowcount."""
+        return self.submit(_execute, sql, params)
+
+    @contextmanager
+    def lend(self) -> Iterator[sqlite3.Connection]:
+        """
+        Run the block on the writer's connection, as one operation of the next
+        batch, and return once that batch is committed.  If the block raises,
+        only its own writes are rolled back.
+        """
+        if threading.current_thread() is self._thread:
+            raise RuntimeError("lend() called from the writer thread; use the operation's connection.")
+        lent: queue.SimpleQueue = queue.SimpleQueue()
+        finished: queue.SimpleQueue = queue.SimpleQueue()
+
+        def op(conn: sqlite3.Connection) -> None:
+            lent.put(conn)
+            if not finished.get():
+                raise _Aborted()
+
+        fut = self.submit(op)
+        fut.add_done_callback(lambda f: lent.put(None))   # the batch failed before the block ran
+        conn = lent.get()
+        if conn is None:
+            fut.result()
+        try:
+            yield conn
+        except BaseException:
+            finished.put(False)
+            try:
+                fut.result()
+            except _Aborted:
+                pass
+            raise
+        finished.put(True)
+        fut.result()
+
+    def close(self, timeout: float | None = None) -> None:
+        """Commit what is queued, then stop the writer thread."""
+        if not self._closed:
+            self._closed = True
+            self._queue.put(_STOP)
+        self._thread.join(timeout)
+
+    def __enter__(self) -> "Writer":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    # ---- writer thread ----
+
+    def _run(self) -> None:
+        # lend() hands the connection to the producer's thread while this one waits.
+        conn = connect(self.db_path, isolation_level=None, timeout=30, check_same_thread=False)
+        try:
+            stop = False
+            while not stop:
+                item = self._queue.get()
+                if item is _STOP:
+                    break
+                batch = [item]
+                deadline = time.monotonic() + self.window
+                while len(batch) < self.max_batch:
+                    try:
+                        item = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+                    except queue.Empty:
+                        break
+                    if item is _STOP:
+                        stop = True
+                        break
+                    batch.append(item)
+                self._commit(conn, batch)
+        finally:
+            conn.close()
+
+    def _commit(self, conn: sqlite3.Connection, batch: list) -> None:
+        done = []
+        t0 = time.perf_counter()
+        # Module writes made by an operation join the batch instead of queueing behind it.
+        token = transaction._current.set(transaction.Transaction(self.db_path, conn))
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for fn, args, fut in batch:
+                if not fut.set_running_or_notify_cancel():
+                    continue
+                conn.execute("SAVEPOINT op")
+                try:
+                    result, error = fn(conn, *args), None
+                    conn.execute("RELEASE op")
+                except Exception as e:
+                    conn.execute("ROLLBACK TO op")
+                    conn.execute("RELEASE op")
+                    result, error = None, e
+                done.append((fut, result, error))
+            conn.execute("COMMIT")
+        except Exception as e:
+            # Nothing in the batch is durable: every operation fails with the commit error.
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            self.stats["commit_failures"] += 1
+            for _, _, fut in batch:
+                if not fut.done() and (fut.running() or fut.set_running_or_notify_cancel()):
+                    fut.set_exception(e)
+            return
+        finally:
+            transaction._current.reset(token)
+            # Operations may ATTACH (archives); DETACH only works now, outside the batch.
+            for _, name, _ in conn.execute("PRAGMA database_list").fetchall():
+                if name not in ("main", "temp"):
+                    conn.execute(f"DETACH DATABASE {name}")
+        self.stats["batches"] += 1
+        metrics.observe_job("writer_batch", time.perf_counter() - t0)
+        for fut, result, error in done:
+            self.stats["ops"] += 1
+            if error is None:
+                fut.set_result(result)
+            else:
+                self.stats["errors"] += 1
+                fut.set_exception(error)
+
+
+_lock = threading.Lock()
+_writers: dict[str, Writer] = {}
+
+
+def _file_id(path: str) -> tuple[int, int] | None:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_dev, st.st_ino
+
+
+def get_writer(db_path: str | None = None) -> Writer:
+    """The process-wide writer for `db_path`, started on first use (and again if the file is replaced)."""
+    key = os.path.abspath(db_path or DB_PATH)
+    with _lock:
+        w = _writers.get(key)
+        if w is not None and not w._closed and w.file_id != _file_id(key):   # restored or recreated
+            w.close()
+        if w is None or w._closed:
+            w = _writers[key] = Writer(key)
+        return w
+
+
+@atexit.register
+def shutdown() -> None:
+    """Flush and stop every writer started by get_writer()."""
+    with _lock:
+        writers = list(_writers.values())
+        _writers.clear()
+    for w in writers:
+        w.close()
@@ -1,6 +1,9 @@
 # main.py
 from __future__ import annotations
 
+import os
+import sys
+
 from modules import doctors, patients, inventory, prescriptions, billing, ai
 try:
     from modules import appointments  # new module
@@ -8,7 +11,11 @@ try:
 except Exception:
     HAVE_APPTS = False
 
+from db import backup, branches, explain, instrument, metrics
 from db.init_db import initialize_db
+from db.migrations import ensure_schema
+from seed.insert_dummy_data import insert_dummy_data
+
 def main_menu() -> str:
     print("\n🐾 VetAI Clinic Intelligence System (CLI)")
     print("1. Initialize Database")
@@ -21,16 +28,22 @@ def main_menu() -> str:
     if HAVE_APPTS:
         print("8. Manage Appointments")
         print("9. Run AI Features")
-        print("0. Exit")
     else:
         print("8. Run AI Features")
-        print("0. Exit")
+    print("B. Backup Database")
+    print("S. Query Statistics")
+    print("0. Exit")
 
     choice = input("Select an option: ").strip()
     return choice
 
 
 def main() -> None:
+    metrics.start_from_env()
+    if os.environ.get("VETAI_BRANCH"):  # route every module to that branch's database
+        print(f"🏥 Branch: {os.environ['VETAI_BRANCH']} ({branches.activate(os.environ['VETAI_BRANCH'])})")
+    else:
+        ensure_schema()
     while True:
         choice = main_menu()
 
@@ -49,10 +62,13 @@ def main() -> None:
         elif choice == "7":
             billing.manage_billing()
         elif choice == "8" and HAVE_APPTS:
-            appointments.ensure_table()
             appointments.manage_appointments()
         elif (choice == "8" and not HAVE_APPTS) or (choice == "9" and HAVE_APPTS):
             ai.run_ai_features()
+        elif choice.upper() == "B":
+            backup.backup()
+        elif choice.upper() == "S":
+            instrument.report()
         elif choice == "0":
             print("Goodbye! 🐶")
             break
@@ -61,4 +77,7 @@ def main() -> None:
 
 
 if __name__ == "__main__":
-    main()
+    if sys.argv[1:2] == ["--explain"]:  # python main.py --explain [--db PATH] [--slow-log PATH] [--all]
+        explain.main(sys.argv[2:])
+    else:
+        main()
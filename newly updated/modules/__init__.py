@@ -3,4 +3,6 @@
 from __future__ import annotations
 import os
 
+from db.transaction import Transaction, transaction
+
 DB_PATH = os.path.join(os.path.dirname(__file__), "..", "clinic.db")
@@ -2,10 +2,12 @@
 from __future__ import annotations
 
 import os
-import sqlite3
 from collections import Counter
 from datetime import datetime, timedelta
 
+from db import columnar, dates, metrics, snapshot
+from modules import interactions
+
 DB_PATH = os.path.join(os.path.dirname(__file__), "..", "clinic.db")
 
 
@@ -15,13 +17,25 @@ def predict_top_drugs(days: int = 90, top_n: int = 5) -> list[tuple[str, int]]:
     Also prints a friendly summary (for CLI/GUI log).
     """
     since = (datetime.now() - timedelta(days=days)).strftime("%Y-%m-%d")
-    with sqlite3.connect(DB_PATH) as conn:
-        meds = [row[0] for row in conn.execute(
-            "SELECT medication FROM prescriptions WHERE date >= ?", (since,)
-        ).fetchall()]
-    counts = Counter(meds).most_common(top_n)
+    with metrics.timed_job("predict_top_drugs"):
+        # Analytics read a snapshot, never the live write path (the cache is refreshed from one too).
+        cols = columnar.load(DB_PATH)
+        if cols is not None:
+            # Vectorised: count medication codes over the mmapped date column.
+            rx = cols["prescriptions"]
+            recent = rx["live"] & (rx["day"] >= columnar.to_day(since))
+            counts = columnar.most_common(rx["medication"][recent], cols.dicts["medication"], top_n)
+            as_of = cols.as_of
+        else:
+            with snapshot.reader(DB_PATH) as (conn, as_of):
+                # "+medication": range-scan the covering (day, medication) index instead of
+                # walking the medication index over all history.
+                where, params = dates.day_range("date", since)
+                counts = Counter(dict(conn.execute(
+                    f"SELECT medication, COUNT(*) FROM prescriptions WHERE {where} GROUP BY +medication", params
+                ).fetchall())).most_common(top_n)
 
-    print(f"\n📈 Predicted Top Used Drugs (last {days} days):")
+    print(f"\n📈 Predicted Top Used Drugs (last {days} days, data as of {as_of:%Y-%m-%d %H:%M}):")
     if not counts:
         print("No recent prescriptions found.")
     else:
@@ -37,17 +51,32 @@ def flag_underbilled(threshold: float = 0.6) -> list[tuple[int, int, str, float,
     where paid_amount < threshold * total_amount
     Also prints a friendly summary.
     """
-    with sqlite3.connect(DB_PATH) as conn:
-        rows = conn.execute("""
+    sql = """
             SELECT b.id, b.prescription_id, pt.name, b.total_amount, b.paid_amount
             FROM billing b
             JOIN prescriptions p ON b.prescription_id = p.id
             JOIN patients pt      ON p.patient_id    = pt.id
-        """).fetchall()
+            WHERE b.paid_amount < ? * b.total_amount"""
+    with metrics.timed_job("flag_underbilled"):
+        cols = columnar.load(DB_PATH)
+        ids = None
+        if cols is not None:
+            # Find candidates on the mmapped amount columns; worth it unless most bills qualify.
+            bills = cols["billing"]
+            hits = bills["id"][bills["live"] & (bills["paid_amount"] < threshold * bills["total_amount"])]
+            if len(hits) * 20 < len(bills["id"]):
+                ids = hits.tolist()
+        with snapshot.reader(DB_PATH) as (conn, as_of):
+            if ids is None:
+                flagged = conn.execute(sql + " ORDER BY b.id", (threshold,)).fetchall()
+            else:
+                flagged = []
+                for start in range(0, len(ids), 900):
+                    chunk = ids[start:start + 900]
+                    flagged += conn.execute(f"{sql} AND b.id IN ({','.join('?' * len(chunk))}) ORDER BY b.id",
+                                            (threshold, *chunk)).fetchall()
 
-    flagged = [r for r in rows if r[4] < threshold * r[3]]
-
-    print(f"\n⚠️ Underbilled Prescriptions (paid < {int(threshold*100)}% of total):")
+    print(f"\n⚠️ Underbilled Prescriptions (paid < {int(threshold*100)}% of total, data as of {as_of:%Y-%m-%d %H:%M}):")
     if not flagged:
         print("✅ No underbilled prescriptions found.")
     else:
@@ -56,18 +85,36 @@ def flag_underbilled(threshold: float = 0.6) -> list[tuple[int, int, str, float,
     return flagged
 
 
+def flag_interactions(days: int = interactions.ACTIVE_DAYS) -> list[interactions.Finding]:
+    """
+    Re-check every prescription of the last `days` days for drug interactions
+    and species/breed contraindications.  Also prints a friendly summary.
+    """
+    findings = interactions.recheck_active(days, DB_PATH)
+    print(f"\n💊 Interaction Re-check (prescriptions of the last {days} days):")
+    if not findings:
+        print("✅ No interactions or contraindications found.")
+    else:
+        for f in sorted(findings, key=lambda f: interactions.SEVERITIES.index(f.severity), reverse=True):
+            print(f"Rx {f.prescription_id} | patient {f.patient_id} | {interactions.describe(f)}")
+    return findings
+
+
 # Optional CLI loop for backwards compatibility
 def run_ai_features() -> None:
     while True:
         print("\n--- AI Features ---")
         print("1. Predict Top Drugs (90d)")
         print("2. Flag Underbilled (<60%)")
+        print("3. Re-check Drug Interactions (active prescriptions)")
         print("0. Back")
         choice = input("Choose: ").strip()
         if choice == "1":
             predict_top_drugs()
         elif choice == "2":
             flag_underbilled()
+        elif choice == "3":
+            flag_interactions()
         elif choice == "0":
             break
         else:
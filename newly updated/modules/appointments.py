@@ -2,30 +2,22 @@
 from __future__ import annotations
 
 import os
-import sqlite3
+
+from db import dates
+from db.instrument import connect
+from db.transaction import Transaction, connection_for
+from db.migrations import ensure_schema
 
 DB_PATH = os.path.join(os.path.dirname(__file__), "..", "clinic.db")
 
 
 def ensure_table() -> None:
-    with sqlite3.connect(DB_PATH) as conn:
-        conn.execute("""
-        CREATE TABLE IF NOT EXISTS appointments (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            patient_id INTEGER NOT NULL,
-            doctor_id INTEGER NOT NULL,
-            date TEXT NOT NULL,      -- YYYY-MM-DD
-            time TEXT NOT NULL,      -- HH:MM
-            reason TEXT,
-            status TEXT DEFAULT 'Scheduled',
-            FOREIGN KEY(patient_id) REFERENCES patients(id),
-            FOREIGN KEY(doctor_id) REFERENCES doctors(id)
-        );
-        """)
+    """Kept for callers of the old API; the table is owned by db.migrations now."""
+    ensure_schema(DB_PATH)
 
 
 def list_appointments() -> list[tuple]:
-    with sqlite3.connect(DB_PATH) as conn:
+    with connect(DB_PATH) as conn:
         return conn.execute("""
             SELECT a.id, pt.name, d.name, a.date, a.time, a.reason, a.status
             FROM appointments a
@@ -35,32 +27,46 @@ def list_appointments() -> list[tuple]:
         """).fetchall()
 
 
+def appointments_between(start: str, end: str | None = None, doctor_id: int | None = None) -> list[tuple]:
+    """Appointments from `start` to `end` (inclusive; default just `start`) in day and time order."""
+    where, params = dates.day_range("a.date", start, end or start)
+    if doctor_id is not None:
+        where += " AND a.doctor_id = ?"
+        params.append(doctor_id)
+    with connect(DB_PATH) as conn:
+        return conn.execute(f"""
+            SELECT a.id, pt.name, d.name, a.date, a.time, a.reason, a.status
+            FROM appointments a
+            JOIN patients pt ON a.patient_id = pt.id
+            JOIN doctors d   ON a.doctor_id  = d.id
+            WHERE {where}
+            ORDER BY {dates.day_sql("a.date")}, {dates.minute_sql("a.time")}
+        """, params).fetchall()
+
+
 def add_appointment(patient_id: int, doctor_id: int, date_str: str, time_str: str,
-                    reason: str, status: str = "Scheduled") -> int:
-    with sqlite3.connect(DB_PATH) as conn:
+                    reason: str, status: str = "Scheduled", tx: Transaction | None = None) -> int:
+    with connection_for(DB_PATH, tx) as conn:
         cur = conn.execute("""
             INSERT INTO appointments (patient_id, doctor_id, date, time, reason, status)
             VALUES (?, ?, ?, ?, ?, ?)
         """, (patient_id, doctor_id, date_str, time_str, reason, status))
-        conn.commit()
         return cur.lastrowid
 
 
 def update_appointment(app_id: int, patient_id: int, doctor_id: int, date_str: str, time_str: str,
-                       reason: str, status: str) -> None:
-    with sqlite3.connect(DB_PATH) as conn:
+                       reason: str, status: str, tx: Transaction | None = None) -> None:
+    with connection_for(DB_PATH, tx) as conn:
         conn.execute("""
             UPDATE appointments
             SET patient_id=?, doctor_id=?, date=?, time=?, reason=?, status=?
             WHERE id=?
         """, (patient_id, doctor_id, date_str, time_str, reason, status, app_id))
-        conn.commit()
 
 
-def delete_appointment(app_id: int) -> None:
-    with sqlite3.connect(DB_PATH) as conn:
+def delete_appointment(app_id: int, tx: Transaction | None = None) -> None:
+    with connection_for(DB_PATH, tx) as conn:
         conn.execute("DELETE FROM appointments WHERE id=?", (app_id,))
-        conn.commit()
 
 
 def manage_appointments() -> None:
@@ -71,6 +77,7 @@ def manage_appointments() -> None:
         print("2. View")
         print("3. Edit")
         print("4. Delete")
+        print("5. By Date")
         print("0. Back")
         ch = input("Choose: ").strip()
         if ch == "1":
@@ -99,6 +106,11 @@ def manage_appointments() -> None:
             aid = int(input("Appointment ID: "))
             delete_appointment(aid)
             print("🗑️ Deleted.")
+        elif ch == "5":
+            start = input("From (YYYY-MM-DD): ").strip()
+            end = input("To (YYYY-MM-DD, blank = same day): ").strip() or None
+            for r in appointments_between(start, end):
+                print(r)
         elif ch == "0":
             break
         else:
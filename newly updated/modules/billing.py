@@ -2,14 +2,17 @@
 from __future__ import annotations
 
 import os
-import sqlite3
 from datetime import date
 
+from db import archive, migrations
+from db.instrument import connect
+from db.transaction import Transaction, connection_for
+
 DB_PATH = os.path.join(os.path.dirname(__file__), "..", "clinic.db")
 
 
 def list_bills() -> list[tuple]:
-    with sqlite3.connect(DB_PATH) as conn:
+    with connect(DB_PATH) as conn:
         return conn.execute("""
             SELECT b.id, b.prescription_id, pt.name AS patient, b.total_amount, b.paid_amount, b.billing_date
             FROM billing b
@@ -19,29 +22,106 @@ def list_bills() -> list[tuple]:
         """).fetchall()
 
 
+
+def list_owner_bills(owner_id: int) -> list[tuple]:
+    """Bills for all of an owner's pets: index seeks from owner to pets to prescriptions to bills."""
+    with connect(DB_PATH) as conn:
+        return conn.execute("""
+            SELECT b.id, b.prescription_id, pt.name AS patient, b.total_amount, b.paid_amount, b.billing_date
+            FROM patients pt
+            JOIN prescriptions p ON p.patient_id      = pt.id
+            JOIN billing b       ON b.prescription_id = p.id
+            WHERE pt.owner_id = ?
+            ORDER BY b.billing_date, b.id
+        """, (owner_id,)).fetchall()
+
+
 def generate_bill(prescription_id: int, total_amount: float, paid_amount: float,
-                  billing_date: str | None = None) -> int:
+                  billing_date: str | None = None, tx: Transaction | None = None) -> int:
     if billing_date is None:
         billing_date = date.today().isoformat()
-    with sqlite3.connect(DB_PATH) as conn:
+    with connection_for(DB_PATH, tx) as conn:
         cur = conn.execute("""
             INSERT INTO billing (prescription_id, total_amount, paid_amount, billing_date)
             VALUES (?, ?, ?, ?)
         """, (prescription_id, float(total_amount), float(paid_amount), billing_date))
-        conn.commit()
         return cur.lastrowid
 
 
-def update_bill_payment(bill_id: int, paid_amount: float) -> None:
-    with sqlite3.connect(DB_PATH) as conn:
+def update_bill_payment(bill_id: int, paid_amount: float, tx: Transaction | None = None) -> None:
+    with connection_for(DB_PATH, tx) as conn:
         conn.execute("UPDATE billing SET paid_amount=? WHERE id=?", (float(paid_amount), bill_id))
-        conn.commit()
 
 
-def delete_bill(bill_id: int) -> None:
-    with sqlite3.connect(DB_PATH) as conn:
+def delete_bill(bill_id: int, tx: Transaction | None = None) -> None:
+    with connection_for(DB_PATH, tx) as conn:
         conn.execute("DELETE FROM billing WHERE id=?", (bill_id,))
-        conn.commit()
+
+
+# -------------------- Revenue analytics --------------------
+
+REVENUE_GROUPINGS = ("day", "week", "month", "doctor", "species")
+
+# grouping -> (rollup table, label expression, period column)
+_REVENUE_SQL = {
+    "day": ("revenue_daily", "day", "day"),
+    "week": ("revenue_daily", "date(day, 'weekday 0', '-6 days')", "day"),   # week starting Monday
+    "month": ("revenue_daily", "substr(day, 1, 7)", "day"),
+    "doctor": ("revenue_monthly_doctor r LEFT JOIN doctors d ON d.id = r.doctor_id",
+               "printf('%s (#%d)', COALESCE(d.name, 'unknown'), r.doctor_id)", "month"),
+    "species": ("revenue_monthly_species", "COALESCE(NULLIF(species, ''), '(unknown)')", "month"),
+}
+
+
+def revenue_summary(by: str = "month", start: str | None = None, end: str | None = None,
+                    db_path: str | None = None) -> list[tuple[str, int, float, float, float]]:
+    """
+    Billed, collected and outstanding revenue grouped `by` day, week, month,
+    doctor or species:
+        (label, bills, billed, collected, outstanding)
+    `start`/`end` are inclusive YYYY-MM-DD dates; doctor and species rollups
+    are monthly, so there they select whole months.  Answered from the
+    rollup tables maintained by triggers on billing, not from billing itself.
+    """
+    if by not in _REVENUE_SQL:
+        raise ValueError(f"by must be one of {', '.join(REVENUE_GROUPINGS)}")
+    source, label, period = _REVENUE_SQL[by]
+    where, params = ["bills <> 0"], []
+    if start:
+        where.append(f"{period} >= ?")
+        params.append(start if period == "day" else start[:7])
+    if end:
+        where.append(f"{period} <= ?")
+        params.append(end if period == "day" else end[:7])
+    with connect(db_path or DB_PATH) as conn:
+        rows = conn.execute(f"""
+            SELECT {label} AS label, SUM(bills), ROUND(SUM(billed), 2), ROUND(SUM(collected), 2)
+            FROM {source}
+            WHERE {" AND ".join(where)}
+            GROUP BY label
+            ORDER BY {"label" if period == "day" else "SUM(billed) DESC"}
+        """, params).fetchall()
+    return [(lbl, n, billed, collected, round(billed - collected, 2)) for lbl, n, billed, collected in rows]
+
+
+def rebuild_revenue_rollups(db_path: str | None = None, tx: Transaction | None = None) -> None:
+    """Recompute the rollups from billing and its archives (after bulk repairs or re-attributing prescriptions)."""
+    db_path = db_path or DB_PATH
+    with connection_for(db_path, tx) as conn, archive.attached(conn, db_path=db_path) as aliases:
+        migrations.rebuild_revenue_rollups(conn, ("main", *aliases))
+
+
+def print_revenue_summary(by: str = "month", start: str | None = None, end: str | None = None) -> None:
+    rows = revenue_summary(by, start, end)
+    print(f"\n💹 Revenue by {by}" + (f" ({start or '…'} to {end or '…'})" if start or end else ""))
+    if not rows:
+        print("No bills in range.")
+        return
+    print(f"{by.title():<24}{'Bills':>8}{'Billed (₹)':>16}{'Collected (₹)':>16}{'Outstanding (₹)':>18}")
+    for label, n, billed, collected, outstanding in rows:
+        print(f"{label:<24}{n:>8}{billed:>16,.2f}{collected:>16,.2f}{outstanding:>18,.2f}")
+    tot = [sum(r[i] for r in rows) for i in (1, 2, 3, 4)]
+    print(f"{'Total':<24}{tot[0]:>8}{tot[1]:>16,.2f}{tot[2]:>16,.2f}{tot[3]:>18,.2f}")
 
 
 def manage_billing() -> None:
@@ -51,6 +131,7 @@ def manage_billing() -> None:
         print("2. View All Bills")
         print("3. Update Bill Payment")
         print("4. Delete Bill")
+        print("5. Revenue Summary")
         print("0. Back")
         ch = input("Choose: ").strip()
         if ch == "1":
@@ -71,6 +152,14 @@ def manage_billing() -> None:
             bid = int(input("Bill ID: "))
             delete_bill(bid)
             print("🗑️ Deleted.")
+        elif ch == "5":
+            by = input(f"Group by ({'/'.join(REVENUE_GROUPINGS)}) [month]: ").strip().lower() or "month"
+            start = input("From (YYYY-MM-DD, blank = all): ").strip() or None
+            end = input("To (YYYY-MM-DD, blank = all): ").strip() or None
+            try:
+                print_revenue_summary(by, start, end)
+            except ValueError as e:
+                print(f"❌ {e}")
         elif ch == "0":
             break
         else:
@@ -0,0 +1,219 @@
+# modules/dedupe.py
+"""
+Duplicate-patient detection and merging.
+
+Every patient gets a few blocking keys, stored in patient_blocks (migration
+8): one for the owner's normalised contact number, one phonetic key built
+from the pet's and the owner's names.  Candidates are compared only within a
+block, never pairwise across the table, and oversized blocks (common names
+without a contact match) are skipped rather than exploding into n^2 pairs.
+
+Triggers drop a patient's keys when it is edited or deleted; build_index()
+(re)creates keys for every patient that has none, so it is incremental.
+"""
+from __future__ import annotations
+
+import os
+import re
+import time
+from difflib import SequenceMatcher
+
+from db.instrument import connect
+from db.migrations import contact_norm
+from db.transaction import Transaction, connection_for
+
+DB_PATH = os.path.join(os.path.dirname(__file__), "..", "clinic.db")
+MAX_BLOCK = 100          # blocks larger than this are too unspecific to compare
+MIN_SCORE = 0.85
+BATCH_SIZE = 20_000
+
+_SOUNDEX = {c: d for d, letters in enumerate(("aeiouyhw", "bfpv", "cgjkqsxz", "dt", "l", "mn", "r")) for c in letters}
+
+
+# -------------------- Normalisation --------------------
+
+def normalize_contact(contact: str | None) -> str:
+    """The owners' contact key, so dedupe and owner linking agree: '+91 98765-43210' -> '9876543210'."""
+    return contact_norm(contact)
+
+
+def normalize_name(name: str | None) -> str:
+    return " ".join(re.sub(r"[^a-z ]", " ", (name or "").lower()).split())
+
+
+def soundex(word: str) -> str:
+    word = re.sub(r"[^a-z]", "", word.lower())
+    if not word:
+        return ""
+    out, last = word[0].upper(), _SOUNDEX.get(word[0])
+    for c in word[1:]:
+        d = _SOUNDEX.get(c)
+        if d and d != last:
+            out += str(d)
+        if c not in "hw":
+            last = d
+    return (out + "000")[:4]
+
+
+def blocking_keys(name: str | None, species: str | None, owner_name: str | None,
+                  owner_contact: str | None) -> list[str]:
+    keys = []
+    contact = normalize_contact(owner_contact)
+    if len(contact) >= 7:
+        keys.append(f"c:{contact}")
+    pet, owner = normalize_name(name), normalize_name(owner_name).split()
+    if pet and owner:
+        # Phonetic pet name + owner surname + owner initial: survives typos in either name.
+        keys.append(f"n:{soundex(pet)}:{soundex(owner[-1])}:{owner[0][0]}:{(species or '').lower()}")
+    return keys
+
+
+# -------------------- Index --------------------
+
+def build_index(rebuild: bool = False, db_path: str | None = None, tx: Transaction | None = None) -> int:
+    """
+    Create blocking keys for patients that have none; returns how many were
+    indexed.  Each batch of BATCH_SIZE patients is read and keyed in its own
+    write, so the clinic gets the lock between batches and a patient edited
+    meanwhile is never keyed from stale values.
+    """
+    db_path = db_path or DB_PATH
+    if rebuild:
+        with connection_for(db_path, tx) as conn:
+            conn.execute("DELETE FROM patient_blocks")
+    done = last = 0
+    while True:
+        with connection_for(db_path, tx) as conn:
+            rows = conn.execute("""
+                SELECT id, name, species, owner_name, owner_contact FROM patients p
+                WHERE id > ? AND NOT EXISTS (SELECT 1 FROM patient_blocks b WHERE b.patient_id = p.id)
+                ORDER BY id LIMIT ?""", (last, BATCH_SIZE)).fetchall()
+            conn.executemany("INSERT OR IGNORE INTO patient_blocks (key, patient_id) VALUES (?, ?)",
+                             [(key, pid) for pid, name, species, owner, contact in rows
+                              for key in blocking_keys(name, species, owner, contact)])
+        done += len(rows)
+        if len(rows) < BATCH_SIZE:
+            return done
+        last = rows[-1][0]
+
+
+# -------------------- Scoring --------------------
+
+WEIGHTS = {"name": 0.5, "owner": 0.2, "contact": 0.2, "species": 0.1}
+
+
+def _prepare(name, species, owner_name, owner_contact) -> tuple[str, str, str, str]:
+    return normalize_name(name), (species or "").lower(), normalize_name(owner_name), normalize_contact(owner_contact)
+
+
+def _similar(a: str, b: str) -> float:
+    if a == b:
+        return 1.0
+    if not a or not b:
+        return 0.0
+    return SequenceMatcher(None, a, b).ratio()
+
+
+def _digits_similar(a: str, b: str) -> float:
+    """Share of matching digit positions, if that looks like a typo (one or two wrong digits) at all."""
+    if a == b:
+        return 1.0 if a else 0.0
+    if not a or not b or len(a) != len(b):
+        return 0.0
+    same = sum(x == y for x, y in zip(a, b)) / len(a)
+    return same if same >= 0.8 else 0.0
+
+
+def _score(a: tuple, b: tuple, min_score: float = 0.0) -> float:
+    w = WEIGHTS
+    rest = (w["owner"] * _similar(a[2], b[2]) + w["contact"] * _digits_similar(a[3], b[3])
+            + w["species"] * (a[1] == b[1]))
+    # Cheap bound first: SequenceMatcher can't beat 2*min/(la+lb).
+    la, lb = len(a[0]), len(b[0])
+    if la + lb and rest + w["name"] * 2 * min(la, lb) / (la + lb) < min_score:
+        return 0.0
+    return round(w["name"] * _similar(a[0], b[0]) + rest, 4)
+
+
+def score(a: tuple, b: tuple) -> float:
+    """Similarity in [0, 1] of two (name, species, owner_name, owner_contact) records."""
+    return _score(_prepare(*a), _prepare(*b))
+
+
+def find_duplicates(min_score: float = MIN_SCORE, db_path: str | None = None) -> list[tuple[int, int, float]]:
+    """
+    Merge suggestions (keep_id, duplicate_id, score), best first.  The older
+    registration (lower id) is the one to keep.
+    """
+    build_index(db_path=db_path)
+    seen: set[tuple[int, int]] = set()
+    out = []
+    with connect(db_path or DB_PATH) as conn:
+        cur = conn.execute("""
+            WITH blocks AS (SELECT key FROM patient_blocks GROUP BY key HAVING COUNT(*) BETWEEN 2 AND ?)
+            SELECT b.key, p.id, p.name, p.species, p.owner_name, p.owner_contact
+            FROM blocks k
+            JOIN patient_blocks b ON b.key = k.key
+            JOIN patients p       ON p.id  = b.patient_id
+            ORDER BY b.key, p.id""", (MAX_BLOCK,))
+        block, members = None, []
+        for key, pid, *rec in [*cur, (None, None)]:
+            if key != block:
+                for i, (ida, ra) in enumerate(members):
+                    for idb, rb in members[i + 1:]:
+                        if (ida, idb) in seen:
+                            continue
+                        seen.add((ida, idb))
+                        s = _score(ra, rb, min_score)
+                        if s >= min_score:
+                            out.append((ida, idb, s))
+                block, members = key, []
+            if pid is not None:
+                members.append((pid, _prepare(*rec)))
+    out.sort(key=lambda r: (-r[2], r[0], r[1]))
+    return out
+
+
+# -------------------- Merge --------------------
+
+def merge_patients(keep_id: int, dup_id: int, db_path: str | None = None,
+                   tx: Transaction | None = None) -> dict[str, int]:
+    """
+    Move `dup_id`'s prescriptions and appointments to `keep_id`, fill keep's
+    empty fields from the duplicate, and delete it - all in one transaction.
+    """
+    if keep_id == dup_id:
+        raise ValueError("Cannot merge a patient into itself.")
+    with connection_for(db_path or DB_PATH, tx) as conn:
+        if conn.execute("SELECT COUNT(*) FROM patients WHERE id IN (?, ?)", (keep_id, dup_id)).fetchone()[0] != 2:
+            raise ValueError(f"Patients #{keep_id} and #{dup_id} must both exist.")
+        moved = {t: conn.execute(f"UPDATE {t} SET patient_id=? WHERE patient_id=?", (keep_id, dup_id)).rowcount
+                 for t in ("prescriptions", "appointments")}
+        conn.execute("""
+            UPDATE patients SET
+              species       = COALESCE(NULLIF(species, ''),       (SELECT species       FROM patients WHERE id = :dup)),
+              breed         = COALESCE(NULLIF(breed, ''),         (SELECT breed         FROM patients WHERE id = :dup)),
+              owner_name    = COALESCE(NULLIF(owner_name, ''),    (SELECT owner_name    FROM patients WHERE id = :dup)),
+              owner_contact = COALESCE(NULLIF(owner_contact, ''), (SELECT owner_contact FROM patients WHERE id = :dup))
+            WHERE id = :keep""", {"keep": keep_id, "dup": dup_id})
+        conn.execute("DELETE FROM patients WHERE id=?", (dup_id,))
+    return moved
+
+
+def review_duplicates() -> None:
+    t0 = time.perf_counter()
+    pairs = find_duplicates()
+    print(f"\n🔎 {len(pairs)} likely duplicate pair(s) found in {time.perf_counter() - t0:.1f}s")
+    if not pairs:
+        return
+    with connect(DB_PATH) as conn:
+        for keep, dup, s in pairs[:50]:
+            a, b = (conn.execute("SELECT name, species, owner_name, owner_contact FROM patients WHERE id=?", (i,)).fetchone()
+                    for i in (keep, dup))
+            print(f"#{keep} {a} ⇐ #{dup} {b}  score {s:.2f}")
+    ans = input("Merge a pair? Enter 'keep_id dup_id' (blank to skip): ").strip()
+    if ans:
+        keep, dup = (int(x) for x in ans.split())
+        moved = merge_patients(keep, dup)
+        print(f"✅ Merged #{dup} into #{keep} ({moved['prescriptions']} prescriptions, "
+              f"{moved['appointments']} appointments moved).")
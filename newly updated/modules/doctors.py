@@ -5,41 +5,42 @@ import os
 import sqlite3
 from typing import Iterable
 
+from db.instrument import connect
+from db.transaction import Transaction, connection_for
+
 DB_PATH = os.path.join(os.path.dirname(__file__), "..", "clinic.db")
 
 
 # -------- Function-based CRUD --------
 
 def list_doctors() -> list[tuple]:
-    with sqlite3.connect(DB_PATH) as conn:
+    with connect(DB_PATH) as conn:
         return conn.execute(
             "SELECT id, vcn, name, phone, email, graduated_year FROM doctors ORDER BY id"
         ).fetchall()
 
 
-def add_doctor(vcn: str, name: str, phone: str, email: str, graduated_year: int) -> int:
-    with sqlite3.connect(DB_PATH) as conn:
+def add_doctor(vcn: str, name: str, phone: str, email: str, graduated_year: int, tx: Transaction | None = None) -> int:
+    with connection_for(DB_PATH, tx) as conn:
         cur = conn.execute(
             "INSERT INTO doctors (vcn, name, phone, email, graduated_year) VALUES (?, ?, ?, ?, ?)",
             (vcn, name, phone, email, graduated_year),
         )
-        conn.commit()
         return cur.lastrowid
 
 
-def update_doctor(doc_id: int, vcn: str, name: str, phone: str, email: str, graduated_year: int) -> None:
-    with sqlite3.connect(DB_PATH) as conn:
+def update_doctor(doc_id: int, vcn: str, name: str, phone: str, email: str, graduated_year: int,
+                  tx: Transaction | None = None) -> None:
+    with connection_for(DB_PATH, tx) as conn:
         conn.execute(
             "UPDATE doctors SET vcn=?, name=?, phone=?, email=?, graduated_year=? WHERE id=?",
             (vcn, name, phone, email, graduated_year, doc_id),
         )
-        conn.commit()
 
 
-def delete_doctor(doc_id: int) -> None:
-    with sqlite3.connect(DB_PATH) as conn:
+def delete_doctor(doc_id: int, tx: Transaction | None = None) -> None:
+    with connection_for(DB_PATH, tx) as conn:
         conn.execute("DELETE FROM doctors WHERE id=?", (doc_id,))
-        conn.commit()
 
 
 # -------- Optional CLI loop --------
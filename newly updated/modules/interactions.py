@@ -0,0 +1,307 @@
+# modules/interactions.py
+"""
+Drug-interaction and contraindication checks for prescriptions.
+
+The knowledge base is data/drug_interactions.json.  Drug names are taken
+through `aliases` and may name a whole `classes` entry ("class:NSAID").  It
+is compiled once per file version into integer ids: every drug gets a
+bitset (a Python int) of the drugs it interacts with, and every species and
+(species, breed) a bitset of the drugs contraindicated for it.  Checking a
+new prescription then costs one indexed query for the patient's active
+prescriptions and one AND per active drug.
+
+A prescription is active for ACTIVE_DAYS days from its date.  Medications
+the knowledge base does not know are never flagged.
+
+recheck_active() re-checks every active prescription in one pass; with
+NumPy the bitsets become uint64 word arrays and each patient's drugs are
+OR-ed together with reduceat, without it the same pass runs on ints.
+"""
+from __future__ import annotations
+
+import json
+import os
+import re
+import threading
+from datetime import date, timedelta
+from typing import NamedTuple
+
+try:
+    import numpy as np
+except ImportError:  # recheck_active falls back to Python ints
+    np = None
+
+from db import dates, metrics
+from db.instrument import connect
+
+DB_PATH = os.path.join(os.path.dirname(__file__), "..", "clinic.db")
+DATA_PATH = os.path.join(os.path.dirname(__file__), "..", "data", "drug_interactions.json")
+ACTIVE_DAYS = 30
+SEVERITIES = ("minor", "moderate", "major")
+BLOCKING = "major"
+
+
+class Finding(NamedTuple):
+    patient_id: int
+    prescription_id: int | None     # None for a prescription not yet added
+    medication: str
+    kind: str                       # "interaction" or "contraindication"
+    conflict: str                   # the other medication, or the species / breed
+    conflict_id: int | None         # the other prescription, for interactions
+    severity: str
+    note: str
+
+
+class InteractionError(ValueError):
+    def __init__(self, findings: list[Finding]):
+        self.findings = findings
+        super().__init__("; ".join(describe(f) for f in findings if f.severity == BLOCKING))
+
+
+def normalize(name: str | None) -> str:
+    """Lower-case, single-spaced, without a trailing "(...)" such as a strength or batch."""
+    return " ".join(re.sub(r"\s*\(.*\)\s*$", "", name or "").split()).casefold()
+
+
+def describe(f: Finding) -> str:
+    return f"{f.medication} + {f.conflict} [{f.severity}]: {f.note}"
+
+
+# -------------------- Knowledge base --------------------
+
+class KnowledgeBase:
+    def __init__(self, data: dict):
+        self.aliases = aliases = {normalize(a): normalize(d) for a, d in data.get("aliases", {}).items()}
+        self.names: list[str] = []
+        self.ids: dict[str, int] = {}
+
+        def drug_id(name: str) -> int:
+            key = aliases.get(normalize(name), normalize(name))
+            if key not in self.ids:
+                self.ids[key] = len(self.names)
+                self.names.append(name)
+            return self.ids[key]
+
+        classes = {normalize(c): [drug_id(d) for d in drugs] for c, drugs in data.get("classes", {}).items()}
+
+        def expand(name: str) -> list[int]:
+            if name.startswith("class:"):
+                try:
+                    return classes[normalize(name[6:])]
+                except KeyError:
+                    raise ValueError(f"unknown drug class {name!r}") from None
+            return [drug_id(name)]
+
+        def rank(entry: dict) -> int:
+            if entry.get("severity") not in SEVERITIES:
+                raise ValueError(f"severity must be one of {SEVERITIES}: {entry!r}")
+            return SEVERITIES.index(entry["severity"])
+
+        self.pairs: dict[tuple[int, int], tuple[str, str]] = {}     # (low id, high id) -> (severity, note)
+        for entry in data.get("interactions", []):
+            a, b = entry["drugs"]
+            for x in expand(a):
+                for y in expand(b):
+                    if x != y:
+                        self._keep(self.pairs, (min(x, y), max(x, y)), rank(entry), entry.get("note", ""))
+
+        # key is a normalized species or (species, breed)
+        self.contra: dict[tuple[object, int], tuple[str, str]] = {}
+        for entry in data.get("contraindications", []):
+            drugs = [d for name in entry["drugs"] for d in expand(name)]
+            for species in entry["species"]:
+                keys = [(normalize(species), normalize(b)) for b in entry.get("breeds", [])] or [normalize(species)]
+                for key in keys:
+                    for d in drugs:
+                        self._keep(self.contra, (key, d), rank(entry), entry.get("note", ""))
+
+        self.bits = [0] * len(self.names)
+        for x, y in self.pairs:
+            self.bits[x] |= 1 << y
+            self.bits[y] |= 1 << x
+        self.contra_bits: dict[object, int] = {}
+        for key, d in self.contra:
+            self.contra_bits[key] = self.contra_bits.get(key, 0) | 1 << d
+
+    @staticmethod
+    def _keep(table: dict, key: tuple, level: int, note: str) -> None:
+        # The most severe entry wins where classes overlap.
+        if key not in table or SEVERITIES.index(table[key][0]) < level:
+            table[key] = (SEVERITIES[level], note)
+
+    def drug(self, medication: str | None) -> int | None:
+        key = normalize(medication)
+        return self.ids.get(self.aliases.get(key, key))
+
+    def contraindicated(self, species: str | None, breed: str | None, d: int) -> tuple[str, str, str] | None:
+        """(conflict, severity, note) if drug id `d` is contraindicated for this animal."""
+        s, b = normalize(species), normalize(breed)
+        for key, label in (((s, b), f"{species} ({breed})"), (s, species)):
+            if self.contra_bits.get(key, 0) >> d & 1:
+                return (label, *self.contra[(key, d)])
+        return None
+
+
+_lock = threading.Lock()
+_compiled: dict[str, tuple[float, KnowledgeBase]] = {}
+
+
+def knowledge_base(path: str | None = None) -> KnowledgeBase:
+    """The compiled knowledge base, recompiled only when the file changes."""
+    path = os.path.abspath(path or DATA_PATH)
+    mtime = os.stat(path).st_mtime
+    with _lock:
+        hit = _compiled.get(path)
+        if hit is None or hit[0] != mtime:
+            with open(path, encoding="utf-8") as f:
+                hit = _compiled[path] = (mtime, KnowledgeBase(json.load(f)))
+        return hit[1]
+
+
+# -------------------- Checks --------------------
+
+def _window(when: str | None) -> tuple[date, date]:
+    # [first day, last day], both inclusive, for dates.day_range
+    day = date.fromisoformat(when[:10]) if when else date.today()
+    return day - timedelta(days=ACTIVE_DAYS - 1), day
+
+
+def check_conn(conn, patient_id: int, medication: str, when: str | None = None,
+               kb: KnowledgeBase | None = None, exclude_id: int | None = None) -> list[Finding]:
+    """
+    Findings for giving `medication` to the patient on `when` (default today),
+    on an open connection.  Prescription `exclude_id`, the one being edited, is
+    not counted among the active ones.
+    """
+    kb = kb or knowledge_base()
+    d = kb.drug(medication)
+    if d is None:
+        return []
+    findings = []
+    animal = conn.execute("SELECT species, breed FROM patients WHERE id=?", (patient_id,)).fetchone()
+    if animal:
+        hit = kb.contraindicated(animal[0], animal[1], d)
+        if hit:
+            findings.append(Finding(patient_id, exclude_id, medication, "contraindication", hit[0], None, *hit[1:]))
+    # The same validated day range as recheck_active, so both agree on legacy dates.
+    where, params = dates.day_range("date", *_window(when))
+    for rx_id, other in conn.execute(f"""
+        SELECT id, medication FROM prescriptions
+        WHERE patient_id = ? AND {where} AND id IS NOT ? ORDER BY date, id
+    """, (patient_id, *params, exclude_id)):
+        o = kb.drug(other)
+        if o is not None and kb.bits[d] >> o & 1:
+            findings.append(Finding(patient_id, exclude_id, medication, "interaction", other, rx_id,
+                                    *kb.pairs[(min(d, o), max(d, o))]))
+    return findings
+
+
+def check(patient_id: int, medication: str, when: str | None = None, db_path: str | None = None) -> list[Finding]:
+    with connect(db_path or DB_PATH) as conn:
+        return check_conn(conn, patient_id, medication, when)
+
+
+def check_edit_conn(conn, prescription_id: int, medication: str, kb: KnowledgeBase | None = None) -> list[Finding]:
+    """
+    Findings for changing prescription `prescription_id` to `medication`, as of
+    its own date (today for a legacy date); none if the drug stays the same.
+    """
+    kb = kb or knowledge_base()
+    row = conn.execute("SELECT patient_id, date, medication FROM prescriptions WHERE id=?",
+                       (prescription_id,)).fetchone()
+    if row is None or kb.drug(row[2]) == kb.drug(medication):
+        return []
+    try:
+        dates.epoch_day(row[1])
+        when = row[1]
+    except (TypeError, ValueError):
+        when = None
+    return check_conn(conn, row[0], medication, when, kb, exclude_id=prescription_id)
+
+
+def check_edit(prescription_id: int, medication: str, db_path: str | None = None) -> list[Finding]:
+    with connect(db_path or DB_PATH) as conn:
+        return check_edit_conn(conn, prescription_id, medication)
+
+
+def recheck_active(days: int = ACTIVE_DAYS, db_path: str | None = None, as_of: str | None = None) -> list[Finding]:
+    """
+    Re-check every prescription dated in the last `days` days (up to `as_of`,
+    default today) against the patient's other prescriptions in that window
+    and the patient's species and breed.  Each interacting pair is reported
+    once, on the later prescription.
+    """
+    kb = knowledge_base()
+    end = date.fromisoformat(as_of) if as_of else date.today()
+    where, params = dates.day_range("p.date", end - timedelta(days=days - 1), end)
+    with metrics.timed_job("recheck_active"):
+        # Live data, not an analytics snapshot: a safety check must see today's prescriptions.
+        with connect(db_path or DB_PATH) as conn:
+            rows = conn.execute(f"""
+                SELECT p.id, p.patient_id, p.medication, pt.species, pt.breed
+                FROM prescriptions p JOIN patients pt ON pt.id = p.patient_id
+                WHERE {where} ORDER BY p.patient_id, p.id
+            """, params).fetchall()
+        return _recheck(kb, rows)
+
+
+def _recheck(kb: KnowledgeBase, rows: list[tuple]) -> list[Finding]:
+    known = {m: kb.drug(m) for m in {r[2] for r in rows}}    # a few distinct names, many rows
+    rows = [r for r in rows if known[r[2]] is not None]
+    drug = [known[r[2]] for r in rows]
+    flagged = _flag_numpy(kb, rows, drug) if np is not None and rows else _flag_python(kb, rows, drug)
+
+    findings, contra = [], {}
+    for i in flagged:
+        rx_id, patient_id, medication, species, breed = rows[i]
+        d = drug[i]
+        if (species, breed, d) not in contra:
+            contra[species, breed, d] = kb.contraindicated(species, breed, d)
+        hit = contra[species, breed, d]
+        if hit:
+            findings.append(Finding(patient_id, rx_id, medication, "contraindication", hit[0], None, *hit[1:]))
+        j = i - 1
+        while j >= 0 and rows[j][1] == patient_id:   # earlier prescriptions of the same patient
+            if kb.bits[d] >> drug[j] & 1:
+                findings.append(Finding(patient_id, rx_id, medication, "interaction", rows[j][2], rows[j][0],
+                                        *kb.pairs[(min(d, drug[j]), max(d, drug[j]))]))
+            j -= 1
+    return findings
+
+
+def _flag_python(kb: KnowledgeBase, rows: list[tuple], drug: list[int]) -> list[int]:
+    flagged, start = [], 0
+    while start < len(rows):
+        end, present = start, 0
+        while end < len(rows) and rows[end][1] == rows[start][1]:
+            present |= 1 << drug[end]
+            end += 1
+        species, breed = normalize(rows[start][3]), normalize(rows[start][4])
+        contra = kb.contra_bits.get(species, 0) | kb.contra_bits.get((species, breed), 0)
+        flagged += [i for i in range(start, end) if (kb.bits[drug[i]] & present) or contra >> drug[i] & 1]
+        start = end
+    return flagged
+
+
+def _words(bitsets: list[int], width: int) -> "np.ndarray":
+    mask = (1 << 64) - 1
+    return np.array([[(b >> (64 * w)) & mask for w in range(width)] for b in bitsets], dtype=np.uint64)
+
+
+def _flag_numpy(kb: KnowledgeBase, rows: list[tuple], drug: list[int]) -> list[int]:
+    width = max(1, (len(kb.names) + 63) // 64)
+    bits = _words(kb.bits, width)                        # drug -> interacting drugs
+    own = _words([1 << d for d in range(len(kb.names))], width)
+    keys: dict[tuple, int] = {}
+    animal = np.array([keys.setdefault((r[3], r[4]), len(keys)) for r in rows])
+    keys = [(normalize(s), normalize(b)) for s, b in keys]
+    contra = _words([kb.contra_bits.get(s, 0) | kb.contra_bits.get((s, b), 0) for s, b in keys], width)
+
+    d = np.array(drug)
+    patient = np.array([r[1] for r in rows])
+    starts = np.flatnonzero(np.r_[True, patient[1:] != patient[:-1]])
+    group = np.cumsum(np.r_[False, patient[1:] != patient[:-1]])
+    present = np.bitwise_or.reduceat(own[d], starts, axis=0)     # patient -> drugs in the window
+    interacts = (bits[d] & present[group]).any(axis=1)
+    contraindicated = (contra[animal] & own[d]).any(axis=1)
+    return np.flatnonzero(interacts | contraindicated).tolist()
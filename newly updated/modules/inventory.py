@@ -2,41 +2,55 @@
 from __future__ import annotations
 
 import os
-import sqlite3
+from datetime import date, timedelta
+
+from db import dates
+from db.instrument import connect
+from db.transaction import Transaction, connection_for
 
 DB_PATH = os.path.join(os.path.dirname(__file__), "..", "clinic.db")
 
 
 def list_items() -> list[tuple]:
-    with sqlite3.connect(DB_PATH) as conn:
+    with connect(DB_PATH) as conn:
         return conn.execute(
             "SELECT id, item_name, description, quantity, unit_price, expiry_date FROM inventory ORDER BY id"
         ).fetchall()
 
 
-def add_item(name: str, description: str, quantity: int, unit_price: float, expiry_date: str) -> int:
-    with sqlite3.connect(DB_PATH) as conn:
+def expiring_items(within_days: int = 30, today: str | None = None) -> list[tuple]:
+    """Items already expired or expiring within `within_days`, soonest first (undated items excluded)."""
+    horizon = (date.fromisoformat(today) if today else date.today()) + timedelta(days=within_days)
+    where, params = dates.day_range("expiry_date", None, horizon)
+    with connect(DB_PATH) as conn:
+        return conn.execute(f"""
+            SELECT id, item_name, description, quantity, unit_price, expiry_date FROM inventory
+            WHERE {where} ORDER BY {dates.day_sql("expiry_date")}, id
+        """, params).fetchall()
+
+
+def add_item(name: str, description: str, quantity: int, unit_price: float, expiry_date: str,
+             tx: Transaction | None = None) -> int:
+    with connection_for(DB_PATH, tx) as conn:
         cur = conn.execute(
             "INSERT INTO inventory (item_name, description, quantity, unit_price, expiry_date) VALUES (?, ?, ?, ?, ?)",
             (name, description, int(quantity), float(unit_price), expiry_date),
         )
-        conn.commit()
         return cur.lastrowid
 
 
-def update_item(item_id: int, name: str, description: str, quantity: int, unit_price: float, expiry_date: str) -> None:
-    with sqlite3.connect(DB_PATH) as conn:
+def update_item(item_id: int, name: str, description: str, quantity: int, unit_price: float, expiry_date: str,
+                tx: Transaction | None = None) -> None:
+    with connection_for(DB_PATH, tx) as conn:
         conn.execute(
             "UPDATE inventory SET item_name=?, description=?, quantity=?, unit_price=?, expiry_date=? WHERE id=?",
             (name, description, int(quantity), float(unit_price), expiry_date, item_id),
         )
-        conn.commit()
 
 
-def delete_item(item_id: int) -> None:
-    with sqlite3.connect(DB_PATH) as conn:
+def delete_item(item_id: int, tx: Transaction | None = None) -> None:
+    with connection_for(DB_PATH, tx) as conn:
         conn.execute("DELETE FROM inventory WHERE id=?", (item_id,))
-        conn.commit()
 
 
 def manage_inventory() -> None:
@@ -46,6 +60,7 @@ def manage_inventory() -> None:
         print("2. View")
         print("3. Edit")
         print("4. Delete")
+        print("5. Expiring Soon")
         print("0. Back")
         ch = input("Choose: ").strip()
         if ch == "1":
@@ -76,6 +91,13 @@ def manage_inventory() -> None:
             iid = int(input("Item ID: "))
             delete_item(iid)
             print("🗑️ Deleted.")
+        elif ch == "5":
+            days = input("Within how many days? (default 30): ").strip()
+            items = expiring_items(int(days) if days else 30)
+            if not items:
+                print("Nothing expiring.")
+            for iid, name, _, qty, _, exp in items:
+                print(f"{'⚠️ EXPIRED' if exp < date.today().isoformat() else '⏳'} #{iid} {name} x{qty} — {exp}")
         elif ch == "0":
             break
         else:
@@ -4,39 +4,185 @@ from __future__ import annotations
 import os
 import sqlite3
 
+from db import archive
+from db.instrument import connect
+from db.transaction import Transaction, connection_for
+from db.migrations import contact_norm_sql
+
 DB_PATH = os.path.join(os.path.dirname(__file__), "..", "clinic.db")
 
 
 def list_patients() -> list[tuple]:
-    with sqlite3.connect(DB_PATH) as conn:
+    with connect(DB_PATH) as conn:
         return conn.execute(
             "SELECT id, name, species, breed, owner_name, owner_contact FROM patients ORDER BY id"
         ).fetchall()
 
 
-def add_patient(name: str, species: str, breed: str, owner_name: str, owner_contact: str) -> int:
-    with sqlite3.connect(DB_PATH) as conn:
+def add_patient(name: str, species: str, breed: str, owner_name: str, owner_contact: str,
+                tx: Transaction | None = None) -> int:
+    with connection_for(DB_PATH, tx) as conn:
         cur = conn.execute(
             "INSERT INTO patients (name, species, breed, owner_name, owner_contact) VALUES (?, ?, ?, ?, ?)",
             (name, species, breed, owner_name, owner_contact),
         )
-        conn.commit()
         return cur.lastrowid
 
 
-def update_patient(pid: int, name: str, species: str, breed: str, owner_name: str, owner_contact: str) -> None:
-    with sqlite3.connect(DB_PATH) as conn:
+def update_patient(pid: int, name: str, species: str, breed: str, owner_name: str, owner_contact: str,
+                   tx: Transaction | None = None) -> None:
+    with connection_for(DB_PATH, tx) as conn:
         conn.execute(
             "UPDATE patients SET name=?, species=?, breed=?, owner_name=?, owner_contact=? WHERE id=?",
             (name, species, breed, owner_name, owner_contact, pid),
         )
-        conn.commit()
 
 
-def delete_patient(pid: int) -> None:
-    with sqlite3.connect(DB_PATH) as conn:
+def delete_patient(pid: int, tx: Transaction | None = None) -> None:
+    with connection_for(DB_PATH, tx) as conn:
         conn.execute("DELETE FROM patients WHERE id=?", (pid,))
-        conn.commit()
+
+
+
+# -------------------- Owners --------------------
+# An owner is keyed by the normalised phone number; the patient rows carry
+# owner_id, kept in step with their owner_name/owner_contact by triggers.
+
+def find_owner(contact: str) -> tuple | None:
+    """(id, name, contact) of the owner with this phone number in any format, or None."""
+    with connect(DB_PATH) as conn:
+        return conn.execute(
+            f"SELECT id, name, contact FROM owners WHERE contact_norm = {contact_norm_sql(':contact')}",
+            {"contact": contact},
+        ).fetchone()
+
+
+def list_owner_pets(owner_id: int) -> list[tuple]:
+    with connect(DB_PATH) as conn:
+        return conn.execute(
+            "SELECT id, name, species, breed, owner_name, owner_contact FROM patients WHERE owner_id=? ORDER BY id",
+            (owner_id,),
+        ).fetchall()
+
+
+def update_owner(owner_id: int, name: str, contact: str, tx: Transaction | None = None) -> int:
+    """Rename / re-number an owner and all their pets in one transaction; returns the number of pets."""
+    with connection_for(DB_PATH, tx) as conn:
+        try:
+            conn.execute(
+                f"UPDATE owners SET name=:name, contact=:contact, contact_norm={contact_norm_sql(':contact')} WHERE id=:id",
+                {"name": name, "contact": contact, "id": owner_id},
+            )
+        except sqlite3.IntegrityError:
+            raise ValueError(f"Contact {contact!r} already belongs to another owner.") from None
+        n = conn.execute(
+            "UPDATE patients SET owner_name=?, owner_contact=? WHERE owner_id=?", (name, contact, owner_id)
+        ).rowcount
+        return n
+
+
+# Within one day, newest-first order shows the bill, then the prescription, then the visit.
+TIMELINE_KINDS = {"appointment": 1, "prescription": 2, "bill": 3}
+
+_TIMELINE_ARMS = {
+    "appointment": """
+        SELECT a.date AS day, 'appointment' AS kind, a.id AS id, a.time, d.name AS doctor,
+               COALESCE(a.reason, '') || ' [' || a.status || ']' AS summary, NULL AS total, NULL AS paid
+        FROM appointments a LEFT JOIN doctors d ON d.id = a.doctor_id
+        WHERE a.patient_id = :pid {cond}
+        ORDER BY a.date DESC, a.id DESC LIMIT :limit""",
+    "prescription": """
+        SELECT p.date, 'prescription', p.id, NULL, d.name,
+               COALESCE(p.medication, '') || ' — ' || COALESCE(p.diagnosis, ''), NULL, NULL
+        FROM {s}.prescriptions p LEFT JOIN main.doctors d ON d.id = p.doctor_id
+        WHERE p.patient_id = :pid {cond}
+        ORDER BY p.date DESC, p.id DESC LIMIT :limit""",
+    "bill": """
+        SELECT b.billing_date, 'bill', b.id, NULL, NULL,
+               'Rx #' || b.prescription_id, b.total_amount, b.paid_amount
+        FROM {s}.prescriptions p JOIN {s}.billing b ON b.prescription_id = p.id
+        WHERE p.patient_id = :pid {cond}
+        ORDER BY b.billing_date DESC, b.id DESC LIMIT :limit""",
+}
+_TIMELINE_COLS = {"appointment": ("a.date", "a.id"), "prescription": ("p.date", "p.id"),
+                  "bill": ("b.billing_date", "b.id")}
+
+
+def patient_timeline(patient_id: int, before: str | tuple | None = None, limit: int = 50,
+                     db_path: str | None = None) -> list[tuple]:
+    """
+    A patient's prescriptions, bills and appointments, newest first:
+        (date, kind, id, time, doctor, summary, total_amount, paid_amount)
+    One query: each arm is a LIMITed range scan on a covering (patient, date)
+    index, and SQLite merges the three.  Archived prescriptions and bills are
+    included: the newest archive.MAX_ATTACH yearly archives are attached and
+    each gets its own prescription and bill arms.  For the next page pass the
+    last row (or its first three fields) as `before`; a plain 'YYYY-MM-DD'
+    returns entries strictly older than that day.
+    """
+    params: dict = {"pid": patient_id, "limit": limit}
+    arms = []
+    for kind, sql in _TIMELINE_ARMS.items():
+        cond = ""
+        if before is not None:
+            date_col, id_col = _TIMELINE_COLS[kind]
+            if isinstance(before, str):
+                cond = f"AND {date_col} < :bdate"
+                params["bdate"] = before
+            else:
+                bdate, bkind, bid = before[:3]
+                params["bdate"], params["bid"] = bdate, bid
+                # Order key is (date, kind rank, id) descending; the rank is constant per arm.
+                rank, brank = TIMELINE_KINDS[kind], TIMELINE_KINDS[bkind]
+                cond = (f"AND {date_col} <= :bdate" if rank < brank else
+                        f"AND ({date_col}, {id_col}) < (:bdate, :bid)" if rank == brank else
+                        f"AND {date_col} < :bdate")
+        arms.append((kind, sql.replace("{cond}", cond)))
+    db_path = db_path or DB_PATH
+    years = list(archive.list_archives(db_path))[-archive.MAX_ATTACH:]
+    with connect(db_path, uri=True) as conn, archive.attached(conn, years, db_path) as aliases:
+        # Bills are archived with their prescription, so each schema's bills join its own prescriptions.
+        schemas = ["main", *aliases]
+        union = " UNION ALL ".join(f"SELECT * FROM ({sql.replace('{s}', s)})"
+                                   for kind, sql in arms for s in (schemas if kind != "appointment" else ["main"]))
+        rank = " ".join(f"WHEN '{k}' THEN {r}" for k, r in TIMELINE_KINDS.items())
+        return conn.execute(f"""SELECT * FROM ({union})
+                                ORDER BY day DESC, CASE kind {rank} END DESC, id DESC LIMIT :limit""",
+                            params).fetchall()
+
+
+def print_patient_timeline(patient_id: int, page_size: int = 20) -> None:
+    before = None
+    while True:
+        rows = patient_timeline(patient_id, before, page_size)
+        if not rows:
+            print("No (more) history.")
+            return
+        for day, kind, ref, time_, doctor, summary, total, paid in rows:
+            extra = f" ₹{paid:.2f} / ₹{total:.2f}" if kind == "bill" else f" · {doctor}" if doctor else ""
+            print(f"{day} {time_ or '':>5}  {kind:<12} #{ref:<7} {summary}{extra}")
+        if len(rows) < page_size or input("More? (y/N): ").strip().lower() != "y":
+            return
+        before = rows[-1]
+
+
+def manage_owner(contact: str) -> None:
+    from modules import billing
+
+    owner = find_owner(contact)
+    if not owner:
+        print("Not found.")
+        return
+    owner_id, name, phone = owner
+    print(f"\n👤 {name} ({phone})")
+    for p in list_owner_pets(owner_id):
+        print(p)
+    bills = billing.list_owner_bills(owner_id)
+    due = sum(total - paid for _, _, _, total, paid, _ in bills)
+    print(f"{len(bills)} bill(s), ₹{due:.2f} outstanding")
+    if input("Edit owner? (y/N): ").strip().lower() == "y":
+        n = update_owner(owner_id, input(f"Name ({name}): ") or name, input(f"Contact ({phone}): ") or phone)
+        print(f"✅ Updated owner and {n} pet(s).")
 
 
 def manage_patients() -> None:
@@ -46,6 +192,9 @@ def manage_patients() -> None:
         print("2. View")
         print("3. Edit")
         print("4. Delete")
+        print("5. History")
+        print("6. Find Duplicates")
+        print("7. Owner")
         print("0. Back")
         ch = input("Choose: ").strip()
         if ch == "1":
@@ -76,6 +225,13 @@ def manage_patients() -> None:
             pid = int(input("Patient ID: "))
             delete_patient(pid)
             print("🗑️ Deleted.")
+        elif ch == "5":
+            print_patient_timeline(int(input("Patient ID: ")))
+        elif ch == "6":
+            from modules import dedupe
+            dedupe.review_duplicates()
+        elif ch == "7":
+            manage_owner(input("Owner Contact: "))
         elif ch == "0":
             break
         else:
@@ -2,14 +2,18 @@
 from __future__ import annotations
 
 import os
-import sqlite3
 from datetime import date
 
+from db import refcache
+from db.instrument import connect
+from db.transaction import Transaction, connection_for
+from modules import interactions
+
 DB_PATH = os.path.join(os.path.dirname(__file__), "..", "clinic.db")
 
 
 def list_prescriptions() -> list[tuple]:
-    with sqlite3.connect(DB_PATH) as conn:
+    with connect(DB_PATH) as conn:
         return conn.execute("""
             SELECT p.id, pt.name AS patient, d.name AS doctor, p.date, p.diagnosis, p.medication, p.dosage, p.instructions
             FROM prescriptions p
@@ -20,30 +24,39 @@ def list_prescriptions() -> list[tuple]:
 
 
 def add_prescription(patient_id: int, doctor_id: int, diagnosis: str, medication: str,
-                     dosage: str, instructions: str, when: str | None = None) -> int:
+                     dosage: str, instructions: str, when: str | None = None, tx: Transaction | None = None,
+                     allow_interactions: bool = False) -> int:
+    """Raises interactions.InteractionError on a major interaction or contraindication unless allowed."""
     if when is None:
         when = date.today().isoformat()
-    with sqlite3.connect(DB_PATH) as conn:
+    with connection_for(DB_PATH, tx) as conn:
+        if not allow_interactions:
+            findings = interactions.check_conn(conn, patient_id, medication, when)
+            if any(f.severity == interactions.BLOCKING for f in findings):
+                raise interactions.InteractionError(findings)
         cur = conn.execute("""
             INSERT INTO prescriptions (patient_id, doctor_id, date, diagnosis, medication, dosage, instructions)
             VALUES (?, ?, ?, ?, ?, ?, ?)
         """, (patient_id, doctor_id, when, diagnosis, medication, dosage, instructions))
-        conn.commit()
         return cur.lastrowid
 
 
-def update_prescription(presc_id: int, diagnosis: str, medication: str, dosage: str, instructions: str) -> None:
-    with sqlite3.connect(DB_PATH) as conn:
+def update_prescription(presc_id: int, diagnosis: str, medication: str, dosage: str, instructions: str,
+                        tx: Transaction | None = None, allow_interactions: bool = False) -> None:
+    """Raises interactions.InteractionError if a changed medication interacts or is contraindicated, unless allowed."""
+    with connection_for(DB_PATH, tx) as conn:
+        if not allow_interactions:
+            findings = interactions.check_edit_conn(conn, presc_id, medication)
+            if any(f.severity == interactions.BLOCKING for f in findings):
+                raise interactions.InteractionError(findings)
         conn.execute("""
             UPDATE prescriptions SET diagnosis=?, medication=?, dosage=?, instructions=? WHERE id=?
         """, (diagnosis, medication, dosage, instructions, presc_id))
-        conn.commit()
 
 
-def delete_prescription(presc_id: int) -> None:
-    with sqlite3.connect(DB_PATH) as conn:
+def delete_prescription(presc_id: int, tx: Transaction | None = None) -> None:
+    with connection_for(DB_PATH, tx) as conn:
         conn.execute("DELETE FROM prescriptions WHERE id=?", (presc_id,))
-        conn.commit()
 
 
 def manage_prescriptions() -> None:
@@ -56,25 +69,29 @@ def manage_prescriptions() -> None:
         print("0. Back")
         ch = input("Choose: ").strip()
         if ch == "1":
-            with sqlite3.connect(DB_PATH) as conn:
-                print("\nPatients:")
-                for r in conn.execute("SELECT id,name FROM patients ORDER BY name"): print(r)
-                pid = int(input("Patient ID: "))
-                print("\nDoctors:")
-                for r in conn.execute("SELECT id,name FROM doctors ORDER BY name"): print(r)
-                did = int(input("Doctor ID: "))
+            print("\nPatients:")
+            for r in refcache.patients_by_name(DB_PATH): print(r)
+            pid = int(input("Patient ID: "))
+            print("\nDoctors:")
+            for r in refcache.doctors_by_name(DB_PATH): print(r)
+            did = int(input("Doctor ID: "))
             diag = input("Diagnosis: ")
             med = input("Medication: ")
             dose = input("Dosage: ")
             inst = input("Instructions: ")
-            add_prescription(pid, did, diag, med, dose, inst)
+            findings = interactions.check(pid, med, db_path=DB_PATH)
+            for f in findings:
+                print(f"⚠️ {interactions.describe(f)}")
+            if findings and input("Prescribe anyway? (y/N): ").strip().lower() != "y":
+                print("❌ Not added."); continue
+            add_prescription(pid, did, diag, med, dose, inst, allow_interactions=True)
             print("✅ Added.")
         elif ch == "2":
             for r in list_prescriptions():
                 print(r)
         elif ch == "3":
             rid = int(input("Prescription ID: "))
-            with sqlite3.connect(DB_PATH) as conn:
+            with connect(DB_PATH) as conn:
                 cur = conn.execute("SELECT * FROM prescriptions WHERE id=?", (rid,)).fetchone()
             if not cur:
                 print("Not found."); continue
@@ -82,7 +99,12 @@ def manage_prescriptions() -> None:
             medication = input(f"Medication ({cur[5]}): ") or cur[5]
             dosage = input(f"Dosage ({cur[6]}): ") or cur[6]
             instructions = input(f"Instructions ({cur[7]}): ") or cur[7]
-            update_prescription(rid, diagnosis, medication, dosage, instructions)
+            findings = interactions.check_edit(rid, medication, db_path=DB_PATH)
+            for f in findings:
+                print(f"⚠️ {interactions.describe(f)}")
+            if findings and input("Prescribe anyway? (y/N): ").strip().lower() != "y":
+                print("❌ Not updated."); continue
+            update_prescription(rid, diagnosis, medication, dosage, instructions, allow_interactions=True)
             print("✅ Updated.")
         elif ch == "4":
             rid = int(input("Prescription ID: "))
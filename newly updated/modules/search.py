@@ -0,0 +1,111 @@
+# modules/search.py
+"""
+Typo-tolerant name lookup for patients, doctors and medications.
+
+The trigrams table (migration 9) holds the trigrams of every distinct name
+and is kept current by triggers.  A lookup reads only the posting lists of
+the query's trigrams, ranks names by trigram similarity
+(shared / (query + name - shared)), and then fetches the rows carrying the
+best names through the ordinary name index - no table is scanned.
+
+prefix_lookup() serves autocomplete: names starting with the typed text,
+case-insensitively, read as a range of the NOCASE name index (migration 15),
+so each keystroke costs the same however large the table.
+"""
+from __future__ import annotations
+
+import math
+import os
+import string
+
+from db.instrument import connect
+from db.migrations import TRIGRAM_MAX_LEN, TRIGRAM_SOURCES
+
+DB_PATH = os.path.join(os.path.dirname(__file__), "..", "clinic.db")
+MIN_SIMILARITY = 0.3
+
+# SQLite's lower() only folds ASCII; match it so query and index agree.
+_ASCII_LOWER = str.maketrans(string.ascii_uppercase, string.ascii_lowercase)
+
+LABELS = {
+    "patient": "t.name || IFNULL(' (' || NULLIF(t.owner_name, '') || ')', '')",
+    "doctor": "t.name",
+    "medication": "t.item_name",
+}
+
+
+def trigrams(text: str) -> set[str]:
+    """The trigrams the index stores for `text` ('  name ' padding, ASCII-lowercased)."""
+    padded = "  " + text.translate(_ASCII_LOWER) + " "
+    return {padded[i:i + 3] for i in range(min(len(text) + 1, TRIGRAM_MAX_LEN))}
+
+
+def fuzzy_lookup(entity: str, text: str, limit: int = 10,
+                 min_similarity: float = MIN_SIMILARITY, db_path: str | None = None) -> list[tuple[int, str, float]]:
+    """(id, label, similarity) of the `limit` names most similar to `text`, best first."""
+    if entity not in TRIGRAM_SOURCES:
+        raise ValueError(f"Unknown entity {entity!r}; expected one of {', '.join(TRIGRAM_SOURCES)}.")
+    text = text.strip()
+    if not text:
+        return []
+    kind, table, column = TRIGRAM_SOURCES[entity]
+    grams = sorted(trigrams(text))
+    # similarity <= shared / len(grams), so weaker names are cut before the join.
+    need = max(1, math.ceil(min_similarity * len(grams) - 1e-9))
+    out = []
+    with connect(db_path or DB_PATH) as conn:
+        terms = conn.execute(f"""
+            SELECT st.term,
+                   g.shared * 1.0 / ({len(grams)} + MIN(length(st.term) + 1, {TRIGRAM_MAX_LEN}) - g.shared) AS sim
+            FROM (SELECT term_id, COUNT(*) AS shared FROM trigrams
+                  WHERE kind = ? AND gram IN ({','.join('?' * len(grams))})
+                  GROUP BY term_id HAVING COUNT(*) >= ?) g
+            JOIN search_terms st ON st.id = g.term_id
+            WHERE sim >= ?
+            ORDER BY sim DESC, st.term
+            LIMIT ?""", (kind, *grams, need, min_similarity, limit)).fetchall()
+        for term, sim in terms:
+            rows = conn.execute(f"SELECT t.id, {LABELS[entity]} FROM {table} t WHERE t.{column} = ? ORDER BY t.id LIMIT ?",
+                                (term, limit - len(out))).fetchall()
+            out += [(i, label, round(sim, 4)) for i, label in rows]
+            if len(out) >= limit:
+                break
+    return out
+
+
+# Sorts after any character that can follow a prefix, so [text, text + _TOP) is "starts with text".
+_TOP = "\U0010ffff"
+
+
+def prefix_lookup(entity: str, text: str, limit: int = 10, db_path: str | None = None) -> list[tuple[int, str]]:
+    """
+    (id, label) of up to `limit` rows whose name starts with `text`, ignoring
+    ASCII case, in name order; all digits also matches that id.  Entities are
+    those of fuzzy_lookup plus "prescription" (by patient name).
+    """
+    text = text.strip()
+    with connect(db_path or DB_PATH) as conn:
+        if entity == "prescription":
+            label = "pt.name || ' - ' || p.medication || ' (' || p.date || ')'"
+            out = conn.execute(f"SELECT p.id, {label} FROM prescriptions p JOIN patients pt ON pt.id = p.patient_id "
+                               f"WHERE p.id = ?", (int(text),)).fetchall() if text.isdigit() else []
+            # Walks the NOCASE name index and each pet's (patient_id, date) index in order,
+            # so LIMIT stops the scan: no sort, whatever the prefix (see TestPrefixLookup).
+            out += conn.execute(f"""
+                SELECT p.id, {label} FROM patients pt
+                JOIN prescriptions p ON p.patient_id = pt.id
+                WHERE pt.name >= ? COLLATE NOCASE AND pt.name < ? COLLATE NOCASE
+                ORDER BY pt.name COLLATE NOCASE, pt.id, p.date DESC
+                LIMIT ?""", (text, text + _TOP, limit)).fetchall()
+            return list(dict(out).items())[:limit]
+        if entity not in TRIGRAM_SOURCES:
+            raise ValueError(f"Unknown entity {entity!r}; expected prescription or one of {', '.join(TRIGRAM_SOURCES)}.")
+        _, table, column = TRIGRAM_SOURCES[entity]
+        out = conn.execute(f"SELECT t.id, {LABELS[entity]} FROM {table} t WHERE t.id = ?",
+                           (int(text),)).fetchall() if text.isdigit() else []
+        out += conn.execute(f"""
+            SELECT t.id, {LABELS[entity]} FROM {table} t
+            WHERE t.{column} >= ? COLLATE NOCASE AND t.{column} < ? COLLATE NOCASE
+            ORDER BY t.{column} COLLATE NOCASE
+            LIMIT ?""", (text, text + _TOP, limit)).fetchall()
+    return list(dict(out).items())[:limit]
@@ -0,0 +1,317 @@
+# seed/insert_dummy_data.py
+"""
+Deterministic synthetic data generator.
+
+Every block of RNG_BLOCK rows is generated from its own RNG derived from
+(seed, table, first id of the block), and chunks are whole blocks, so the same
+seed produces the same database whatever the chunk size and however many
+worker processes are used.  Workers only generate tuples; the parent process
+owns the single SQLite connection and loads each chunk with executemany.
+
+    python -m seed.insert_dummy_data --scale 1m --seed 7 --workers 4
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, timedelta
+from typing import Iterator
+
+DB_PATH = os.path.join(os.path.dirname(__file__), "..", "clinic.db")
+
+# Row counts per table. Bills are generated per prescription (BILL_RATE).
+SCALES: dict[str, dict[str, int]] = {
+    "small": dict(doctors=12, patients=200, inventory=60, prescriptions=1_000, appointments=400),
+    "10k":   dict(doctors=40, patients=2_000, inventory=200, prescriptions=5_000, appointments=2_000),
+    "100k":  dict(doctors=150, patients=20_000, inventory=500, prescriptions=50_000, appointments=20_000),
+    "1m":    dict(doctors=600, patients=200_000, inventory=1_000, prescriptions=500_000, appointments=200_000),
+    "5m":    dict(doctors=2_000, patients=1_000_000, inventory=2_000, prescriptions=2_500_000, appointments=1_000_000),
+}
+
+YEARS_OF_HISTORY = 3
+RNG_BLOCK = 100            # rows per RNG; chunk sizes are rounded up to a multiple
+BILL_RATE = 0.85
+DUPLICATE_RATE = 0.02      # returning animals re-registered with a typo
+
+# -------------------- Reference data --------------------
+SPECIES = [  # (species, weight, breeds)
+    ("Dog", 48, ["Labrador", "German Shepherd", "Beagle", "Pug", "Golden Retriever", "Indie", "Rottweiler"]),
+    ("Cat", 34, ["Persian", "Siamese", "Maine Coon", "Domestic Shorthair", "Bengal"]),
+    ("Rabbit", 5, ["Holland Lop", "Dutch", "Lionhead"]),
+    ("Bird", 5, ["Budgerigar", "Cockatiel", "African Grey", "Lovebird"]),
+    ("Cow", 4, ["Gir", "Sahiwal", "Holstein"]),
+    ("Goat", 3, ["Boer", "Jamunapari", "Sirohi"]),
+    ("Horse", 1, ["Marwari", "Thoroughbred"]),
+]
+SPECIES_WEIGHTS = [w for _, w, _ in SPECIES]
+
+PET_NAMES = ["Buddy", "Max", "Bella", "Luna", "Charlie", "Coco", "Rocky", "Milo", "Daisy", "Simba",
+             "Bruno", "Tiger", "Lucy", "Oreo", "Shadow", "Ginger", "Leo", "Molly", "Sheru", "Kitty",
+             "Tommy", "Jimmy", "Pepper", "Snowy", "Chikku", "Zara", "Rani", "Moti", "Raja", "Lily"]
+FIRST_NAMES = ["Arun", "Priya", "Rahul", "Anita", "Vikram", "Sneha", "Karthik", "Divya", "Suresh", "Meena",
+               "John", "Mary", "David", "Sarah", "Ravi", "Lakshmi", "Ajay", "Pooja", "Hari", "Kavya"]
+LAST_NAMES = ["Kumar", "Sharma", "Iyer", "Reddy", "Nair", "Patel", "Singh", "Das", "Menon", "Rao",
+              "Smith", "Fernandes", "Pillai", "Gupta", "Joshi", "Verma", "Bose", "Shah", "Naidu", "Khan"]
+
+# (medication, relative usage, diagnoses, unit price range)
+MEDICATIONS = [
+    ("Amoxicillin", 30, ["Infection", "Wound infection", "UTI"], (8, 25)),
+    ("Meloxicam", 22, ["Arthritis", "Post-op pain", "Lameness"], (12, 40)),
+    ("Ivermectin", 18, ["Mange", "Worms", "Ear mites"], (5, 18)),
+    ("Doxycycline", 12, ["Tick fever", "Respiratory infection"], (10, 30)),
+    ("Metronidazole", 10, ["Diarrhoea", "Giardia"], (6, 20)),
+    ("Prednisolone", 8, ["Allergy", "Dermatitis"], (4, 15)),
+    ("Cephalexin", 7, ["Pyoderma", "Infection"], (9, 28)),
+    ("Furosemide", 4, ["Heart failure", "Oedema"], (7, 22)),
+    ("Tramadol", 4, ["Post-op pain", "Injury"], (10, 35)),
+    ("Enrofloxacin", 4, ["Respiratory infection", "UTI"], (15, 45)),
+    ("Fenbendazole", 6, ["Worms", "Deworming"], (5, 14)),
+    ("Rabies Vaccine", 9, ["Vaccination"], (150, 400)),
+]
+MED_WEIGHTS = [w for _, w, _, _ in MEDICATIONS]
+DOSAGES = ["5mg", "10mg", "25mg", "50mg", "100mg", "250mg", "1ml", "2ml", "1 tablet", "1/2 tablet"]
+INSTRUCTIONS = ["Once daily", "Twice daily", "Every 8 hours", "After food", "For 5 days", "For 7 days", "Single dose"]
+REASONS = ["Vaccination", "Check-up", "Follow-up", "Skin issue", "Limping", "Vomiting", "Dental", "Surgery review"]
+
+# Visits peak in the monsoon / tick season and dip in winter (index 0 = January).
+MONTH_WEIGHTS = [6, 6, 8, 9, 10, 11, 12, 12, 10, 8, 7, 6]
+
+
+# -------------------- Chunk generators (run in workers) --------------------
+
+def _rng(seed: int, table: str, start: int) -> random.Random:
+    return random.Random(f"{seed}:{table}:{start}")
+
+
+def _blocks(seed: int, table: str, start: int, n: int) -> Iterator[tuple[random.Random, range]]:
+    """(rng, ids) per RNG block of a chunk; chunks always start on a block boundary."""
+    for lo in range(start, start + n, RNG_BLOCK):
+        yield _rng(seed, table, lo), range(lo, min(lo + RNG_BLOCK, start + n))
+
+
+def _owner(idx: int) -> tuple[str, str]:
+    """Owner name/contact derived arithmetically so pets can share owners cheaply."""
+    first = FIRST_NAMES[(idx * 7919) % len(FIRST_NAMES)]
+    last = LAST_NAMES[(idx * 104_729 // len(FIRST_NAMES)) % len(LAST_NAMES)]
+    return f"{first} {last}", str(9_000_000_000 + (idx * 2_654_435_761) % 1_000_000_000)
+
+
+def _seasonal_day(rng: random.Random, end: date, years: int) -> date:
+    while True:
+        year = end.year - rng.randrange(years)
+        month = rng.choices(range(1, 13), MONTH_WEIGHTS)[0]
+        d = date(year, month, 1) + timedelta(days=rng.randrange(28))
+        if d <= end:
+            return d
+
+
+def _typo(rng: random.Random, s: str) -> str:
+    if len(s) < 3:
+        return s
+    i = rng.randrange(1, len(s) - 1)
+    return s[:i] + s[i + 1:] if rng.random() < 0.5 else s[:i] + s[i] + s[i:]
+
+
+def _gen_doctors(seed: int, start: int, n: int, plan: dict) -> list[tuple]:
+    rows = []
+    for rng, ids in _blocks(seed, "doctors", start, n):
+        for i in ids:
+            name = f"Dr. {rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+            handle = name[4:].lower().replace(" ", ".")
+            rows.append((i, f"VCN{100000 + i}", name, str(9_800_000_000 + rng.randrange(10**8)),
+                         f"{handle}{i}@vetclinic.in", rng.randint(1985, 2022)))
+    return rows
+
+
+def _gen_patients(seed: int, start: int, n: int, plan: dict) -> list[tuple]:
+    owners = max(1, int(plan["patients"] * 0.7))
+    rows = []
+    for rng, ids in _blocks(seed, "patients", start, n):
+        block = len(rows)
+        for i in ids:
+            owner_name, contact = _owner(rng.randrange(owners))
+            species, _, breeds = rng.choices(SPECIES, SPECIES_WEIGHTS)[0]
+            name = rng.choice(PET_NAMES)
+            if len(rows) > block and rng.random() < DUPLICATE_RATE:
+                # Duplicates come from the same block, so they do not depend on the chunk layout.
+                _, name, species, breed, owner_name, contact = rows[rng.randrange(block, len(rows))]
+                name = _typo(rng, name)
+                rows.append((i, name, species, breed, owner_name, contact))
+                continue
+            rows.append((i, name, species, rng.choice(breeds), owner_name, contact))
+    return rows
+
+
+def _gen_inventory(seed: int, start: int, n: int, plan: dict) -> list[tuple]:
+    end = plan["end"]
+    rows = []
+    for rng, ids in _blocks(seed, "inventory", start, n):
+        for i in ids:
+            med, _, diags, (lo, hi) = MEDICATIONS[(i - 1) % len(MEDICATIONS)]
+            batch = (i - 1) // len(MEDICATIONS)
+            name = med if batch == 0 else f"{med} (batch {batch + 1})"
+            expiry = end + timedelta(days=rng.randint(-60, 720))
+            rows.append((i, name, diags[0], rng.randint(0, 500), round(rng.uniform(lo, hi), 2), expiry.isoformat()))
+    return rows
+
+
+def _gen_prescriptions(seed: int, start: int, n: int, plan: dict) -> tuple[list[tuple], list[tuple]]:
+    """Return (prescriptions, bills); bills belong to prescriptions in this chunk."""
+    end, years = plan["end"], plan["years"]
+    prescs, bills = [], []
+    for rng, ids in _blocks(seed, "prescriptions", start, n):
+        for i in ids:
+            med, _, diags, (lo, hi) = rng.choices(MEDICATIONS, MED_WEIGHTS)[0]
+            day = _seasonal_day(rng, end, years)
+            prescs.append((i, plan["patient_base"] + rng.randint(1, plan["patients"]),
+                           plan["doctor_base"] + rng.randint(1, plan["doctors"]),
+                           day.isoformat(), rng.choice(diags), med, rng.choice(DOSAGES), rng.choice(INSTRUCTIONS)))
+            if rng.random() < BILL_RATE:
+                total = round(rng.uniform(lo, hi) * rng.randint(1, 10) + rng.choice((200, 300, 500)), 2)
+                r = rng.random()
+                if r < 0.70:
+                    paid = total                                    # settled
+                elif r < 0.90:
+                    paid = round(total * rng.uniform(0.3, 0.95), 2)  # partial
+                else:
+                    paid = round(total * rng.uniform(0.0, 0.5), 2)   # mostly unpaid
+                billed_on = min(day + timedelta(days=rng.choice((0, 0, 0, 1, 3))), end)
+                bills.append((i, total, paid, billed_on.isoformat()))
+    return prescs, bills
+
+
+def _gen_appointments(seed: int, start: int, n: int, plan: dict) -> list[tuple]:
+    end, years = plan["end"], plan["years"]
+    rows = []
+    for rng, ids in _blocks(seed, "appointments", start, n):
+        for _ in ids:
+            if rng.random() < 0.1:
+                day = end + timedelta(days=rng.randint(1, 30))
+                status = "Scheduled"
+            else:
+                day = _seasonal_day(rng, end, years)
+                status = "Cancelled" if rng.random() < 0.12 else "Completed"
+            minute = rng.randrange(9 * 4, 18 * 4) * 15
+            rows.append((plan["patient_base"] + rng.randint(1, plan["patients"]),
+                         plan["doctor_base"] + rng.randint(1, plan["doctors"]),
+                         day.isoformat(), f"{minute // 60:02d}:{minute % 60:02d}", rng.choice(REASONS), status))
+    return rows
+
+
+GENERATORS = {
+    "doctors": _gen_doctors,
+    "patients": _gen_patients,
+    "inventory": _gen_inventory,
+    "prescriptions": _gen_prescriptions,
+    "appointments": _gen_appointments,
+}
+
+INSERTS = {
+    "doctors": "INSERT INTO doctors (id, vcn, name, phone, email, graduated_year) VALUES (?, ?, ?, ?, ?, ?)",
+    "patients": "INSERT INTO patients (id, name, species, breed, owner_name, owner_contact) VALUES (?, ?, ?, ?, ?, ?)",
+    "inventory": "INSERT INTO inventory (id, item_name, description, quantity, unit_price, expiry_date) VALUES (?, ?, ?, ?, ?, ?)",
+    "prescriptions": """INSERT INTO prescriptions (id, patient_id, doctor_id, date, diagnosis, medication, dosage, instructions)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+    "billing": "INSERT INTO billing (prescription_id, total_amount, paid_amount, billing_date) VALUES (?, ?, ?, ?)",
+    "appointments": "INSERT INTO appointments (patient_id, doctor_id, date, time, reason, status) VALUES (?, ?, ?, ?, ?, ?)",
+}
+
+
+def _run_chunk(job: tuple) -> tuple[str, object]:
+    table, seed, start, n, plan = job
+    return table, GENERATORS[table](seed, start, n, plan)
+
+
+# -------------------- Loader --------------------
+
+def _jobs(table: str, seed: int, base: int, total: int, chunk_size: int, plan: dict) -> Iterator[tuple]:
+    chunk_size = -(-max(chunk_size, 1) // RNG_BLOCK) * RNG_BLOCK     # whole RNG blocks
+    for off in range(0, total, chunk_size):
+        yield table, seed, base + off + 1, min(chunk_size, total - off), plan
+
+
+def generate(counts: dict[str, int], seed: int = 42, db_path: str | None = None, workers: int | None = None,
+             chunk_size: int = 20_000, end: date | None = None) -> dict[str, float]:
+    """
+    Generate `counts` rows per table into `db_path` (tables must already exist).
+    Returns {table: rows_per_second} and prints a throughput report.
+    """
+    db_path = db_path or DB_PATH
+    workers = workers if workers is not None else (os.cpu_count() or 1)
+    conn = sqlite3.connect(db_path)
+    conn.execute("PRAGMA synchronous=OFF")
+    bases = {t: conn.execute(f"SELECT COALESCE(MAX(id), 0) FROM {t}").fetchone()[0]
+             for t in ("doctors", "patients", "inventory", "prescriptions")}
+    plan = dict(counts, end=end or date.today(), years=YEARS_OF_HISTORY,
+                patient_base=bases["patients"], doctor_base=bases["doctors"])
+
+    pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    report: dict[str, float] = {}
+    loaded: dict[str, int] = {}
+    t_all = time.perf_counter()
+    try:
+        # Parents first so foreign keys always point at existing rows.
+        for table in ("doctors", "patients", "inventory", "prescriptions", "appointments"):
+            total = counts.get(table, 0)
+            if not total:
+                continue
+            t0 = time.perf_counter()
+            jobs = _jobs(table, seed, bases.get(table, 0), total, chunk_size, plan)
+            results = pool.map(_run_chunk, jobs) if pool else map(_run_chunk, jobs)
+            for tbl, rows in results:
+                with conn:
+                    if tbl == "prescriptions":
+                        prescs, bills = rows
+                        conn.executemany(INSERTS["prescriptions"], prescs)
+                        conn.executemany(INSERTS["billing"], bills)
+                        loaded["billing"] = loaded.get("billing", 0) + len(bills)
+                        rows = prescs
+                    else:
+                        conn.executemany(INSERTS[tbl], rows)
+                loaded[tbl] = loaded.get(tbl, 0) + len(rows)
+            elapsed = time.perf_counter() - t0
+            report[table] = loaded[table] / elapsed if elapsed else 0.0
+            extra = f" (+{loaded['billing']:,} bills)" if table == "prescriptions" else ""
+            print(f"  {table:<14}{loaded[table]:>12,} rows{extra}  {elapsed:8.2f}s  {report[table]:>12,.0f} rows/s")
+    finally:
+        if pool:
+            pool.shutdown()
+        conn.close()
+
+    elapsed = time.perf_counter() - t_all
+    rows = sum(loaded.values())
+    report["total"] = rows / elapsed if elapsed else 0.0
+    print(f"✅ Inserted {rows:,} rows in {elapsed:.2f}s ({report['total']:,.0f} rows/s, {workers} worker(s)).")
+    return report
+
+
+def insert_dummy_data(scale: str = "small", seed: int = 42, workers: int | None = 1,
+                      db_path: str | None = None) -> dict[str, float]:
+    """Menu entry point: load a small, reproducible demo dataset into clinic.db (or `db_path`)."""
+    print(f"Generating '{scale}' dataset (seed={seed})...")
+    return generate(SCALES[scale], seed=seed, db_path=db_path, workers=workers)
+
+
+def main(argv: list[str] | None = None) -> None:
+    ap = argparse.ArgumentParser(description="Generate a deterministic synthetic clinic dataset.")
+    ap.add_argument("--scale", choices=sorted(SCALES), default="small")
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    ap.add_argument("--chunk-size", type=int, default=20_000)
+    ap.add_argument("--db", default=DB_PATH)
+    ap.add_argument("--end", type=date.fromisoformat, default=None,
+                    help="Last day of generated history (YYYY-MM-DD); pin it for byte-identical reruns.")
+    args = ap.parse_args(argv)
+    if not os.path.exists(args.db):
+        sys.exit(f"❌ {args.db} does not exist; initialize the database first.")
+    generate(SCALES[args.scale], seed=args.seed, db_path=args.db, workers=args.workers,
+             chunk_size=args.chunk_size, end=args.end)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,12 @@
 import pytest
+import json
 import os
 import sqlite3
 import sys
 from unittest.mock import patch, MagicMock
 from io import StringIO
 import tempfile
+import shutil
 
 # Add the parent directory to sys.path
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
@@ -42,6 +44,7 @@ def setup_test_db():
     try:
         if os.path.exists(temp_path):
             os.unlink(temp_path)
+        shutil.rmtree(temp_path + ".columnar", ignore_errors=True)
     except (PermissionError, OSError):
         pass  # If we can't delete it now, it will be cleaned up later
 
@@ -457,4 +460,870 @@ def test_main_menu():
         choice = mock_main_menu()
     
     assert choice == "0"
-    assert "Welcome to VetAI Clinic Intelligence System" in fake_output.getvalue()
\ No newline at end of file
+    assert "Welcome to VetAI Clinic Intelligence System" in fake_output.getvalue()
+# Test synthetic data generator
+class TestSeed:
+    def _dump(self, db_path):
+        conn = sqlite3.connect(db_path)
+        try:
+            return [conn.execute(f"SELECT * FROM {t} ORDER BY id").fetchall()
+                    for t in ("doctors", "patients", "inventory", "prescriptions", "billing", "appointments")]
+        finally:
+            conn.close()
+
+    def test_generate_is_reproducible(self, setup_test_db):
+        from datetime import date
+        from seed.insert_dummy_data import generate, SCALES
+
+        with patch('sys.stdout', new=StringIO()):
+            generate(SCALES["small"], seed=7, db_path=setup_test_db, workers=1, end=date(2025, 4, 1), chunk_size=300)
+        first = self._dump(setup_test_db)
+
+        with patch('db.init_db.DB_PATH', setup_test_db), patch('sys.stdout', new=StringIO()):
+            initialize_db(reset=True)
+            generate(SCALES["small"], seed=7, db_path=setup_test_db, workers=1, end=date(2025, 4, 1), chunk_size=300)
+
+        assert self._dump(setup_test_db) == first
+
+        # Same data whatever the worker count and chunk layout
+        with patch('db.init_db.DB_PATH', setup_test_db), patch('sys.stdout', new=StringIO()):
+            initialize_db(reset=True)
+            generate(SCALES["small"], seed=7, db_path=setup_test_db, workers=2, end=date(2025, 4, 1), chunk_size=70)
+
+        assert self._dump(setup_test_db) == first
+        assert len(first[3]) == SCALES["small"]["prescriptions"]
+        # Partial payments are part of the distribution
+        assert any(0 < paid < total for _, _, total, paid, _ in first[4])
+
+# Test SQL instrumentation
+class TestInstrumentation:
+    def test_stats_and_slow_log(self, sample_data, tmp_path):
+        from db import instrument
+
+        instrument.reset()
+        with patch.object(instrument, 'SLOW_LOG_PATH', str(tmp_path / 'slow.log')), \
+                patch.object(instrument, 'SLOW_MS', 0.0):
+            rows = patients.list_patients()
+
+        entry = next(r for r in instrument.stats() if r["sql"].startswith("SELECT id, name, species"))
+        assert entry["count"] == 1 and entry["rows"] == len(rows) == 1
+        assert sum(entry["histogram"].values()) == 1
+        logged = (tmp_path / 'slow.log').read_text().splitlines()
+        assert any("FROM patients" in line and "plan" in line for line in logged)
+
+    def test_iterated_rows_recorded_once_per_statement(self, sample_data):
+        from db import instrument
+
+        patients.add_patient("Max", "Cat", "Persian", "Jane", "123")
+        instrument.reset()
+        conn = instrument.connect(sample_data)
+        try:
+            assert sum(1 for _ in conn.execute("SELECT id FROM patients")) == 2
+            cur = conn.execute("SELECT name FROM patients ORDER BY id")
+            next(cur)
+            assert not any(r["sql"] == "SELECT name FROM patients ORDER BY id" for r in instrument.stats())
+            cur.close()   # an unfinished statement is recorded when its cursor closes
+        finally:
+            conn.close()
+        by_sql = {r["sql"]: r for r in instrument.stats()}
+        assert (by_sql["SELECT id FROM patients"]["count"], by_sql["SELECT id FROM patients"]["rows"]) == (1, 2)
+        assert (by_sql["SELECT name FROM patients ORDER BY id"]["count"],
+                by_sql["SELECT name FROM patients ORDER BY id"]["rows"]) == (1, 1)
+
+# Test Prometheus metrics export
+class TestMetrics:
+    def test_render_counts_and_jobs(self, sample_data):
+        from db import instrument, metrics
+
+        instrument.reset()
+        with patch('sys.stdout', new=StringIO()):
+            ai.flag_underbilled()
+        before = metrics.render(sample_data)
+        assert 'vetai_table_rows{table="patients"} 1' in before
+        assert 'vetai_ai_job_seconds_count{job="flag_underbilled"}' in before
+
+        patients.add_patient("Max", "Cat", "Persian", "Jane", "123")
+        after = metrics.render(sample_data)
+        assert 'vetai_table_rows{table="patients"} 2' in after
+        assert 'vetai_db_operations_total{table="patients",op="insert"} 1' in after
+
+        # Row gauges survive a stats reset and writes from another connection
+        instrument.reset()
+        with sqlite3.connect(sample_data) as conn:
+            conn.execute("INSERT INTO patients (name, species) VALUES ('Tom', 'Cat')")
+            conn.execute("DELETE FROM billing")
+        scraped = metrics.render(sample_data)
+        assert 'vetai_table_rows{table="patients"} 3' in scraped and 'vetai_table_rows{table="billing"} 0' in scraped
+        with sqlite3.connect(sample_data) as conn:       # the triggers agree with a real count
+            for table, n in conn.execute("SELECT tbl, n FROM row_counts"):
+                assert conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0] == n
+
+# Test versioned migrations
+class TestMigrations:
+    def test_legacy_appointments_rebuilt_in_place(self, tmp_path):
+        from db import migrations
+
+        db_path = str(tmp_path / "legacy.db")
+        conn = sqlite3.connect(db_path)
+        conn.executescript("""
+            CREATE TABLE patients (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL, species TEXT,
+                                   breed TEXT, owner_name TEXT, owner_contact TEXT);
+            CREATE TABLE appointments (id INTEGER PRIMARY KEY AUTOINCREMENT, patient_id INTEGER NOT NULL,
+                                       doctor_id INTEGER NOT NULL, date TEXT NOT NULL, time TEXT NOT NULL,
+                                       reason TEXT, status TEXT DEFAULT 'Scheduled');
+            INSERT INTO patients (name) VALUES ('Buddy');
+        """)
+        conn.executemany("INSERT INTO appointments (patient_id, doctor_id, date, time, reason) VALUES (1, 1, ?, '10:00', 'x')",
+                         [(f"2025-01-{d:02d}",) for d in range(1, 26)])
+        conn.commit()
+        conn.close()
+
+        from db import instrument
+
+        def fail(conn):
+            raise RuntimeError("boom")
+
+        # A failure in the same migration rolls the whole rebuild back.
+        with patch.object(migrations, 'BATCH_SIZE', 7), patch('sys.stdout', new=StringIO()), \
+                patch.object(migrations, 'MIGRATIONS', migrations.MIGRATIONS[:1] + [
+                    (2, "rebuild then fail", lambda c: (migrations._m002_appointments(c), fail(c)), True)]):
+            with pytest.raises(RuntimeError):
+                migrations.migrate(db_path)
+        with sqlite3.connect(db_path) as conn:
+            assert "CHECK" not in conn.execute("SELECT sql FROM sqlite_master WHERE name='appointments'").fetchone()[0]
+            assert conn.execute("SELECT COUNT(*) FROM sqlite_master WHERE name='appointments__new'").fetchone()[0] == 0
+
+        instrument.reset()
+        with patch.object(migrations, 'BATCH_SIZE', 7), patch('sys.stdout', new=StringIO()):
+            assert migrations.migrate(db_path) == migrations.latest_version()
+        copies = [r for r in instrument.stats() if r["sql"].startswith("INSERT INTO appointments__new")]
+        assert copies[0]["count"] == 4 and copies[0]["changed"] == 25    # 7 + 7 + 7 + 4 rows
+
+        conn = sqlite3.connect(db_path)
+        try:
+            assert conn.execute("SELECT COUNT(*) FROM appointments").fetchone()[0] == 25
+            assert conn.execute("SELECT name FROM patients").fetchone()[0] == "Buddy"
+            assert "CHECK" in conn.execute("SELECT sql FROM sqlite_master WHERE name='appointments'").fetchone()[0]
+            with pytest.raises(sqlite3.IntegrityError):
+                conn.execute("INSERT INTO appointments (patient_id, doctor_id, date, time, status) "
+                             "VALUES (1, 1, '2025-02-01', '10:00', 'Bogus')")
+        finally:
+            conn.close()
+
+    def test_up_to_date_database_does_no_schema_work(self, setup_test_db):
+        from db import instrument, migrations
+
+        migrations.forget(setup_test_db)
+        instrument.reset()
+        migrations.ensure_schema(setup_test_db)
+        migrations.ensure_schema(setup_test_db)
+        assert [s["sql"] for s in instrument.stats()] == ["PRAGMA user_version"]
+
+# Test online backups
+class TestBackup:
+    def test_backup_rotate_and_restore(self, sample_data, tmp_path):
+        from db import backup
+
+        dest = str(tmp_path / "backups")
+        with patch('sys.stdout', new=StringIO()):
+            metas = [backup.backup(sample_data, dest, keep=2, pages=1, sleep=0) for _ in range(3)]
+            snaps = backup.snapshots(dest, os.path.splitext(os.path.basename(sample_data))[0])
+            assert snaps == [m["snapshot"] for m in metas[1:]]
+            assert all(backup.verify(s) for s in snaps)
+
+            restored = str(tmp_path / "restored.db")
+            backup.restore(snaps[-1], restored)
+            with pytest.raises(FileExistsError):
+                backup.restore(snaps[-1], restored)
+
+        conn = sqlite3.connect(restored)
+        try:
+            assert conn.execute("SELECT name FROM patients").fetchone()[0] == "Buddy"
+        finally:
+            conn.close()
+
+# Test analytics snapshots
+class TestSnapshot:
+    def test_pinned_reader_does_not_block_writers(self, sample_data):
+        from db import snapshot
+
+        assert snapshot.is_wal(sample_data)
+        with snapshot.reader(sample_data) as (conn, as_of):
+            assert conn.execute("SELECT COUNT(*) FROM patients").fetchone()[0] == 1
+            with patch('sys.stdout', new=StringIO()):
+                patients.add_patient("Max", "Cat", "Persian", "Jane", "123")  # no "database is locked"
+            assert conn.execute("SELECT COUNT(*) FROM patients").fetchone()[0] == 1
+        with snapshot.reader(sample_data) as (conn, _):
+            assert conn.execute("SELECT COUNT(*) FROM patients").fetchone()[0] == 2
+
+    def test_copy_refreshes_only_when_changed_and_stale(self, sample_data):
+        from db import snapshot
+
+        copy = snapshot.snapshot_path(os.path.abspath(sample_data))
+        try:
+            first = snapshot.refresh(sample_data, max_age=0)
+            assert snapshot.refresh(sample_data, max_age=0) == first        # unchanged source: no copy
+            with patch('sys.stdout', new=StringIO()):
+                patients.add_patient("Max", "Cat", "Persian", "Jane", "123")
+            assert snapshot.refresh(sample_data, max_age=3600) == first     # changed but still fresh enough
+            with snapshot.reader(sample_data, max_age=0, mode="copy") as (conn, as_of):
+                assert conn.execute("SELECT COUNT(*) FROM patients").fetchone()[0] == 2
+                assert as_of.timestamp() > first
+        finally:
+            snapshot._known.pop(copy, None)
+            if os.path.exists(copy):
+                os.unlink(copy)
+
+# Test bulk export/import
+class TestBulk:
+    def test_round_trip_rejects_and_resume(self, sample_data, tmp_path):
+        from db import bulk
+
+        path = str(tmp_path / "prescriptions.jsonl.gz")
+        assert bulk.export_table("prescriptions", path, sample_data)["rows"] == 1
+
+        # Second file: one good row, one with a missing patient, one with a bad doctor_id type.
+        import gzip, json
+        extra = str(tmp_path / "extra.csv")
+        with open(extra, "w", encoding="utf-8") as f:
+            f.write("patient_id,doctor_id,date,medication\n1,1,2025-04-02,Meloxicam\n99,1,2025-04-02,X\n1,abc,2025-04-02,Y\n")
+        r = bulk.import_table("prescriptions", extra, sample_data, keep_ids=False, batch_size=2)
+        assert (r["inserted"], r["rejected"]) == (1, 2)
+        reasons = [json.loads(l)["reason"] for l in open(extra + ".rejects.jsonl", encoding="utf-8")]
+        assert any("patients.id" in x for x in reasons) and any("not INTEGER" in x for x in reasons)
+
+        # Same file again: the checkpoint says it is done, nothing is duplicated.
+        assert bulk.import_table("prescriptions", extra, sample_data, keep_ids=False)["already_done"]
+        conn = sqlite3.connect(sample_data)
+        try:
+            assert conn.execute("SELECT COUNT(*) FROM prescriptions").fetchone()[0] == 2
+        finally:
+            conn.close()
+
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            assert json.loads(f.readline())["medication"] == "Amoxicillin"
+
+    def test_csv_keeps_empty_strings_and_resumes_after_a_kill(self, sample_data, tmp_path):
+        from db import bulk, migrations
+
+        with sqlite3.connect(sample_data) as conn:
+            conn.executemany("INSERT INTO doctors (vcn, name, phone, email) VALUES (?, 'Dr. A', ?, ?)",
+                             [(f"V{i}", "" if i % 2 else None, "" if i % 3 else None) for i in range(7)])
+        path = str(tmp_path / "doctors.csv")
+        assert bulk.export_table("doctors", path, sample_data)["rows"] == 8
+        other = str(tmp_path / "other.db")
+        with patch('sys.stdout', new=StringIO()):
+            migrations.migrate(other)
+
+        # Kill the import in its second batch, then run it again.
+        real, calls = bulk._validate, []
+        def killed(*args):
+            calls.append(1)
+            if len(calls) == 2:
+                raise KeyboardInterrupt
+            return real(*args)
+        with patch.object(bulk, '_validate', killed), pytest.raises(KeyboardInterrupt):
+            bulk.import_table("doctors", path, other, batch_size=3)
+        r = bulk.import_table("doctors", path, other, batch_size=3)
+        assert (r["skipped"], r["inserted"], r["rejected"]) == (3, 5, 0)
+
+        q = "SELECT id, vcn, name, phone, email, graduated_year FROM doctors ORDER BY id"
+        with sqlite3.connect(sample_data) as a, sqlite3.connect(other) as b:
+            assert b.execute(q).fetchall() == a.execute(q).fetchall()
+            assert b.execute("SELECT COUNT(*) FROM doctors WHERE phone = ''").fetchone()[0] == 3
+
+    def test_patients_round_trip_relinks_owners(self, sample_data, tmp_path):
+        from db import bulk, migrations
+
+        patients.add_patient("Max", "Dog", "Beagle", "John Doe", "+91 98765 43210")   # same owner as Buddy
+        path = str(tmp_path / "patients.csv")
+        assert bulk.export_table("patients", path, sample_data)["rows"] == 2
+        with open(path, encoding="utf-8") as f:
+            assert "owner_id" not in f.readline()
+        other = str(tmp_path / "fresh.db")
+        with patch('sys.stdout', new=StringIO()):
+            migrations.migrate(other)
+        r = bulk.import_table("patients", path, other)
+        assert (r["inserted"], r["rejected"]) == (2, 0)
+        with sqlite3.connect(other) as conn:
+            assert conn.execute("SELECT COUNT(DISTINCT owner_id), COUNT(*) FROM patients "
+                                "WHERE owner_id IS NOT NULL").fetchone() == (1, 2)
+
+# Test columnar analytics cache
+class TestColumnar:
+    def test_incremental_refresh_matches_sql(self, sample_data):
+        from db import columnar
+
+        cols = columnar.load(sample_data)
+        assert list(cols["prescriptions"]["id"]) == [1]
+        assert cols.dicts["medication"][cols["prescriptions"]["medication"][0]] == "Amoxicillin"
+
+        with patch('sys.stdout', new=StringIO()):
+            prescriptions.add_prescription(1, 1, "Pain", "Meloxicam", "5mg", "Daily")
+            billing.generate_bill(2, 200.0, 20.0)
+            billing.update_bill_payment(1, 100.0)   # bill 1 is no longer underbilled
+
+        meta = columnar.refresh(sample_data)
+        assert columnar.refresh(sample_data) is not None   # nothing new: served as-is
+        cols = columnar.load(sample_data, refresh_first=False)
+        assert cols.meta["generation"] == meta["generation"]
+        assert list(cols["billing"]["paid_amount"]) == [100.0, 20.0]
+        assert list(cols.lookup("prescriptions", [2, 5])) == [1, -1]
+
+        with patch('sys.stdout', new=StringIO()):
+            vectorised = ai.predict_top_drugs(days=100_000), ai.flag_underbilled()
+            with patch.object(columnar, 'np', None):
+                assert columnar.load(sample_data) is None
+                assert (ai.predict_top_drugs(days=100_000), ai.flag_underbilled()) == vectorised
+        assert [r[0] for r in vectorised[1]] == [2]
+
+    def test_refresh_reads_the_snapshot(self, sample_data):
+        from db import columnar, snapshot
+
+        with patch.object(snapshot, 'MODE', 'copy'), patch('sys.stdout', new=StringIO()):
+            columnar.refresh(sample_data)
+            prescriptions.add_prescription(1, 1, "Pain", "Meloxicam", "5mg", "Daily")
+            prescriptions.update_prescription(1, "Infection", "Amoxicillin", "750mg", "Twice daily")
+            # The analytics copy is younger than MAX_AGE, so neither change is visible yet.
+            assert list(columnar.load(sample_data)["prescriptions"]["id"]) == [1]
+            with sqlite3.connect(sample_data) as conn:
+                # Only the dirty rows the refresh consumed are pruned.
+                assert conn.execute("SELECT COUNT(*) FROM columnar_dirty").fetchone()[0] == 1
+            snapshot.refresh(sample_data, force=True)
+            assert list(columnar.load(sample_data)["prescriptions"]["id"]) == [1, 2]
+        with sqlite3.connect(sample_data) as conn:
+            assert conn.execute("SELECT COUNT(*) FROM columnar_dirty").fetchone()[0] == 0
+
+    def test_segments_and_concurrent_refreshes(self, sample_data):
+        import subprocess
+        from db import columnar
+
+        def live(cols):
+            rx = cols["prescriptions"]
+            return sorted((int(i), cols.dicts["medication"][m]) for i, m, ok in zip(rx["id"], rx["medication"], rx["live"]) if ok)
+
+        query = "SELECT id, medication FROM prescriptions ORDER BY id"
+        with patch.object(columnar, 'SEGMENT_ROWS', 2), patch('sys.stdout', new=StringIO()):
+            for med in ("Cephalexin", "Fenbendazole", "Furosemide", "Gabapentin"):
+                prescriptions.add_prescription(1, 1, "Pain", med, "5mg", "Daily")
+            first = columnar.refresh(sample_data)["segments"]["prescriptions"]
+            assert [s["rows"] for s in first] == [2, 2, 1]
+            with sqlite3.connect(sample_data) as conn:
+                conn.execute("UPDATE prescriptions SET medication = 'Sucralfate' WHERE id = 4")
+            segs = columnar.refresh(sample_data)["segments"]["prescriptions"]
+            # Only the segment holding the updated row is rewritten.
+            assert [s["name"] == f["name"] for s, f in zip(segs, first)] == [True, False, True]
+
+        with sqlite3.connect(sample_data) as conn:
+            conn.execute("DELETE FROM prescriptions WHERE id = 2")
+            conn.execute("UPDATE prescriptions SET medication = 'Theophylline' WHERE id = 5")
+            want = conn.execute(query).fetchall()
+        # Refreshes from several processes at once must not lose the dirty rows between them.
+        procs = [subprocess.Popen([sys.executable, "-m", "db.columnar", "--db", sample_data],
+                                  cwd=os.path.join(os.path.dirname(columnar.__file__), ".."),
+                                  stdout=subprocess.DEVNULL) for _ in range(4)]
+        assert [p.wait() for p in procs] == [0] * 4
+        assert live(columnar.load(sample_data, refresh_first=False)) == want
+        assert live(columnar.load(sample_data)) == want
+
+# Test revenue rollups
+class TestRevenue:
+    def test_rollups_follow_bill_changes(self, sample_data):
+        with patch('sys.stdout', new=StringIO()):
+            bill = billing.generate_bill(1, 300.0, 100.0, "2025-04-20")
+            billing.update_bill_payment(bill, 300.0)
+            billing.delete_bill(billing.generate_bill(1, 999.0, 0.0, "2025-05-01"))
+
+        assert billing.revenue_summary("month") == [("2025-04", 2, 400.0, 350.0, 50.0)]
+        assert billing.revenue_summary("day", start="2025-04-02") == [("2025-04-20", 1, 300.0, 300.0, 0.0)]
+        assert billing.revenue_summary("week")[0][0] == "2025-03-31"
+        assert billing.revenue_summary("doctor") == [("Dr. Test (#1)", 2, 400.0, 350.0, 50.0)]
+        assert billing.revenue_summary("species") == [("Dog", 2, 400.0, 350.0, 50.0)]
+
+        before = billing.revenue_summary("species")
+        billing.rebuild_revenue_rollups()
+        assert billing.revenue_summary("species") == before
+        with pytest.raises(ValueError):
+            billing.revenue_summary("year")
+
+# Test patient timeline
+class TestTimeline:
+    def test_merged_order_and_pagination(self, sample_data):
+        from modules import appointments
+
+        with patch.object(appointments, 'DB_PATH', sample_data), patch('sys.stdout', new=StringIO()):
+            appointments.add_appointment(1, 1, "2025-04-01", "09:30", "Checkup")
+            rx = prescriptions.add_prescription(1, 1, "Follow-up", "Meloxicam", "5mg", "Daily")
+            billing.generate_bill(rx, 80.0, 80.0, "2025-05-02")
+            prescriptions.update_prescription(rx, "Follow-up", "Meloxicam", "5mg", "Daily")
+
+        full = patients.patient_timeline(1)
+        assert [(r[1], r[2]) for r in full][-3:] == [("bill", 1), ("prescription", 1), ("appointment", 1)]
+        assert full[-1][5] == "Checkup [Scheduled]" and full[-3][6:] == (100.0, 50.0)
+
+        page1 = patients.patient_timeline(1, limit=2)
+        page2 = patients.patient_timeline(1, before=page1[-1], limit=2)
+        page3 = patients.patient_timeline(1, before=page2[-1], limit=2)
+        assert page1 + page2 + page3 == full and len(full) == 5
+        assert patients.patient_timeline(1, before="2025-04-01") == []
+        assert patients.patient_timeline(2) == []
+
+
+class TestDedupe:
+    def test_find_and_merge(self, sample_data):
+        from modules import dedupe
+
+        assert dedupe.normalize_contact("+91 98765-43210") == dedupe.normalize_contact("09876543210") == "9876543210"
+        # Same key as the owners table, so dedupe and owner linking agree on shared phones.
+        from db.migrations import contact_norm_sql
+        with sqlite3.connect(":memory:") as conn:
+            for contact in ("91-98765-4321", "00987654321", "+91 (98765) 43210", "9198765432", "0.987.654.3210", ""):
+                sql = conn.execute(f"SELECT {contact_norm_sql(':c')}", {"c": contact}).fetchone()[0]
+                assert dedupe.normalize_contact(contact) == sql
+        dup = patients.add_patient("Budy", "dog", "Labrador", "john  doe", "+91 98765 43210")
+        patients.add_patient("Max", "Dog", "Beagle", "John Doe", "9876543210")      # a second pet, not a duplicate
+        patients.add_patient("Buddy", "Dog", "Pug", "Jane Roe", "9123456780")       # a namesake, not a duplicate
+        with patch.object(dedupe, 'DB_PATH', sample_data):
+            with patch.object(dedupe, 'BATCH_SIZE', 2):                     # batched writes, resumed by id
+                assert dedupe.build_index(rebuild=True) == 4
+            assert dedupe.build_index() == 0
+            pairs = dedupe.find_duplicates()
+            assert [(a, b) for a, b, _ in pairs] == [(1, dup)]
+
+            rx = prescriptions.add_prescription(dup, 1, "Checkup", "Meloxicam", "5mg", "Daily")
+            assert dedupe.merge_patients(1, dup) == {"prescriptions": 1, "appointments": 0}
+            with pytest.raises(ValueError):
+                dedupe.merge_patients(1, dup)
+            assert dedupe.find_duplicates() == []
+
+        with sqlite3.connect(sample_data) as conn:
+            assert conn.execute("SELECT patient_id FROM prescriptions WHERE id=?", (rx,)).fetchone() == (1,)
+            assert conn.execute("SELECT COUNT(*) FROM patient_blocks WHERE patient_id=?", (dup,)).fetchone() == (0,)
+
+
+class TestSearch:
+    def test_fuzzy_lookup_follows_writes(self, sample_data):
+        from modules import search
+
+        with patch.object(search, 'DB_PATH', sample_data):
+            assert search.fuzzy_lookup("patient", "Budy")[0][:2] == (1, "Buddy (John Doe)")
+            assert search.fuzzy_lookup("medication", "amoxcilin")[0][:2] == (1, "Amoxicillin")
+            assert search.fuzzy_lookup("doctor", "dr test")[0][0] == 1
+
+            pid = patients.add_patient("Whiskers", "Cat", "Persian", "Ann Lee", "9000000000")
+            assert search.fuzzy_lookup("patient", "wiskers")[0][0] == pid
+            patients.update_patient(pid, "Mittens", "Cat", "Persian", "Ann Lee", "9000000000")
+            assert search.fuzzy_lookup("patient", "wiskers") == []
+            assert search.fuzzy_lookup("patient", "mitens")[0][0] == pid
+            patients.delete_patient(pid)
+            assert search.fuzzy_lookup("patient", "mitens") == []
+            with pytest.raises(ValueError):
+                search.fuzzy_lookup("owner", "x")
+
+        with sqlite3.connect(sample_data) as conn:
+            assert conn.execute("SELECT COUNT(*) FROM search_terms WHERE term IN ('Whiskers', 'Mittens')").fetchone() == (0,)
+
+
+class TestOwners:
+    def test_owner_links_and_updates(self, sample_data):
+        sibling = patients.add_patient("Max", "Dog", "Beagle", "John Doe", "+91 98765-43210")
+        other = patients.add_patient("Tom", "Cat", "", "Ann Lee", "9123456780")
+        owner_id, name, _ = patients.find_owner("098765 43210")
+        assert name == "John Doe"
+        assert [p[0] for p in patients.list_owner_pets(owner_id)] == [1, sibling]
+        assert [b[0] for b in billing.list_owner_bills(owner_id)] == [1]
+
+        assert patients.update_owner(owner_id, "John Doe", "9000000001") == 2
+        assert patients.find_owner("9876543210") is None
+        assert {p[5] for p in patients.list_owner_pets(owner_id)} == {"9000000001"}
+        with pytest.raises(ValueError):
+            patients.update_owner(owner_id, "John Doe", "9123456780")
+
+        # A pet moved to another household follows its new contact.
+        patients.update_patient(sibling, "Max", "Dog", "Beagle", "Ann Lee", "9123456780")
+        assert [p[0] for p in patients.list_owner_pets(patients.find_owner("9123456780")[0])] == [sibling, other]
+
+
+class TestBranches:
+    def test_routing_and_federated_reports(self, tmp_path):
+        from db import branches
+
+        registry = str(tmp_path / "branches.json")
+        with open(registry, "w") as f:
+            f.write("{}")
+        north = branches.add_branch("north", "North", str(tmp_path / "north.db"), registry)
+        branches.add_branch("south", "South", str(tmp_path / "south.db"), registry)
+        with pytest.raises(ValueError):
+            branches.add_branch("north", "Again", registry_path=registry)
+
+        import importlib
+        from db import init_db
+        from seed import insert_dummy_data as seed
+        before = patients.DB_PATH, init_db.DB_PATH, seed.DB_PATH
+        for branch, (med, paid) in {"north": ("Amoxicillin", 10.0), "south": ("Meloxicam", 90.0)}.items():
+            with branches.use(branch, registry), patch('sys.stdout', new=StringIO()):
+                # The menu's init, demo data and backup entries follow the branch too.
+                assert {importlib.import_module(m).DB_PATH for m in branches.ROUTED} == {branches.branch_path(branch, registry)}
+                doctors.add_doctor(f"VCN-{branch}", "Dr. A", "", "", 2010)
+                pid = patients.add_patient("Rex", "Dog", "", "Ann", "9000000000")
+                for _ in range(2):
+                    rx = prescriptions.add_prescription(pid, 1, "Checkup", med, "5mg", "Daily")
+                billing.generate_bill(rx, 100.0, paid)
+        assert (patients.DB_PATH, init_db.DB_PATH, seed.DB_PATH) == before
+
+        with sqlite3.connect(north) as conn:
+            assert conn.execute("SELECT DISTINCT medication FROM prescriptions").fetchall() == [("Amoxicillin",)]
+        assert sorted(branches.top_drugs(registry_path=registry)) == [("Amoxicillin", 2), ("Meloxicam", 2)]
+        assert [(r[0], r[1]) for r in branches.underbilled(registry_path=registry)] == [("north", 1)]
+        assert [r[1:4] for r in branches.revenue("month", registry_path=registry)] == [(2, 200.0, 100.0)]
+        with patch.object(branches, 'MAX_ATTACH', 1):   # one shard per connection, queried in parallel
+            assert sorted(branches.top_drugs(registry_path=registry)) == [("Amoxicillin", 2), ("Meloxicam", 2)]
+
+
+class TestWriter:
+    def test_group_commit_isolates_failures(self, sample_data):
+        from concurrent.futures import wait
+        from db import writer
+
+        with writer.Writer(sample_data, window=0.05) as w:
+            futures = [w.execute("INSERT INTO patients (name, species) VALUES (?, 'Dog')", (f"Pet{i}",)) for i in range(20)]
+            bad = w.execute("INSERT INTO doctors (vcn, name) VALUES ('VCN123', 'Dr. Twin')")   # duplicate vcn
+            rows = w.submit(lambda conn: conn.execute("UPDATE patients SET breed='Indie' WHERE species='Dog'").rowcount)
+            wait(futures + [bad, rows])
+        assert sorted(f.result() for f in futures) == list(range(2, 22))
+        assert isinstance(bad.exception(), sqlite3.IntegrityError)
+        assert rows.result() == 21
+        assert w.stats["batches"] < 22 and w.stats["errors"] == 1
+        with pytest.raises(RuntimeError):
+            w.execute("SELECT 1")
+
+    def test_module_writes_share_the_writer(self, sample_data):
+        import threading
+        from db import writer
+
+        def add(k):
+            for i in range(10):
+                doctors.add_doctor(f"VCN-{k}-{i}", "Dr. Pool", "", "", 2015)
+
+        threads = [threading.Thread(target=add, args=(k,)) for k in range(8)]
+        with patch('sys.stdout', new=StringIO()):
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            w = writer.get_writer(sample_data)
+            assert w.stats["ops"] == 80 and w.stats["batches"] < 80      # one connection, group-committed
+            with pytest.raises(sqlite3.IntegrityError):
+                doctors.add_doctor("VCN123", "Dr. Twin", "", "", 2015)    # fails alone, raised to the caller
+            # A module write inside a queued operation joins its batch instead of waiting behind it.
+            assert w.submit(lambda conn: patients.add_patient("Rex", "Dog", "", "Ann", "")).result(timeout=5) == 2
+        with sqlite3.connect(sample_data) as conn:
+            assert conn.execute("SELECT COUNT(*) FROM doctors WHERE name = 'Dr. Pool'").fetchone()[0] == 80
+
+
+class TestTransaction:
+    def test_unit_of_work(self, sample_data):
+        import modules as clinic
+
+        def count(table):
+            with sqlite3.connect(sample_data) as conn:
+                return conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+        with pytest.raises(RuntimeError):
+            with clinic.transaction(sample_data) as tx:
+                rx = prescriptions.add_prescription(1, 1, "Otitis", "Otomax", "5 drops", "Daily", tx=tx)
+                billing.generate_bill(rx, 850.0, 850.0, tx=tx)
+                raise RuntimeError("visit abandoned")
+        assert (count("prescriptions"), count("billing")) == (1, 1)
+
+        with clinic.transaction(sample_data) as tx:
+            rx = prescriptions.add_prescription(1, 1, "Otitis", "Otomax", "5 drops", "Daily", tx=tx)
+            billing.generate_bill(rx, 850.0, 850.0)            # joins the open transaction
+            with pytest.raises(sqlite3.IntegrityError):
+                with tx.savepoint():
+                    billing.update_bill_payment(1, 10.0, tx=tx)
+                    doctors.add_doctor("VCN123", "Dr. Twin", "", "", 2015, tx=tx)   # duplicate vcn
+            assert count("prescriptions") == 1                 # not visible outside until commit
+        assert (count("prescriptions"), count("billing")) == (2, 2)
+        assert billing.list_bills()[0][4] == 50.0              # the savepoint's payment was rolled back
+
+        with clinic.transaction(sample_data) as tx, pytest.raises(ValueError):
+            with patch.object(patients, 'DB_PATH', sample_data + ".other"):
+                patients.add_patient("Rex", "Dog", "", "", "", tx=tx)
+
+        # Merging and rebuilding rollups join the unit of work instead of waiting for its lock.
+        from modules import dedupe
+        dup = patients.add_patient("Budy", "Dog", "Labrador", "John Doe", "9876543210")
+        with pytest.raises(RuntimeError):
+            with clinic.transaction(sample_data) as tx:
+                assert dedupe.merge_patients(1, dup, sample_data, tx=tx) == {"prescriptions": 0, "appointments": 0}
+                billing.rebuild_revenue_rollups(sample_data)
+                raise RuntimeError("merge abandoned")
+        assert count("patients") == 2
+
+
+class TestChanges:
+    def test_log_tail_and_compact(self, sample_data):
+        from db import changes
+
+        assert changes.register("sync", from_start=True, db_path=sample_data) == 0
+        doctors.add_doctor("VCN900", "Dr. Feed", "", "", 2020)
+        doctors.update_doctor(1, "VCN123", "Dr. Renamed", "", "", 2010)
+        doctors.delete_doctor(2)
+        batches = list(changes.tail("sync", batch_size=2, db_path=sample_data))
+        seen = [c for b in batches for c in b]
+        assert all(len(b) <= 2 for b in batches)
+        assert [(c.table, c.op) for c in seen[-3:]] == [("doctors", "I"), ("doctors", "U"), ("doctors", "D")]
+        assert "name" in seen[-2].columns and "vcn" not in seen[-2].columns
+        assert list(changes.tail("sync", db_path=sample_data)) == []
+
+        changes.register("lagging", db_path=sample_data)
+        patients.add_patient("Rex", "Dog", "Asha", "", "")
+        assert changes.compact(db_path=sample_data) == len(seen)     # "lagging" still needs the new rows
+        assert [c.table for c in changes.read(0, db_path=sample_data)] == ["patients"]
+
+
+class TestArchive:
+    def test_archive_moves_closed_history(self, sample_data):
+        from db import archive
+
+        rx = prescriptions.add_prescription(1, 1, "Otitis", "Otomax", "5 drops", "Daily", when="2021-03-02")
+        billing.generate_bill(rx, 400.0, 400.0, billing_date="2021-03-02")
+        unbilled = prescriptions.add_prescription(1, 1, "Checkup", "None", "-", "-", when="2021-07-09")
+        with sqlite3.connect(sample_data) as conn:   # legacy dates, written before migration 13's checks
+            conn.execute("DROP TRIGGER trg_prescriptions_dates_insert")
+            legacy = [conn.execute("INSERT INTO prescriptions (patient_id, doctor_id, date, medication) VALUES (1, 1, ?, 'X')",
+                                   (d,)).lastrowid for d in ("", "05/03/2021")]
+            conn.executemany("INSERT INTO billing (prescription_id, total_amount, paid_amount, billing_date) "
+                             "VALUES (?, 10, 10, '2021-03-05')", [(i,) for i in legacy])
+        late = prescriptions.add_prescription(1, 1, "Otitis", "Otomax", "5 drops", "Daily", when="2021-03-03")
+        billing.generate_bill(late, 400.0, 400.0, billing_date="2021-03-03")
+        real = archive._move
+        def bill_arrives(conn, sink, ids, cutoff):       # a bill lands after the batch was selected
+            if late in ids:
+                billing.generate_bill(late, 50.0, 0.0, billing_date="2021-04-01")
+            return real(conn, sink, ids, cutoff)
+        try:
+            with patch.object(archive, '_move', bill_arrives):
+                assert archive.archive(before="2024-01-01", db_path=sample_data) == {"2021": (1, 1)}
+            revenue = billing.revenue_summary("month")
+            with sqlite3.connect(archive.archive_path("2021", sample_data)) as conn:
+                assert conn.execute("SELECT id FROM prescriptions").fetchall() == [(rx,)]   # never in both
+            history = [r[1:3] for r in patients.patient_timeline(1, before="2021-03-03", db_path=sample_data)]
+            assert history[:2] == [("bill", 2), ("prescription", rx)]              # read from the archive
+            assert list(archive.list_archives(sample_data)) == ["2021"]
+            # The unpaid 2025 bill, the unbilled checkup, the undated legacy rows and the
+            # prescription billed again mid-run stay hot.
+            assert [r[0] for r in prescriptions.list_prescriptions()] == [1, unbilled, *legacy, late]
+            assert billing.revenue_summary("month") == revenue
+            for _ in range(2):   # the writer detaches the archives after each batch
+                billing.rebuild_revenue_rollups()
+                assert billing.revenue_summary("month") == revenue
+            assert archive.archive(before="2024-01-01", db_path=sample_data) == {}
+            with archive.history(db_path=sample_data) as conn:
+                assert conn.execute("SELECT COUNT(*) FROM prescriptions_all").fetchone()[0] == 6
+                assert conn.execute("SELECT paid_amount FROM billing_all WHERE prescription_id = ?",
+                                    (rx,)).fetchone()[0] == 400.0
+        finally:
+            for path in archive.list_archives(sample_data).values():
+                os.unlink(path)
+
+
+class TestDates:
+    def test_integer_dates_and_ranges(self, sample_data):
+        from db import dates
+        from modules import appointments
+
+        assert dates.epoch_day("1970-01-02") == 1 and dates.minute_of_day("09:30") == 570
+        for bad in ("2025-02-30", "2025-4-1"):
+            with pytest.raises(ValueError):
+                dates.epoch_day(bad)
+        with pytest.raises(sqlite3.IntegrityError):
+            prescriptions.add_prescription(1, 1, "x", "y", "z", "w", when="2025-02-30")
+        with patch.object(appointments, 'DB_PATH', sample_data):
+            with pytest.raises(sqlite3.IntegrityError):
+                appointments.add_appointment(1, 1, "2025-04-02", "24:00", "Late")
+            appointments.add_appointment(1, 1, "2025-04-02", "14:00", "Recheck")
+            appointments.add_appointment(1, 1, "2025-04-02", "09:15", "Vaccine")
+            appointments.add_appointment(1, 1, "2025-04-09", "09:00", "Later")
+            assert [r[5] for r in appointments.appointments_between("2025-04-01", "2025-04-08")] == ["Vaccine", "Recheck"]
+        inventory.add_item("Old stock", "", 5, 1.0, "2025-05-01")
+        inventory.add_item("Undated", "", 5, 1.0, "")
+        assert [r[1] for r in inventory.expiring_items(30, today="2025-04-15")] == ["Old stock"]
+        with sqlite3.connect(sample_data) as conn:
+            conn.execute("DROP TRIGGER trg_billing_dates_insert")       # a row from before migration 13
+            conn.execute("INSERT INTO billing (prescription_id, total_amount, paid_amount, billing_date) "
+                         "VALUES (1, 1, 1, '01/04/2025')")
+        assert dates.invalid_dates(sample_data) == {"billing.billing_date": 1}
+
+
+class TestExplain:
+    def test_plans_and_index_advice(self, sample_data, tmp_path):
+        from db import explain
+
+        slow = tmp_path / "slow.log"
+        slow.write_text(json.dumps({"sql": "SELECT id, name FROM patients WHERE species = ? ORDER BY name",
+                                    "ms": 250.0}) + "\n" + json.dumps({"sql": "SELECT * FROM gone", "ms": 1}) + "\n")
+        with patch.object(explain, 'LARGE_TABLE_ROWS', 0):
+            result = explain.inspect(sample_data, slow_log=str(slow))
+        by_sql = {r["sql"]: r for r in result["statements"]}
+        hot = by_sql["SELECT id, name FROM patients WHERE species = ? ORDER BY name"]
+        assert "slow log" in hot["source"] and hot["calls"] >= 1
+        assert "scan" in {f.kind for f in hot["findings"]}
+        assert hot["suggestion"].startswith("CREATE INDEX") and "ON patients(species" in hot["suggestion"]
+        assert any("list_appointments" in r["source"] for r in by_sql.values())
+        assert ("slow log", "SELECT * FROM gone") in [e[:2] for e in result["errors"]]
+
+    def test_candidates_skip_rowid_and_wide_covers(self):
+        from db import explain
+
+        sql = ("SELECT id, name, species, breed, owner_name, owner_contact FROM patients "
+               "WHERE owner_id=? ORDER BY id")
+        cols = ["id", "name", "species", "breed", "owner_name", "owner_contact", "owner_id"]
+        assert explain.candidates(sql, "patients", "patients", cols, True) == [["owner_id"]]
+        wide = explain.candidates(sql, "patients", "patients", cols, True, wide=True)
+        assert wide == [["owner_id"], ["owner_id", "name", "species", "breed", "owner_name", "owner_contact"]]
+        narrow = "SELECT id, name FROM patients WHERE species = ? ORDER BY name"
+        assert ["species", "name"] in explain.candidates(narrow, "patients", "patients", cols, True)
+
+
+class TestLoad:
+    def test_mixed_staff_run(self, sample_data):
+        from bench import load
+
+        with pytest.raises(ValueError):
+            load.parse_mix("clinic-day", ["vet.no_such_op=1"])
+        mixes = load.parse_mix("front-desk-rush", ["vet.patient_timeline=0", "vet.list_bills=1"])
+        assert mixes["vet"] == {"add_prescription": 6, "list_bills": 1.0}
+        with sqlite3.connect(sample_data) as conn:
+            before = conn.execute("SELECT COUNT(*) FROM patients").fetchone()[0]
+        r = load.run(2, 1, seconds=0.5, scenario="front-desk-rush", mix=["vet.patient_timeline=0"],
+                     db_path=sample_data)
+        assert r["ops"] > 0 and r["ops"] == sum(o["calls"] for o in r["operations"].values())
+        assert "add_prescription" in r["operations"] and "patient_timeline" not in r["operations"]
+        assert all(o["p50_ms"] <= o["p95_ms"] <= o["p99_ms"] for o in r["operations"].values())
+        with sqlite3.connect(sample_data) as conn:            # ran on a copy
+            assert conn.execute("SELECT COUNT(*) FROM patients").fetchone()[0] == before
+
+
+class TestRefCache:
+    def test_lists_follow_the_change_log(self, sample_data):
+        from db import refcache
+
+        refcache.clear()
+        first = refcache.patients_by_name(sample_data)
+        assert first == sorted(((r[0], r[1]) for r in patients.list_patients()), key=lambda r: r[1])
+        assert refcache.patients_by_name(sample_data) is first                 # hit
+        inventory.add_item("Gauze", "", 5, 1.0, "2030-01-01")                  # other table: still a hit
+        assert refcache.patients_by_name(sample_data) is first
+        with patch('sys.stdout', new=StringIO()):
+            pid = patients.add_patient("Aaron", "Dog", "", "Zed", "555")
+        fresh = refcache.patients_by_name(sample_data)
+        assert fresh is not first and fresh[0] == (pid, "Aaron")
+        with sqlite3.connect(sample_data) as conn:                             # another connection's write
+            conn.execute("UPDATE patients SET name = 'Abel' WHERE id = ?", (pid,))
+        assert refcache.patients_by_name(sample_data)[0] == (pid, "Abel")
+        from db import changes
+
+        changes.register("reader", db_path=sample_data)
+        compacted = refcache.patients_by_name(sample_data)
+        with sqlite3.connect(sample_data) as conn:
+            conn.execute("UPDATE patients SET name = 'Abby' WHERE id = ?", (pid,))
+        changes.ack("reader", changes.last_seq(sample_data), sample_data)
+        assert changes.compact(db_path=sample_data) > 0                         # the change itself is gone
+        assert refcache.patients_by_name(sample_data)[0] == (pid, "Abby") != compacted[0]
+        with pytest.raises(ValueError):
+            refcache.cached("owners", ("owners",), lambda c: [], sample_data)
+        with sqlite3.connect(sample_data) as conn:
+            plan = conn.execute("EXPLAIN QUERY PLAN SELECT MAX(seq) FROM change_log WHERE tbl = 'patients'").fetchall()
+            assert "idx_change_log_tbl" in plan[0][3]
+        with patch.object(refcache, 'MAX_ENTRIES', 1):
+            refcache.doctors_by_name(sample_data)
+            assert refcache.size()[0] == 1
+
+
+class TestPrefixLookup:
+    def test_prefix_matches_ignore_case_and_use_the_index(self, sample_data):
+        from datetime import date
+        from modules import search
+
+        with patch('sys.stdout', new=StringIO()):
+            bella = patients.add_patient("bella", "Dog", "", "Ann", "555")
+            patients.add_patient("Belle", "Cat", "", "Ann", "555")
+            patients.add_patient("Ben", "Dog", "", "Ann", "555")
+        with patch.object(search, 'DB_PATH', sample_data):
+            assert [label for _, label in search.prefix_lookup("patient", "BEL")] == ["bella (Ann)", "Belle (Ann)"]
+            assert len(search.prefix_lookup("patient", "be", limit=2)) == 2
+            assert search.prefix_lookup("patient", str(bella))[0] == (bella, "bella (Ann)")
+            rx = prescriptions.add_prescription(bella, 1, "Itch", "Apoquel", "5mg", "Daily")
+            assert search.prefix_lookup("prescription", "Bell")[0] == (rx, f"bella - Apoquel ({date.today()})")
+            assert search.prefix_lookup("patient", "zzz") == []
+            older = prescriptions.add_prescription(bella, 1, "Itch", "Cytopoint", "1ml", "Monthly", when="2025-01-01")
+            from db import instrument
+            instrument.reset()
+            # Patients without prescriptions (Belle, Ben) are skipped; each pet's newest come first.
+            assert [i for i, _ in search.prefix_lookup("prescription", "", limit=3)] == [rx, older, 1]
+        with sqlite3.connect(sample_data) as conn:
+            plan = " ".join(r[3] for r in conn.execute(
+                "EXPLAIN QUERY PLAN SELECT t.id FROM patients t WHERE t.name >= ? COLLATE NOCASE "
+                "AND t.name < ? COLLATE NOCASE ORDER BY t.name COLLATE NOCASE LIMIT 5", ("a", "b")))
+            assert "idx_patients_name_nocase" in plan and "TEMP B-TREE" not in plan
+            # The prescription lookup never sorts: its cost follows the limit, not the prefix.
+            looked_up = [st["sql"] for st in instrument.stats() if "prescriptions" in st["sql"]]
+            assert looked_up
+            for sql in looked_up:
+                steps = " ".join(r[3] for r in conn.execute("EXPLAIN QUERY PLAN " + sql, [0] * sql.count("?")))
+                assert "TEMP B-TREE" not in steps and "SCAN" not in steps
+
+
+class TestInteractions:
+    def test_checks_block_major_findings_and_recheck_agrees(self, sample_data):
+        from modules import interactions
+
+        with patch('sys.stdout', new=StringIO()):
+            rabbit = patients.add_patient("Thumper", "Rabbit", "", "Ann", "555")
+            shep = patients.add_patient("Rex", "Dog", "German Shepherd", "Ann", "555")
+        mel = prescriptions.add_prescription(1, 1, "Pain", "Metacam (1.5mg/ml)", "5mg", "Daily")
+        with pytest.raises(interactions.InteractionError) as err:
+            prescriptions.add_prescription(1, 1, "Itch", "Prednisolone", "5mg", "Daily")
+        assert [(f.kind, f.conflict, f.conflict_id, f.severity) for f in err.value.findings] == \
+            [("interaction", "Metacam (1.5mg/ml)", mel, "major")]
+        assert interactions.check(1, "Furosemide", db_path=sample_data)[0].severity == "moderate"
+        pred = prescriptions.add_prescription(1, 1, "Itch", "Prednisolone", "5mg", "Daily", allow_interactions=True)
+        with pytest.raises(interactions.InteractionError):
+            prescriptions.add_prescription(rabbit, 1, "Infection", "Amoxicillin", "10mg", "Daily")
+        assert interactions.check(shep, "Ivermectin", db_path=sample_data)[0].conflict == "Dog (German Shepherd)"
+        assert interactions.check(1, "Ivermectin", db_path=sample_data) == []
+        assert interactions.check(1, "Unknown Tonic", db_path=sample_data) == []
+        # Outside the active window nothing interacts.
+        assert interactions.check(1, "Prednisolone", when="2030-01-01", db_path=sample_data) == []
+
+        found = interactions.recheck_active(db_path=sample_data)
+        assert [(f.prescription_id, f.conflict_id) for f in found] == [(pred, mel)]
+        with patch.object(interactions, 'np', None):
+            assert interactions.recheck_active(db_path=sample_data) == found
+
+    def test_edits_are_checked_and_both_checks_skip_legacy_dates(self, sample_data):
+        from datetime import date
+        from modules import interactions
+
+        mel = prescriptions.add_prescription(1, 1, "Pain", "Metacam (1.5mg/ml)", "5mg", "Daily")
+        pred = prescriptions.add_prescription(1, 1, "Itch", "Prednisolone", "5mg", "Daily", allow_interactions=True)
+        # The edited row is not its own conflict: Carprofen only meets the prednisolone.
+        assert [(f.prescription_id, f.conflict_id) for f in interactions.check_edit(mel, "Carprofen", sample_data)] \
+            == [(mel, pred)]
+        with pytest.raises(interactions.InteractionError):
+            prescriptions.update_prescription(mel, "Pain", "Carprofen", "5mg", "Daily")
+        prescriptions.update_prescription(mel, "Pain", "Meloxicam", "10mg", "Daily")       # same drug: no check
+        prescriptions.update_prescription(pred, "Itch", "Cephalexin", "5mg", "Daily")
+        with sqlite3.connect(sample_data) as conn:
+            assert conn.execute("SELECT medication FROM prescriptions WHERE id = ?", (mel,)).fetchone() == ("Meloxicam",)
+
+        with sqlite3.connect(sample_data) as conn:
+            conn.execute("DROP TRIGGER trg_prescriptions_dates_insert")            # a row from before migration 13
+            legacy = conn.execute("INSERT INTO prescriptions (patient_id, doctor_id, date, medication) "
+                                  "VALUES (1, 1, ?, 'Dexamethasone')", (f"{date.today()} 09:00",)).lastrowid
+        assert interactions.check(1, "Carprofen", db_path=sample_data)[0].conflict_id == mel
+        assert legacy not in {f.conflict_id for f in interactions.check(1, "Carprofen", db_path=sample_data)}
+        assert legacy not in {f.prescription_id for f in interactions.recheck_active(db_path=sample_data)}
+        assert [f.conflict_id for f in interactions.check_edit(legacy, "Carprofen", sample_data)] == [mel]